@@ -0,0 +1,175 @@
+"""
+Price alert engine
+---
+Evaluates user price alerts against live ticks from MarketDataServer.
+
+Armed alerts are indexed per instrument in two sorted lists of
+(threshold, alert id): "above" alerts fire once the tick's high reaches
+the threshold, "below" alerts once its low reaches it. A tick bisects each
+list and fires the contiguous slice it crossed, so the cost per tick is
+O(log n + fired) however many alerts are armed.
+
+Fired alerts are disarmed in memory immediately; the PriceAlert update
+goes through a WriteBehindQueue so it is written in batches off the feed
+thread, and the user is told through the NotificationCenter, which
+batches its rows the same way and pushes the alert to connected clients.
+
+    engine = AlertEngine(writer, notifications)
+    engine.load(PriceAlert.query.filter_by(active=True))
+    market_data_server.add_tick_listener(engine.on_tick)
+"""
+
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+import logging
+import threading
+
+from models import PriceAlert
+
+logger = logging.getLogger(__name__)
+
+CONDITIONS = ('above', 'below')
+
+def instrument_key(instrument: str) -> str:
+    """'EUR_USD', 'EUR/USD' and 'EUR-USD' all index the same book"""
+    return ''.join(ch for ch in str(instrument).upper() if ch.isalnum())
+
+def tick_range(entry: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(high, low) covered by a feed entry; quotes use the bid/ask midpoint"""
+    if entry.get('type') == 'quote':
+        mid = (float(entry['bid']) + float(entry['ask'])) / 2
+        return mid, mid
+    if 'HH' in entry and 'LL' in entry:
+        return float(entry['HH']), float(entry['LL'])
+    return None
+
+class AlertBook:
+    """Sorted thresholds for one instrument"""
+
+    __slots__ = ('above', 'below')
+
+    def __init__(self):
+        self.above: List[Tuple[float, int]] = []
+        self.below: List[Tuple[float, int]] = []
+
+    def __len__(self):
+        return len(self.above) + len(self.below)
+
+class AlertEngine:
+    def __init__(self, writer, notifications):
+        self.writer = writer
+        self.notifications = notifications
+        self.books: Dict[str, AlertBook] = {}
+        self.alerts: Dict[int, Dict[str, Any]] = {}
+        self.stats = {'ticks': 0, 'fired': 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate(instrument: str, condition: str, price) -> float:
+        if not instrument_key(instrument or ''):
+            raise ValueError("instrument is required")
+        if condition not in CONDITIONS:
+            raise ValueError(f"condition must be one of {', '.join(CONDITIONS)}")
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            raise ValueError("price must be a number")
+        if price <= 0:
+            raise ValueError("price must be positive")
+        return price
+
+    def add(self, alert) -> None:
+        """Arm a PriceAlert row (or anything with the same attributes)"""
+        entry = {
+            'id': alert.id,
+            'user_id': alert.user_id,
+            'instrument': alert.instrument,
+            'condition': alert.condition,
+            'price': float(alert.price),
+            'message': alert.message
+        }
+        key = instrument_key(alert.instrument)
+        with self._lock:
+            if alert.id in self.alerts:
+                self._remove_locked(alert.id)
+            book = self.books.get(key)
+            if book is None:
+                book = self.books[key] = AlertBook()
+            insort(getattr(book, alert.condition), (entry['price'], alert.id))
+            self.alerts[alert.id] = entry
+
+    def load(self, alerts: Iterable) -> int:
+        """Arm many alerts at once, e.g. every active row at startup"""
+        count = 0
+        for alert in alerts:
+            self.add(alert)
+            count += 1
+        logger.info(f"Armed {count} price alerts across {len(self.books)} instruments")
+        return count
+
+    def remove(self, alert_id: int) -> bool:
+        with self._lock:
+            return self._remove_locked(alert_id)
+
+    def _remove_locked(self, alert_id: int) -> bool:
+        entry = self.alerts.pop(alert_id, None)
+        if entry is None:
+            return False
+        key = instrument_key(entry['instrument'])
+        side = getattr(self.books[key], entry['condition'])
+        index = bisect_left(side, (entry['price'], alert_id))
+        if index < len(side) and side[index][1] == alert_id:
+            del side[index]
+        if not self.books[key]:
+            del self.books[key]
+        return True
+
+    def on_tick(self, pair: str, entry: Dict[str, Any]) -> None:
+        """MarketDataServer tick listener; fires every alert the tick crossed"""
+        book = self.books.get(instrument_key(pair))
+        if book is None:
+            return
+        prices = tick_range(entry)
+        if prices is None:
+            return
+        high, low = prices
+
+        with self._lock:
+            self.stats['ticks'] += 1
+            crossed = bisect_right(book.above, (high, float('inf')))
+            fired = book.above[:crossed]
+            del book.above[:crossed]
+            crossed = bisect_left(book.below, (low, float('-inf')))
+            fired += book.below[crossed:]
+            del book.below[crossed:]
+            if not fired:
+                return
+            fired = [self.alerts.pop(alert_id) for _, alert_id in fired]
+            if not book:
+                del self.books[instrument_key(pair)]
+            self.stats['fired'] += len(fired)
+
+        self._dispatch(fired, high if high == low else None, entry.get('timestamp'))
+
+    def _dispatch(self, fired: List[Dict[str, Any]], price: Optional[float], timestamp) -> None:
+        now = datetime.utcnow()
+        for alert in fired:
+            message = alert['message'] or \
+                f"{alert['instrument']} moved {alert['condition']} {alert['price']:g}"
+            self.writer.update(PriceAlert, {'id': alert['id'], 'active': False, 'triggered_at': now})
+            self.notifications.notify(alert['user_id'], 'alert', message, {
+                'alert_id': alert['id'],
+                'instrument': alert['instrument'],
+                'condition': alert['condition'],
+                'threshold': alert['price'],
+                'price': price,
+                'timestamp': timestamp
+            })
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'armed': len(self.alerts),
+            'instruments': len(self.books)
+        }
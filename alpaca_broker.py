@@ -1,7 +1,7 @@
 try:
     from alpaca.trading.client import TradingClient
     from alpaca.data.historical import StockHistoricalDataClient
-    from alpaca.trading.requests import MarketOrderRequest, GetAssetsRequest
+    from alpaca.trading.requests import MarketOrderRequest, LimitOrderRequest, StopOrderRequest, GetAssetsRequest
     from alpaca.trading.enums import OrderSide, TimeInForce, AssetClass
     import alpaca_trade_api as tradeapi
     from alpaca.common.exceptions import APIError
@@ -11,15 +11,20 @@ except ImportError as e:
         "Please install required packages: pip install alpaca-py alpaca-trade-api"
     )
 
-import pandas as pd
 from datetime import datetime
 import pytz
 import logging
+from instrumentation import instrument_broker
+from concurrency import fan_out
+from rate_limit import rate_limiter, RateLimitTimeout, ORDER, ACCOUNT, MARKET_DATA
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@instrument_broker('alpaca')
 class AlpacaBroker:
+    name = 'alpaca'
+
     def __init__(self, api_key, api_secret=None, paper=True):
         """Initialize Alpaca broker with proper error handling"""
         if not api_key or not api_secret:
@@ -32,6 +37,8 @@ class AlpacaBroker:
         self.trading_client = None
         self.data_client = None
         self.rest_api = None
+        # Trading and data APIs share the account's 200 requests/minute
+        self.limiter = rate_limiter.for_credential('alpaca', api_key)
         self.initialize_clients()
 
     def initialize_clients(self):
@@ -71,6 +78,7 @@ class AlpacaBroker:
                 raise ValueError("REST API client not initialized")
                 
             # Test authentication and get account
+            self.limiter.acquire(ACCOUNT)
             account = self.rest_api.get_account()
             if account.status != 'ACTIVE':
                 logger.error(f"Account not active. Status: {account.status}")
@@ -91,6 +99,7 @@ class AlpacaBroker:
             if not self.trading_client:
                 raise ValueError("Trading client not initialized")
                 
+            self.limiter.acquire(ACCOUNT, tokens=3)
             account = self.trading_client.get_account()
             positions = self.trading_client.get_all_positions()
             orders = self.trading_client.get_orders()
@@ -114,6 +123,8 @@ class AlpacaBroker:
                 },
                 'lastTransactionID': None  # Alpaca doesn't provide this
             }
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as e:
             logger.error(f"Error getting account details: {str(e)}")
             return {"error": str(e)}
@@ -121,53 +132,43 @@ class AlpacaBroker:
     def create_order(self, order_data):
         """Create a new trading order"""
         try:
-            if not self.trading_client:
-                raise ValueError("Trading client not initialized")
+            return self._submit(self.process_order_request(order_data))
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
+        except Exception as err:
+            raise Exception(f"Failed to create order: {err}")
 
-            order = order_data.get('order', {})
-            units = float(order.get('units', 0))
-            side = OrderSide.BUY if units > 0 else OrderSide.SELL
-            qty = abs(units)
-            
-            # Map OANDA order types to Alpaca order types
-            order_type_map = {
-                "MARKET": "market",
-                "LIMIT": "limit",
-                "STOP": "stop"
-            }
-            
-            order_type = order_type_map.get(order.get('type', 'MARKET'), 'market')
-            
-            # Create order request
-            request = MarketOrderRequest(
-                symbol=order.get('instrument', '').replace('_', ''),
-                qty=qty,
-                side=side,
-                time_in_force=TimeInForce.DAY,
-                limit_price=float(order.get('price')) if order_type == 'limit' else None,
-                stop_price=float(order.get('price')) if order_type == 'stop' else None
-            )
-            
-            # Submit order
-            response = self.trading_client.submit_order(request)
-            
-            return {
-                "orderFillTransaction": {
-                    "id": response.id,
-                    "instrument": response.symbol,
-                    "units": float(response.qty) if side == OrderSide.BUY else -float(response.qty),
-                    "time": response.submitted_at.isoformat() if response.submitted_at else None
-                }
-            }
+    def submit_order(self, request):
+        """Submit an order request already built by process_order_request"""
+        try:
+            return self._submit(request)
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as err:
             raise Exception(f"Failed to create order: {err}")
 
+    def _submit(self, request):
+        if not self.trading_client:
+            raise ValueError("Trading client not initialized")
+        self.limiter.acquire(ORDER)
+        response = self.trading_client.submit_order(request)
+        qty = float(response.qty)
+        return {
+            "orderFillTransaction": {
+                "id": response.id,
+                "instrument": response.symbol,
+                "units": qty if request.side == OrderSide.BUY else -qty,
+                "time": response.submitted_at.isoformat() if response.submitted_at else None
+            }
+        }
+
     def get_positions(self):
         """Get current positions"""
         try:
             if not self.trading_client:
                 raise ValueError("Trading client not initialized")
                 
+            self.limiter.acquire(ACCOUNT)
             positions = self.trading_client.get_all_positions()
             return {
                 "positions": [
@@ -181,6 +182,8 @@ class AlpacaBroker:
                     } for pos in positions
                 ]
             }
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as err:
             logger.error(f"Failed to get positions: {str(err)}")
             return {"error": str(err)}
@@ -195,6 +198,7 @@ class AlpacaBroker:
             symbol = instrument.replace('_', '')
             
             # Get position details before closing
+            self.limiter.acquire(ORDER, tokens=2)
             position = next((p for p in self.trading_client.get_all_positions() if p.symbol == symbol), None)
             if not position:
                 raise ValueError(f"No open position found for {symbol}")
@@ -211,10 +215,41 @@ class AlpacaBroker:
                     "type": "POSITION_CLOSE"
                 }
             }
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as err:
             logger.error(f"Failed to close position: {str(err)}")
             return {"error": str(err)}
 
+    def submit_orders(self, order_requests, max_workers=4):
+        """Submit several prebuilt order requests concurrently"""
+        return fan_out(self._submit, order_requests, max_workers)
+
+    def close_positions(self, instruments, max_workers=4):
+        """Close several positions concurrently, downloading open positions only once"""
+        if not self.trading_client:
+            raise ValueError("Trading client not initialized")
+        self.limiter.acquire(ACCOUNT)
+        open_symbols = {p.symbol for p in self.trading_client.get_all_positions()}
+
+        def close(instrument):
+            symbol = instrument.replace('_', '')
+            if symbol not in open_symbols:
+                raise ValueError(f"No open position found for {symbol}")
+            self.limiter.acquire(ORDER)
+            response = self.trading_client.close_position(symbol)
+            return {
+                "orderFillTransaction": {
+                    "id": response.id,
+                    "instrument": response.symbol,
+                    "units": str(response.qty),
+                    "time": response.submitted_at.isoformat() if response.submitted_at else None,
+                    "type": "POSITION_CLOSE"
+                }
+            }
+
+        return fan_out(close, instruments, max_workers)
+
     def get_candlestick_data(self, instrument, timeframe="1Min", limit=100):
         """Get candlestick data for an instrument"""
         try:
@@ -235,6 +270,7 @@ class AlpacaBroker:
             alpaca_timeframe = timeframe_map.get(timeframe, timeframe)
             
             # Get historical bars
+            self.limiter.acquire(MARKET_DATA)
             bars = self.data_client.get_stock_bars(
                 symbol=instrument.replace('_', ''),
                 timeframe=alpaca_timeframe,
@@ -255,6 +291,8 @@ class AlpacaBroker:
                     } for bar in bars
                 ]
             }
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as err:
             logger.error(f"Failed to fetch candlestick data: {str(err)}")
             raise ValueError(f"Failed to fetch candlestick data: {str(err)}")
@@ -262,7 +300,8 @@ class AlpacaBroker:
     def get_trades(self):
         """Get open trades"""
         try:
-            trades = self.api.list_orders(status='open')
+            self.limiter.acquire(ACCOUNT)
+            trades = self.rest_api.list_orders(status='open')
             return {
                 "trades": [
                     {
@@ -274,24 +313,35 @@ class AlpacaBroker:
                     } for trade in trades
                 ]
             }
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except Exception as err:
             return {"error": f"Failed to get trades: {str(err)}"}
 
     def process_order_request(self, data):
-        """Process order request data"""
+        """Validate OANDA-style order data and build the matching Alpaca request"""
         try:
             order = data.get('order', {})
-            side = OrderSide.BUY if float(order.get('units', 0)) > 0 else OrderSide.SELL
-            
-            # Create market order request
-            request = MarketOrderRequest(
-                symbol=order.get('instrument', '').replace('_', ''),
-                qty=abs(float(order.get('units', 0))),
-                side=side,
-                time_in_force=TimeInForce.DAY
-            )
-            
-            return request
+            units = float(order.get('units', 0))
+            if units == 0:
+                raise ValueError("units must be non-zero")
+            symbol = order.get('instrument', '').replace('_', '')
+            if not symbol:
+                raise ValueError("instrument is required")
+
+            fields = {
+                'symbol': symbol,
+                'qty': abs(units),
+                'side': OrderSide.BUY if units > 0 else OrderSide.SELL,
+                'time_in_force': TimeInForce.DAY
+            }
+            order_type = order.get('type', 'MARKET')
+            price = order.get('price') or data.get('price')
+            if order_type == 'LIMIT':
+                return LimitOrderRequest(limit_price=float(price), **fields)
+            if order_type == 'STOP':
+                return StopOrderRequest(stop_price=float(price), **fields)
+            return MarketOrderRequest(**fields)
             
         except Exception as e:
             logger.error(f"Error processing order request: {str(e)}")
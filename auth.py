@@ -2,7 +2,8 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash,
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from broker_factory import BrokerFactory
-from models import User, db, BrokerConfig
+from models import User, db
+from user_snapshot import load_user_snapshot
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -77,7 +78,7 @@ def login():
             
             # Initialize broker configurations
             try:
-                broker_configs = BrokerConfig.query.filter_by(user_id=user.id, is_active=True).all()
+                broker_configs = list(load_user_snapshot(user.id).broker_configs.values())
                 broker_factory = BrokerFactory()
                 
                 if broker_configs:
@@ -120,12 +121,7 @@ def check_session():
     if current_user.is_authenticated:
         try:
             # Verify broker configurations
-            broker_configs = BrokerConfig.query.filter_by(
-                user_id=current_user.id,
-                is_active=True
-            ).all()
-            
-            brokers = [config.broker_type for config in broker_configs]
+            brokers = load_user_snapshot(current_user.id).get_active_brokers()
             
             return jsonify({
                 "authenticated": True,
@@ -0,0 +1,196 @@
+"""
+Vectorized backtesting engine
+---
+Simulates a single-instrument strategy from OHLC arrays and boolean
+entry/exit signal arrays without a per-bar Python loop.
+
+    df = load_historical_data('EUR_USD', 'M1', 5000)
+    result = backtest_dataframe(df, entries, exits, stop_loss=0.002, spread=0.0001)
+    result.metrics  # totalReturn, sharpeRatio, maxDrawdown, winRate, ...
+
+Execution model:
+- Signals are evaluated on bar close and filled at the next bar's open,
+  so a strategy can never trade on the bar that produced its signal.
+- Each fill pays half the spread plus slippage (both in price units)
+  and an optional proportional commission.
+- Stop-loss/take-profit levels are fractions of the entry price. They are
+  checked against each bar's high/low; a bar that gaps through a level
+  fills at the open. If both are touched in one bar the stop wins.
+- After a stop the strategy stays flat until its signals exit and
+  enter again.
+- Position size is a fraction of equity, so returns compound.
+"""
+
+from typing import Dict, Any, Optional
+import numpy as np
+
+# Bars per year by OANDA granularity; forex trades ~260 days of 24h
+PERIODS_PER_YEAR = {
+    'M1': 260 * 24 * 60,
+    'M5': 260 * 24 * 12,
+    'M15': 260 * 24 * 4,
+    'M30': 260 * 24 * 2,
+    'H1': 260 * 24,
+    'H4': 260 * 6,
+    'D': 260,
+    'W': 52,
+}
+
+def _shift(values: np.ndarray, fill=0) -> np.ndarray:
+    """values shifted one bar later, first element set to fill"""
+    shifted = np.empty_like(values)
+    shifted[0] = fill
+    shifted[1:] = values[:-1]
+    return shifted
+
+def _ffill_index(mask: np.ndarray) -> np.ndarray:
+    """For each bar, the index of the most recent bar where mask is True (0 if none yet)"""
+    index = np.where(mask, np.arange(len(mask)), 0)
+    return np.maximum.accumulate(index)
+
+def signals_to_target(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """In-market state (0/1) after each bar's close; bars with both signals keep the prior state"""
+    entries = np.asarray(entries, dtype=bool)
+    exits = np.asarray(exits, dtype=bool)
+    events = entries ^ exits
+    last = _ffill_index(events)
+    return (events[last] & entries[last]).astype(np.int8)
+
+class BacktestResult:
+    """Per-bar series, per-trade arrays and summary metrics of one backtest"""
+
+    def __init__(self, equity, returns, positions, trades, metrics):
+        self.equity = equity
+        self.returns = returns
+        self.positions = positions
+        self.trades = trades
+        self.metrics = metrics
+
+    def to_dict(self, include_series: bool = False) -> Dict[str, Any]:
+        result = {'metrics': self.metrics, 'trades': self.trades}
+        if include_series:
+            result['equity'] = self.equity
+            result['returns'] = self.returns
+            result['positions'] = self.positions
+        return result
+
+def run_backtest(open_, high, low, close, entries, exits, direction: str = 'long',
+                 size: float = 1.0, spread: float = 0.0, slippage: float = 0.0,
+                 commission: float = 0.0, stop_loss: Optional[float] = None,
+                 take_profit: Optional[float] = None, initial_capital: float = 10000.0,
+                 periods_per_year: int = PERIODS_PER_YEAR['M1']) -> BacktestResult:
+    """Backtest one strategy over aligned OHLC and signal arrays"""
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    if not (len(open_) == len(high) == len(low) == n == len(entries) == len(exits)):
+        raise ValueError("OHLC and signal arrays must have the same length")
+    if direction not in ('long', 'short'):
+        raise ValueError("direction must be 'long' or 'short'")
+    if n < 2:
+        raise ValueError("At least two bars are required")
+    sign = 1.0 if direction == 'long' else -1.0
+
+    # Position held during each bar, entered at that bar's open
+    in_market = _shift(signals_to_target(entries, exits)).astype(bool)
+    starts = in_market & ~_shift(in_market, False)
+    trade_id = np.where(in_market, np.cumsum(starts), 0)
+    entry_index = _ffill_index(starts)
+    entry_price = open_[entry_index]
+
+    # Stop-loss / take-profit: find the first bar of each trade that touches a level
+    hit_stop = np.zeros(n, dtype=bool)
+    hit_target = np.zeros(n, dtype=bool)
+    if stop_loss is not None:
+        stop_price = entry_price * (1 - sign * stop_loss)
+        hit_stop = in_market & ((low <= stop_price) if sign > 0 else (high >= stop_price))
+    if take_profit is not None:
+        target_price = entry_price * (1 + sign * take_profit)
+        hit_target = in_market & ((high >= target_price) if sign > 0 else (low <= target_price))
+    hit = hit_stop | hit_target
+    hits = np.cumsum(hit)
+    hits_in_trade = hits - (hits[entry_index] - hit[entry_index])
+    stopped = hit & (hits_in_trade == 1)
+    stopped_earlier = in_market & (hits_in_trade - hit > 0)
+
+    exit_price = close.copy()
+    if stop_loss is not None:
+        gap_fill = np.minimum(open_, stop_price) if sign > 0 else np.maximum(open_, stop_price)
+        exit_price = np.where(stopped & hit_stop, gap_fill, exit_price)
+    if take_profit is not None:
+        gap_fill = np.maximum(open_, target_price) if sign > 0 else np.minimum(open_, target_price)
+        exit_price = np.where(stopped & ~hit_stop & hit_target, gap_fill, exit_price)
+
+    position = np.where(in_market & ~stopped_earlier, sign * size, 0.0)
+    held = np.where(stopped, 0.0, position)          # carried over the bar's close
+    prev_held = _shift(held, 0.0)
+    prev_close = _shift(close, np.nan)
+    prev_close[0] = open_[0]
+
+    # Costs as a fraction of notional: half spread + slippage per fill, plus commission
+    open_cost = (spread / 2 + slippage) / open_ + commission
+    exit_cost = (spread / 2 + slippage) / exit_price + commission
+    exit_at_open = np.abs(prev_held) * (position == 0)
+    entry_at_open = np.abs(position) * (prev_held == 0)
+
+    # Overnight leg (previous close -> open, plus exit fills) belongs to the previous trade;
+    # the intrabar leg (open -> close or stop fill) to the current one
+    gap_leg = prev_held * (open_ / prev_close - 1) - exit_at_open * open_cost
+    bar_leg = (position * (exit_price / open_ - 1) - entry_at_open * open_cost
+               - stopped * np.abs(position) * exit_cost)
+    returns = (1 + gap_leg) * (1 + bar_leg) - 1
+    equity = initial_capital * np.cumprod(1 + returns)
+
+    # Per-trade returns by summing log growth over each trade's legs
+    trade_count = int(trade_id.max())
+    log_growth = (np.bincount(_shift(trade_id), weights=np.log1p(gap_leg), minlength=trade_count + 1)
+                  + np.bincount(trade_id, weights=np.log1p(bar_leg), minlength=trade_count + 1))
+    trade_returns = np.expm1(log_growth[1:])
+    start_index = np.flatnonzero(starts)
+    equity_before = _shift(equity, initial_capital)[start_index]
+    trade_pnl = equity_before * trade_returns
+
+    trades = {
+        'entry_index': start_index,
+        'entry_price': open_[start_index],
+        'return': trade_returns,
+        'pnl': trade_pnl,
+    }
+    return BacktestResult(equity, returns, position, trades,
+                          compute_metrics(equity, returns, trade_pnl, position,
+                                          initial_capital, periods_per_year))
+
+def compute_metrics(equity: np.ndarray, returns: np.ndarray, trade_pnl: np.ndarray,
+                    position: np.ndarray, initial_capital: float, periods_per_year: int) -> Dict[str, Any]:
+    """Summary metrics in the shape documented in docs/_docs/backtesting.md"""
+    total_return = equity[-1] / initial_capital - 1
+    years = len(returns) / periods_per_year
+    volatility = returns.std()
+    peak = np.maximum.accumulate(np.maximum(equity, initial_capital))
+    wins = trade_pnl[trade_pnl > 0]
+    losses = trade_pnl[trade_pnl < 0]
+
+    return {
+        'totalReturn': float(total_return),
+        'annualizedReturn': float((1 + total_return) ** (1 / years) - 1) if years > 0 and total_return > -1 else None,
+        'sharpeRatio': float(returns.mean() / volatility * np.sqrt(periods_per_year)) if volatility > 0 else 0.0,
+        'maxDrawdown': float((1 - equity / peak).max()),
+        'winRate': float(len(wins) / len(trade_pnl)) if len(trade_pnl) else 0.0,
+        'profitFactor': float(wins.sum() / -losses.sum()) if len(losses) else None,
+        'averageTrade': float(trade_pnl.mean()) if len(trade_pnl) else 0.0,
+        'tradeCount': int(len(trade_pnl)),
+        'exposure': float(np.count_nonzero(position) / len(position)),
+        'finalEquity': float(equity[-1]),
+    }
+
+def backtest_dataframe(df, entries, exits, granularity: Optional[str] = None, **kwargs) -> BacktestResult:
+    """Backtest over a candle DataFrame as returned by trading.load_historical_data"""
+    if granularity is None and 'granularity' in df and len(df):
+        granularity = df['granularity'].iat[0]
+    kwargs.setdefault('periods_per_year', PERIODS_PER_YEAR.get(granularity, PERIODS_PER_YEAR['M1']))
+    return run_backtest(
+        df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(),
+        np.asarray(entries, dtype=bool), np.asarray(exits, dtype=bool), **kwargs
+    )
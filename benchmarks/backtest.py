@@ -0,0 +1,74 @@
+"""
+Backtest benchmark
+---
+Times backtesting.run_backtest over a synthetic random-walk series the
+size of one year of M1 forex bars, using an SMA crossover with spread,
+slippage, stop-loss and take-profit enabled.
+
+Usage:
+    python benchmarks/backtest.py [--bars 374400] [--runs 5] [--max-seconds 1.0]
+
+Exits non-zero when the median run exceeds --max-seconds.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backtesting import run_backtest, PERIODS_PER_YEAR
+
+def synthetic_ohlc(bars: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 2e-4, bars)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, 5e-5, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 1e-4, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 1e-4, bars)))
+    return open_, high, low, close
+
+def sma_crossover(close, fast: int = 20, slow: int = 50):
+    cumsum = np.cumsum(np.r_[0.0, close])
+    fast_ma = np.full(len(close), np.nan)
+    slow_ma = np.full(len(close), np.nan)
+    fast_ma[fast - 1:] = (cumsum[fast:] - cumsum[:-fast]) / fast
+    slow_ma[slow - 1:] = (cumsum[slow:] - cumsum[:-slow]) / slow
+    above = fast_ma > slow_ma
+    return above & ~np.r_[False, above[:-1]], fast_ma < slow_ma
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=PERIODS_PER_YEAR['M1'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    args = parser.parse_args()
+
+    open_, high, low, close = synthetic_ohlc(args.bars)
+    entries, exits = sma_crossover(close)
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = run_backtest(open_, high, low, close, entries, exits, spread=1e-4, slippage=2e-5,
+                              stop_loss=0.001, take_profit=0.002)
+        timings.append(time.perf_counter() - started)
+
+    report = {
+        "bars": args.bars,
+        "seconds_median": round(statistics.median(timings), 4),
+        "seconds_min": round(min(timings), 4),
+        "metrics": result.metrics,
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = args.max_seconds is not None and report["seconds_median"] > args.max_seconds
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
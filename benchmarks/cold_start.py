@@ -0,0 +1,95 @@
+"""
+Cold start benchmark
+---
+Measures how long `import main` takes in a fresh interpreter, the peak
+RSS of that interpreter, the slowest imported modules, and whether any
+heavy SDK was pulled in eagerly. The probe runs from a scratch directory,
+so config.ini is not read and configuration fallbacks apply.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--max-seconds 2.0] [--max-rss-mb 150]
+
+Exits non-zero when a budget is exceeded or a heavy module is imported
+at start-up, so it can run in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load on first use
+LAZY_MODULES = [
+    'pandas',
+    'google.generativeai',
+    'oandapyV20',
+    'alpaca',
+    'alpaca_trade_api',
+    'websocket',
+]
+
+PROBE = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+eager = [name for name in %r if name in sys.modules]
+print(json.dumps({"seconds": elapsed, "rss_mb": rss_kb / 1024, "eager": eager}))
+"""
+
+def _run(args):
+    # Run from a scratch directory so the probe doesn't append to the repo's main.log
+    env = {**os.environ, 'PYTHONPATH': ROOT + os.pathsep + os.environ.get('PYTHONPATH', '')}
+    with tempfile.TemporaryDirectory() as scratch:
+        return subprocess.run([sys.executable] + args, cwd=scratch, env=env,
+                              capture_output=True, text=True, check=True)
+
+def run_probe():
+    """Import main once in a fresh interpreter and return its measurements"""
+    output = _run(['-c', PROBE % (LAZY_MODULES,)]).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(limit=10):
+    """Top modules by cumulative import time from -X importtime"""
+    stderr = _run(['-X', 'importtime', '-c', 'import main']).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative_us), name))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 2)} for us, name in rows[:limit]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    parser.add_argument('--max-rss-mb', type=float, default=None)
+    args = parser.parse_args()
+
+    probes = [run_probe() for _ in range(args.runs)]
+    report = {
+        "import_seconds_median": round(statistics.median(p["seconds"] for p in probes), 4),
+        "import_seconds_min": round(min(p["seconds"] for p in probes), 4),
+        "rss_mb_max": round(max(p["rss_mb"] for p in probes), 1),
+        "eager_heavy_modules": probes[0]["eager"],
+        "slowest_imports": slowest_imports(),
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = bool(report["eager_heavy_modules"])
+    if args.max_seconds is not None and report["import_seconds_median"] > args.max_seconds:
+        failed = True
+    if args.max_rss_mb is not None and report["rss_mb_max"] > args.max_rss_mb:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
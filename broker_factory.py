@@ -1,13 +1,38 @@
 from flask import config, session
-from oanda_broker import OandaBroker
-from alpaca_broker import AlpacaBroker
 import configparser
 from typing import Dict, Optional, Any
-from models import User, BrokerConfig
+from models import User
+from user_snapshot import UserSnapshot, load_user_snapshot
+from circuit_breaker import breakers, GuardedBroker, CLOSED
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Connected broker clients shared across requests, keyed by (user_id, broker_type)
+# and tagged with the configuration snapshot version they were built from
+_warm_brokers: Dict[tuple, tuple] = {}
+_warm_lock = threading.Lock()
+
+def get_warm_broker(user_id: int, broker_type: str, version: int) -> Optional[Any]:
+    """Connected broker built from the same configuration version, if any"""
+    with _warm_lock:
+        entry = _warm_brokers.get((user_id, broker_type))
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    return None
+
+def keep_warm(user_id: int, broker_type: str, version: int, broker: Any) -> None:
+    with _warm_lock:
+        _warm_brokers[(user_id, broker_type)] = (version, broker)
+
+def drop_warm_brokers(user_id: int) -> None:
+    """Forget a user's cached broker clients (e.g. after a connection failure)"""
+    with _warm_lock:
+        for key in [key for key in _warm_brokers if key[0] == user_id]:
+            del _warm_brokers[key]
+
 class BrokerFactory:
     def __init__(self, config_path='config.ini'):
         self.config = configparser.ConfigParser()
@@ -16,19 +41,29 @@ class BrokerFactory:
         self.broker_status: Dict[str, str] = {}
         self.current_broker: Optional[str] = None
         self.active_brokers = set()
+        self.breakers: Dict[str, Any] = {}
 
-    def initialize_user_brokers(self, user: User) -> bool:
-        """Initialize all active brokers for a user"""
+    def initialize_user_brokers(self, user) -> bool:
+        """Initialize all active brokers for a user (a User or a UserSnapshot)"""
         try:
-            logger.info(f"Initializing brokers for user {user.id}")
-            configs = BrokerConfig.query.filter_by(
-                user_id=user.id,
-                is_active=True
-            ).all()
+            snapshot = user if isinstance(user, UserSnapshot) else load_user_snapshot(user.id)
+            logger.info(f"Initializing brokers for user {snapshot.user_id}")
             
             success = False
             
-            for config in configs:
+            for config in snapshot.broker_configs.values():
+                # Reuse the connected client (and its open HTTP session) from earlier requests
+                broker = get_warm_broker(snapshot.user_id, config.broker_type, snapshot.version)
+                if broker is not None:
+                    self.brokers[config.broker_type] = broker
+                    self.breakers[config.broker_type] = broker.breaker
+                    self.broker_status[config.broker_type] = "connected"
+                    self.active_brokers.add(config.broker_type)
+                    if not self.current_broker:
+                        self.set_current_broker(config.broker_type)
+                    success = True
+                    continue
+
                 if config.broker_type == 'oanda':
                     success = self.add_broker(
                         broker_type='oanda',
@@ -43,6 +78,8 @@ class BrokerFactory:
                     )
                 
                 if success:
+                    keep_warm(snapshot.user_id, config.broker_type, snapshot.version,
+                              self.brokers[config.broker_type])
                     self.active_brokers.add(config.broker_type)
                     logger.info(f"Successfully initialized {config.broker_type} broker")
                     
@@ -56,25 +93,43 @@ class BrokerFactory:
             logger.error(f"Error initializing brokers: {e}")
             return False
 
+    def _build_broker(self, broker_type: str, api_key: str = None, api_secret: str = None,
+                      account_id: str = None) -> Any:
+        # Broker SDKs are imported on first use to keep worker start-up light
+        if broker_type == 'oanda':
+            if not api_key or not account_id:
+                raise ValueError("OANDA requires both API key and account ID")
+            from oanda_broker import OandaBroker
+            return OandaBroker(api_key=api_key, account_id=account_id,
+                               timeout=self.config.getfloat('BROKERS', 'REQUEST_TIMEOUT', fallback=10.0))
+        if broker_type == 'alpaca':
+            if not api_key or not api_secret:
+                raise ValueError("Alpaca requires both API key and secret")
+            from alpaca_broker import AlpacaBroker
+            return AlpacaBroker(api_key=api_key, api_secret=api_secret)
+        raise ValueError(f"Unsupported broker type: {broker_type}")
+
     def add_broker(self, broker_type: str, api_key: str = None, api_secret: str = None, account_id: str = None) -> bool:
-        """Add a broker instance to the factory"""
+        """Add a broker instance to the factory, guarded by its credential's circuit breaker"""
         try:
             logger.info(f"Adding broker: {broker_type}")
-            if broker_type == 'oanda':
-                if not api_key or not account_id:
-                    raise ValueError("OANDA requires both API key and account ID")
-                broker = OandaBroker(api_key=api_key, account_id=account_id)
-                
-            elif broker_type == 'alpaca':
-                if not api_key or not api_secret:
-                    raise ValueError("Alpaca requires both API key and secret")
-                broker = AlpacaBroker(api_key=api_key, api_secret=api_secret)
-            else:
-                raise ValueError(f"Unsupported broker type: {broker_type}")
+            broker = self._build_broker(broker_type, api_key, api_secret, account_id)
+            breaker = breakers.get(broker_type, f"{api_key}:{account_id or ''}", probe=broker.test_connection)
+
+            # Fail fast instead of waiting on a connection test we expect to time out
+            if breaker.state != CLOSED:
+                self.broker_status[broker_type] = "circuit_open"
+                self.breakers[broker_type] = breaker
+                logger.warning(f"Not connecting {broker_type}: {breaker.last_error}")
+                return False
 
-            # Test connection
-            if broker.test_connection():
-                self.brokers[broker_type] = broker
+            started = time.perf_counter()
+            connected = broker.test_connection()
+            breaker.record(connected, time.perf_counter() - started, None if connected else "connection test failed")
+            self.breakers[broker_type] = breaker
+
+            if connected:
+                self.brokers[broker_type] = GuardedBroker(broker, breaker)
                 self.broker_status[broker_type] = "connected"
                 self.active_brokers.add(broker_type)
                 logger.info(f"Successfully added and connected {broker_type} broker")
@@ -89,6 +144,15 @@ class BrokerFactory:
             self.broker_status[broker_type] = "error"
             return False
 
+    def test_broker_connection(self, broker_type: str, api_key: str = None, api_secret: str = None,
+                               account_id: str = None) -> bool:
+        """Check credentials without adding the broker to the factory"""
+        try:
+            return bool(self._build_broker(broker_type, api_key, api_secret, account_id).test_connection())
+        except Exception as e:
+            logger.error(f"Connection test for {broker_type} failed: {str(e)}")
+            return False
+
     def get_broker(self, broker_type: Optional[str] = None) -> Any:
         """Get broker instance, defaulting to current if none specified"""
         try:
@@ -124,8 +188,20 @@ class BrokerFactory:
 
     def get_broker_status(self, broker_type: str) -> str:
         """Get connection status for a broker"""
+        breaker = self.breakers.get(broker_type)
+        if breaker is not None and breaker.state != CLOSED:
+            return "circuit_open"
         return self.broker_status.get(broker_type, "not_configured")
 
+    def check_broker_status(self, broker_type: str) -> bool:
+        """True if the broker is connected and its circuit is closed"""
+        return self.get_broker_status(broker_type) == "connected"
+
+    def get_health(self, broker_type: str) -> Dict[str, Any]:
+        """Circuit state, rolling error rate and latency for a broker"""
+        breaker = self.breakers.get(broker_type)
+        return breaker.snapshot() if breaker is not None else {'state': None}
+
     def get_available_brokers(self) -> list:
         """Get list of initialized broker types"""
         return list(self.brokers.keys())
@@ -144,6 +220,7 @@ class BrokerFactory:
     def cleanup(self) -> None:
         """Clean up broker connections"""
         self.brokers.clear()
+        self.breakers.clear()
         self.broker_status.clear()
         self.current_broker = None
         self.active_brokers.clear()
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Pre-serialized chart snapshots
+---
+MarketDataServer keeps one ChartSnapshot per pair and timeframe so
+/api/chart_data can send ready-made bytes instead of formatting the
+buffer on every read.
+
+- When a bar arrives, only that bar is converted to a chart row and
+  serialized; rows are kept sorted and de-duplicated by (timestamp, type),
+  so hourly historical refreshes don't repeat bars.
+- The full body is assembled by joining the serialized rows, once per
+  snapshot version and format, on the first read after a change. It is
+  wrapped in an EncodedBody, so each compressed form is also built once.
+- Every other read is a memory copy, whatever the buffer size.
+
+    version, last_timestamp, count, body = server.get_chart_snapshot('EUR-USD', '1m').render()
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from bisect import insort
+import json
+import threading
+import time
+
+from http_cache import EncodedBody
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+CHART_COLUMNS = ['timestamp', 'price', 'open', 'high', 'low', 'close']
+
+# Entry types each timeframe is built from; 'live' is what the chart has always shown
+TIMEFRAMES = {
+    'live': ('per-minute', 'per-second'),
+    '1m': ('per-minute',),
+    '1s': ('per-second',)
+}
+DEFAULT_TIMEFRAME = 'live'
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+def chart_row(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Chart point for a per-minute/per-second buffer entry"""
+    return {
+        'timestamp': entry['timestamp'],
+        'price': (entry['HH'] + entry['LL']) / 2,  # Use mid-price
+        'high': entry['HH'],
+        'low': entry['LL'],
+        'open': entry.get('open', entry['LH']),
+        'close': entry.get('close', entry['HL'])
+    }
+
+class ChartSnapshot:
+    def __init__(self, pair: str, timeframe: str, max_rows: int):
+        self.pair = pair
+        self.timeframe = timeframe
+        self.max_rows = max_rows
+        self.keys: List[Tuple[int, str]] = []  # sorted (timestamp, entry type)
+        self.rows: Dict[Tuple[int, str], Tuple[bytes, tuple]] = {}  # key -> (record JSON, column values)
+        self.version = 0
+        self.last_timestamp: Optional[int] = None
+        self._rendered: Dict[bool, Tuple[int, int, EncodedBody]] = {}  # columnar -> (version, count, body)
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        """Serialize one bar into the snapshot; returns False if it was already there unchanged"""
+        row = chart_row(entry)
+        values = tuple(row[column] for column in CHART_COLUMNS)
+        key = (entry['timestamp'], entry['type'])
+        with self._lock:
+            existing = self.rows.get(key)
+            if existing is not None and existing[1] == values:
+                return False
+            if existing is None:
+                if len(self.keys) >= self.max_rows and key < self.keys[0]:
+                    return False  # older than everything kept
+                if not self.keys or key > self.keys[-1]:
+                    self.keys.append(key)
+                else:
+                    insort(self.keys, key)
+            self.rows[key] = (_dumps(row), values)
+            while len(self.keys) > self.max_rows:
+                del self.rows[self.keys.pop(0)]
+            if self.last_timestamp is None or key[0] > self.last_timestamp:
+                self.last_timestamp = key[0]
+            self.version += 1
+        return True
+
+    def render(self, columnar: bool = False) -> Tuple[int, Optional[int], int, EncodedBody]:
+        """(version, last timestamp, row count, body), built once per version and format"""
+        with self._lock:
+            rendered = self._rendered.get(columnar)
+            if rendered is None or rendered[0] != self.version:
+                rendered = self._rendered[columnar] = (self.version, len(self.keys), self._build(columnar))
+            return rendered[0], self.last_timestamp, rendered[1], rendered[2]
+
+    def _build(self, columnar: bool) -> EncodedBody:
+        metadata = _dumps({
+            'format': 'columnar' if columnar else 'records',
+            'pair': self.pair,
+            'timeframe': self.timeframe,
+            'last_update': int(time.time() * 1000),
+            'last_timestamp': self.last_timestamp,
+            'since': None,
+            'count': len(self.keys),
+            'type': 'real-time'
+        })
+        if columnar:
+            columns = zip(*(self.rows[key][1] for key in self.keys)) if self.keys else ([] for _ in CHART_COLUMNS)
+            data = _dumps(dict(zip(CHART_COLUMNS, columns)))
+        else:
+            data = b'[' + b','.join(self.rows[key][0] for key in self.keys) + b']'
+        return EncodedBody(b'{"data":' + data + b',"metadata":' + metadata + b'}')
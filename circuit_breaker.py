@@ -0,0 +1,233 @@
+"""
+Broker circuit breakers
+---
+Keeps a slow or failing broker from tying up request threads.
+
+Each broker credential gets a CircuitBreaker shared by every request. It
+keeps a rolling WINDOW of call outcomes and latencies:
+
+    closed     calls go through; the breaker opens once the window has
+               MIN_CALLS calls and either ERROR_RATE of them failed or
+               SLOW_RATE of them took longer than SLOW_CALL seconds
+    open       calls fail immediately with BrokerUnavailable
+    half_open  a background thread is probing the broker with
+               test_connection(); success closes the breaker, failure
+               reopens it with a longer cooldown (doubling up to MAX_COOLDOWN)
+
+Request threads never probe; they only record outcomes and check state.
+GuardedBroker wraps a broker client so every public call is tracked.
+Exceptions caused by the caller's input (ValueError, KeyError, TypeError)
+or by local rate-limit queueing (RateLimitTimeout) aren't recorded at all;
+{"error": ...} results from read methods are, since those methods report
+upstream failures that way.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+from collections import deque
+import hashlib
+import logging
+import threading
+import time
+
+from rate_limit import RateLimitTimeout
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+DEFAULT_WINDOW = 30.0
+DEFAULT_MIN_CALLS = 5
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_SLOW_CALL = 5.0
+DEFAULT_SLOW_RATE = 0.8
+DEFAULT_COOLDOWN = 15.0
+MAX_COOLDOWN = 300.0
+PROBE_INTERVAL = 1.0
+
+CALLER_ERRORS = (ValueError, KeyError, TypeError)
+# Raised before the broker is contacted, so they say nothing about its health
+LOCAL_ERRORS = CALLER_ERRORS + (RateLimitTimeout,)
+# Methods that return {"error": ...} instead of raising when the upstream fails
+ERROR_DICT_METHODS = {'get_account_details', 'get_positions', 'get_trades'}
+# Pure local work that never reaches the broker
+UNGUARDED_METHODS = {'process_order_request', 'test_connection'}
+
+class BrokerUnavailable(ConnectionError):
+    """The broker's circuit is open; the call was not attempted"""
+
+class CircuitBreaker:
+    def __init__(self, name: str, probe: Optional[Callable[[], bool]] = None, window: float = DEFAULT_WINDOW,
+                 min_calls: int = DEFAULT_MIN_CALLS, error_rate: float = DEFAULT_ERROR_RATE,
+                 slow_call: float = DEFAULT_SLOW_CALL, slow_rate: float = DEFAULT_SLOW_RATE,
+                 cooldown: float = DEFAULT_COOLDOWN):
+        self.name = name
+        self.probe = probe
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.calls: deque = deque()  # (monotonic time, ok, seconds)
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raise BrokerUnavailable unless calls may go through"""
+        if self.state != CLOSED:
+            retry_in = max(self.opened_at + self.cooldown - time.monotonic(), 0) if self.opened_at else 0
+            raise BrokerUnavailable(f"{self.name} is unavailable ({self.last_error}); retrying in {retry_in:.0f}s")
+
+    def record(self, ok: bool, seconds: float, error: Optional[str] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.calls.append((now, ok, seconds))
+            self._trim(now)
+            if not ok:
+                self.last_error = error
+            if self.state == CLOSED:
+                reason = self._open_reason()
+                if reason:
+                    self._open(now, reason)
+
+    def _trim(self, now: float) -> None:
+        while self.calls and self.calls[0][0] < now - self.window:
+            self.calls.popleft()
+
+    def _open_reason(self) -> Optional[str]:
+        total = len(self.calls)
+        if total < self.min_calls:
+            return None
+        failed = sum(1 for _, ok, _ in self.calls if not ok)
+        if failed / total >= self.error_rate:
+            return f"{failed}/{total} calls failed, last: {self.last_error}"
+        slow = sum(1 for _, _, seconds in self.calls if seconds >= self.slow_call)
+        if slow / total >= self.slow_rate:
+            return f"{slow}/{total} calls slower than {self.slow_call:g}s"
+        return None
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.last_error = reason
+        logger.warning(f"Circuit for {self.name} opened: {reason}")
+
+    def due_for_probe(self) -> bool:
+        return self.state == OPEN and time.monotonic() >= self.opened_at + self.cooldown
+
+    def run_probe(self) -> bool:
+        """Half-open and test the broker; called from the probe thread only"""
+        with self._lock:
+            self.state = HALF_OPEN
+        started = time.perf_counter()
+        try:
+            healthy = bool(self.probe()) if self.probe else True
+            error = None if healthy else "health probe failed"
+        except Exception as e:
+            healthy, error = False, str(e)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if healthy and elapsed < self.slow_call:
+                self.state = CLOSED
+                self.opened_at = None
+                self.cooldown = self.base_cooldown
+                self.calls.clear()
+                logger.info(f"Circuit for {self.name} closed after a healthy probe")
+            else:
+                self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+                self._open(time.monotonic(), error or f"health probe took {elapsed:.1f}s")
+        return healthy
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            latencies = sorted(seconds for _, _, seconds in self.calls)
+            failed = sum(1 for _, ok, _ in self.calls if not ok)
+
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else None
+
+        return {
+            'state': self.state,
+            'calls': len(latencies),
+            'error_rate': round(failed / len(latencies), 3) if latencies else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'last_error': self.last_error,
+            'retry_in_s': round(max(self.opened_at + self.cooldown - now, 0), 1) if self.opened_at else None
+        }
+
+class GuardedBroker:
+    """Proxy that routes a broker's public calls through its circuit breaker"""
+
+    def __init__(self, broker: Any, breaker: CircuitBreaker):
+        self._broker = broker
+        self.breaker = breaker
+
+    @property
+    def unwrapped(self) -> Any:
+        return self._broker
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._broker, attr)
+        if attr.startswith('_') or attr in UNGUARDED_METHODS or not callable(value):
+            return value
+        breaker = self.breaker
+
+        def guarded(*args, **kwargs):
+            breaker.allow()
+            started = time.perf_counter()
+            try:
+                result = value(*args, **kwargs)
+            except LOCAL_ERRORS:
+                raise  # says nothing about the broker's health
+            except Exception as e:
+                breaker.record(False, time.perf_counter() - started, str(e))
+                raise
+            failed = attr in ERROR_DICT_METHODS and isinstance(result, dict) and 'error' in result
+            breaker.record(not failed, time.perf_counter() - started, str(result['error']) if failed else None)
+            return result
+
+        guarded.__name__ = attr
+        return guarded
+
+class BreakerRegistry:
+    """Process-wide breakers keyed by broker type and hashed credential, plus the probe thread"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+
+    def configure(self, **settings) -> None:
+        """Settings for breakers created from now on"""
+        self.settings.update(settings)
+
+    def get(self, broker_type: str, credential: str, probe: Optional[Callable[[], bool]] = None) -> CircuitBreaker:
+        digest = hashlib.blake2b(str(credential).encode(), digest_size=8).hexdigest()
+        key = (broker_type, digest)
+        with self._lock:
+            breaker = self.breakers.get(key)
+            if breaker is None:
+                breaker = self.breakers[key] = CircuitBreaker(f"{broker_type}:{digest[:6]}", probe, **self.settings)
+            elif probe is not None:
+                breaker.probe = probe  # probe with the most recently built client
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, name='broker-probe', daemon=True)
+                self._prober.start()
+        return breaker
+
+    def _probe_loop(self) -> None:
+        while True:
+            time.sleep(PROBE_INTERVAL)
+            for breaker in list(self.breakers.values()):
+                if breaker.due_for_probe():
+                    breaker.run_probe()
+
+breakers = BreakerRegistry()
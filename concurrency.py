@@ -0,0 +1,32 @@
+"""
+Bounded fan-out helper
+---
+Runs one blocking call per item on a small thread pool and returns
+per-item outcomes in input order, so one failure never hides the rest.
+
+    results = fan_out(broker.close_position, ['EUR_USD', 'GBP_USD'], max_workers=4)
+    # [{'result': {...}, 'elapsed_ms': 84.1}, {'error': '...', 'elapsed_ms': 91.7}]
+"""
+
+from typing import Any, Callable, Dict, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+def _timed_call(function: Callable, item: Any) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        outcome = {'result': function(item)}
+    except Exception as e:
+        outcome = {'error': str(e)}
+    outcome['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return outcome
+
+def fan_out(function: Callable, items: Iterable[Any], max_workers: int = 4) -> List[Dict[str, Any]]:
+    """Call function(item) for every item with at most max_workers in flight"""
+    items = list(items)
+    if not items:
+        return []
+    if len(items) == 1 or max_workers <= 1:
+        return [_timed_call(function, item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='fan-out') as pool:
+        return list(pool.map(lambda item: _timed_call(function, item), items))
@@ -0,0 +1,153 @@
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import and_, or_, desc, func, text
+import base64
+import logging
+
+from models import db, Conversation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PREVIEW_LENGTH = 80
+
+FTS_TABLE = 'conversation_fts'
+
+# SQLite FTS5 index over message/response, kept in sync by triggers
+FTS_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(message, response, content='conversation', content_rowid='id')""",
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_fts_ai AFTER INSERT ON conversation BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message, response) VALUES (new.id, new.message, new.response);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_fts_ad AFTER DELETE ON conversation BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, response)
+        VALUES ('delete', old.id, old.message, old.response);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_fts_au AFTER UPDATE ON conversation BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, response)
+        VALUES ('delete', old.id, old.message, old.response);
+        INSERT INTO {FTS_TABLE}(rowid, message, response) VALUES (new.id, new.message, new.response);
+    END""",
+]
+
+_fts_available = None
+# Build the index on the first search if the migration hasn't; main sets this from [DATABASE] ENABLE_SEARCH_INDEX
+build_index_on_demand = True
+
+def encode_cursor(timestamp: datetime, conversation_id: int) -> str:
+    """Opaque cursor pointing just past a (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{conversation_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, conversation_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(conversation_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def ensure_search_index() -> bool:
+    """Create the FTS5 index and triggers if SQLite supports them"""
+    global _fts_available
+    if db.engine.dialect.name != 'sqlite':
+        _fts_available = False
+        return False
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                {'name': FTS_TABLE}
+            ).first()
+            for statement in FTS_STATEMENTS:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows written before the triggers existed
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        _fts_available = True
+    except Exception as e:
+        logger.warning(f"Full-text search index unavailable: {str(e)}")
+        _fts_available = False
+    return _fts_available
+
+def search_index_available() -> bool:
+    """Whether the FTS index exists, building it on first use if allowed; checked once per process"""
+    global _fts_available
+    if _fts_available is None:
+        try:
+            _fts_available = db.engine.dialect.name == 'sqlite' and db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                {'name': FTS_TABLE}
+            ).first() is not None
+        except Exception:
+            _fts_available = False
+        if not _fts_available and build_index_on_demand and db.engine.dialect.name == 'sqlite':
+            ensure_search_index()
+    return _fts_available
+
+def _serialize(row, full: bool) -> Dict[str, Any]:
+    item = {
+        'id': row.id,
+        'broker_context': row.broker_context,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None
+    }
+    if full:
+        item['message'] = row.message
+        item['response'] = row.response
+    else:
+        item['preview'] = row.preview
+    return item
+
+def fetch_page(user_id: int, since: Optional[datetime] = None, cursor: Optional[str] = None,
+               limit: int = DEFAULT_PAGE_SIZE, full: bool = False, search: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch one page of a user's conversations, newest first.
+
+    Uses keyset pagination on (timestamp, id) so each page is an index range
+    scan on ix_conversation_user_timestamp regardless of depth. The listing
+    projection only selects a short message preview unless ``full`` is set.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    if full:
+        columns = [Conversation.id, Conversation.broker_context, Conversation.timestamp,
+                   Conversation.message, Conversation.response]
+    else:
+        columns = [Conversation.id, Conversation.broker_context, Conversation.timestamp,
+                   func.substr(Conversation.message, 1, PREVIEW_LENGTH).label('preview')]
+
+    query = db.session.query(*columns).filter(Conversation.user_id == user_id)
+    if since is not None:
+        query = query.filter(Conversation.timestamp >= since)
+
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Conversation.timestamp < cursor_ts,
+            and_(Conversation.timestamp == cursor_ts, Conversation.id < cursor_id)
+        ))
+
+    if search:
+        if search_index_available():
+            # Quote as a single FTS phrase so user input can't inject query syntax
+            phrase = '"' + search.replace('"', '""') + '"'
+            matches = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q").bindparams(q=phrase)
+            query = query.filter(Conversation.id.in_(matches))
+        else:
+            pattern = f"%{search}%"
+            query = query.filter(or_(Conversation.message.like(pattern), Conversation.response.like(pattern)))
+
+    rows = query.order_by(desc(Conversation.timestamp), desc(Conversation.id)).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more and rows else None
+
+    return {
+        'conversations': [_serialize(row, full) for row in rows],
+        'count': len(rows),
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
@@ -8,6 +8,9 @@ import logging
 from collections import deque
 import os
 
+from rate_limit import rate_limiter, BACKFILL
+from chart_snapshot import ChartSnapshot, TIMEFRAMES, DEFAULT_TIMEFRAME
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,7 +23,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class MarketDataServer:
-    def __init__(self, api_key, pairs=None):
+    def __init__(self, api_key, pairs=None, max_indicators=32, indicator_idle_ttl=600):
         self.api_key = api_key
         self.pairs = pairs or ['EUR-USD']  # Default to EUR-USD if no pairs specified
         self.ws = None
@@ -32,11 +35,26 @@ class MarketDataServer:
         self.ws_lock = threading.Lock()  # Lock for WebSocket operations
         self.reconnect_delay = 5  # Initial reconnect delay
         self.max_reconnect_delay = 60  # Maximum reconnect delay
+        self.versions = {}  # Bumped on every buffer change, used for ETags
+        self.last_timestamps = {}  # Latest tick timestamp (ms) per pair
+        self.last_prices = {}  # Latest quote mid or bar close per pair
+        self.indicators = {}  # pair -> {key: live indicator state}
+        self.indicator_lock = threading.Lock()
+        self.max_indicators = max_indicators  # live indicators per pair, each updated on every bar
+        self.indicator_idle_ttl = indicator_idle_ttl  # seconds unread before an indicator is detached
+        self.tick_listeners = []  # callables(pair, entry), run for live ticks only
+        self.snapshots = {}  # pair -> {timeframe: ChartSnapshot}, serialized chart payloads
         
         # Initialize buffers for each pair
         for pair in self.pairs:
             self.data_buffer[pair] = deque(maxlen=self.buffer_size)
             self.last_historical_update[pair] = 0
+            self.versions[pair] = 0
+            self.last_timestamps[pair] = None
+            self.last_prices[pair] = None
+            self.indicators[pair] = {}
+            self.snapshots[pair] = {timeframe: ChartSnapshot(pair, timeframe, self.buffer_size)
+                                    for timeframe in TIMEFRAMES}
             
         # Ensure data directory exists
         os.makedirs('feeds/forex', exist_ok=True)
@@ -50,6 +68,8 @@ class MarketDataServer:
             
             url = f"https://api.polygon.io/v2/aggs/ticker/C:{pair}/range/1/minute/{start.strftime('%Y-%m-%d')}/{end.strftime('%Y-%m-%d')}?adjusted=true&sort=asc&limit=50000&apiKey={self.api_key}"
             
+            # Backfill is the lowest priority user of the Polygon key's rate limit
+            rate_limiter.for_credential('polygon', self.api_key).acquire(BACKFILL)
             response = requests.get(url)
             if response.status_code == 200:
                 data = response.json()
@@ -63,10 +83,12 @@ class MarketDataServer:
                             'HL': result['l'],
                             'LH': result['h'],
                             'LL': result['l'],
+                            'open': result['o'],
+                            'close': result['c'],
                             'timestamp': result['t']
                         }
                         formatted_data.append(entry)
-                        self.data_buffer[pair].append(entry)
+                        self._append(pair, entry)
                     
                     # Save to file
                     self.save_to_json(formatted_data, pair)
@@ -82,6 +104,130 @@ class MarketDataServer:
             logger.error(f"Error fetching historical data for {pair}: {str(e)}")
             return False
 
+    def _append(self, pair, entry):
+        """Add an entry to a pair's buffer and advance its change markers"""
+        self.data_buffer[pair].append(entry)
+        self.versions[pair] += 1
+        last = self.last_timestamps[pair]
+        if last is None or entry['timestamp'] >= last:
+            self.last_timestamps[pair] = entry['timestamp']
+            if entry['type'] == 'quote':
+                self.last_prices[pair] = (float(entry['bid']) + float(entry['ask'])) / 2
+            else:
+                self.last_prices[pair] = float(self._bar(entry)[2])
+        if entry['type'] == 'per-minute' and self.indicators[pair]:
+            self._update_indicators(pair, entry)
+        for timeframe, types in TIMEFRAMES.items():
+            if entry['type'] in types:
+                self.snapshots[pair][timeframe].add(entry)
+
+    @staticmethod
+    def _bar(entry):
+        """(high, low, close) of a bar entry; entries saved before 'close' was kept fall back to HL"""
+        return entry['HH'], entry['LL'], entry.get('close', entry['HL'])
+
+    def _update_indicators(self, pair, entry):
+        """Advance every attached indicator by one bar in O(1)"""
+        with self.indicator_lock:
+            for key, live in list(self.indicators[pair].items()):
+                # Hourly historical refreshes re-send bars we've already seen
+                if live['last_timestamp'] is not None and entry['timestamp'] <= live['last_timestamp']:
+                    continue
+                try:
+                    values = live['indicator'].update(*self._bar(entry))
+                except Exception as e:
+                    # One broken indicator must not stop the feed for everyone else
+                    logger.error(f"Detaching indicator {key} from {pair} after update failed: {str(e)}")
+                    del self.indicators[pair][key]
+                    continue
+                live['last_timestamp'] = entry['timestamp']
+                live['series'].append((entry['timestamp'], values))
+                live['version'] += 1
+
+    def attach_indicator(self, pair, key, indicator):
+        """Attach a streaming indicator to a pair, priming it from the buffered bars.
+
+        Returns False if the key is already attached. When the pair already
+        has max_indicators attached, the least recently read one is detached
+        if it has been idle for indicator_idle_ttl; otherwise ValueError.
+        """
+        import numpy as np
+
+        pair = pair.replace('/', '-')
+        if pair not in self.indicators:
+            raise ValueError(f"Pair {pair} is not streamed by this server")
+        with self.indicator_lock:
+            attached = self.indicators[pair]
+            if key in attached:
+                return False
+            if len(attached) >= self.max_indicators:
+                oldest = min(attached, key=lambda k: attached[k]['read_at'])
+                if time.monotonic() - attached[oldest]['read_at'] < self.indicator_idle_ttl:
+                    raise ValueError(f"{pair} already has {self.max_indicators} live indicators")
+                del attached[oldest]
+                logger.info(f"Detached idle indicator {oldest} from {pair} to make room for {key}")
+            bars = {}
+            # Copy first: the websocket thread appends without holding indicator_lock
+            for entry in list(self.data_buffer[pair]):
+                if entry['type'] == 'per-minute':
+                    bars[entry['timestamp']] = self._bar(entry)
+            timestamps = sorted(bars)
+            high, low, close = (np.array(column, dtype=np.float64)
+                                for column in zip(*(bars[t] for t in timestamps))) if timestamps else ([], [], [])
+            history = indicator.prime(high, low, close)
+
+            series = deque(maxlen=self.buffer_size)
+            for i, timestamp in enumerate(timestamps):
+                values = {name: float(history[name][i]) for name in indicator.outputs}
+                series.append((timestamp, None if all(np.isnan(v) for v in values.values()) else values))
+            self.indicators[pair][key] = {
+                'indicator': indicator,
+                'series': series,
+                'last_timestamp': timestamps[-1] if timestamps else None,
+                'version': 0,
+                'read_at': time.monotonic(),
+            }
+        logger.info(f"Attached indicator {key} to {pair} with {len(timestamps)} bars of history")
+        return True
+
+    def detach_indicator(self, pair, key):
+        with self.indicator_lock:
+            return self.indicators.get(pair.replace('/', '-'), {}).pop(key, None) is not None
+
+    def get_indicator_series(self, pair, key, since=None):
+        """(timestamp, values) points for an attached indicator; values is None while warming up"""
+        with self.indicator_lock:
+            live = self.indicators.get(pair.replace('/', '-'), {}).get(key)
+            if live is None:
+                return None
+            live['read_at'] = time.monotonic()
+            series = list(live['series'])
+        if since is not None:
+            series = [point for point in series if point[0] > since]
+        return series
+
+    def detach_idle_indicators(self):
+        """Detach indicators nobody has read for indicator_idle_ttl seconds"""
+        cutoff = time.monotonic() - self.indicator_idle_ttl
+        with self.indicator_lock:
+            for pair, attached in self.indicators.items():
+                for key in [k for k, live in attached.items() if live['read_at'] < cutoff]:
+                    del attached[key]
+                    logger.info(f"Detached idle indicator {key} from {pair}")
+
+    def get_indicator_version(self, pair, key):
+        live = self.indicators.get(pair.replace('/', '-'), {}).get(key)
+        return live['version'] if live else None
+
+    def add_tick_listener(self, listener):
+        """Call listener(pair, entry) for every live WebSocket entry (not historical refreshes)"""
+        if listener not in self.tick_listeners:
+            self.tick_listeners.append(listener)
+
+    def remove_tick_listener(self, listener):
+        if listener in self.tick_listeners:
+            self.tick_listeners.remove(listener)
+
     def save_to_json(self, data, pair):
         """Save data to JSON file with proper formatting"""
         filename = f'feeds/forex/{pair}.json'
@@ -131,6 +277,8 @@ class MarketDataServer:
                         'HL': entry['l'],
                         'LH': entry['h'],
                         'LL': entry['l'],
+                        'open': entry['o'],
+                        'close': entry['c'],
                         'timestamp': entry['s']
                     }
                 elif entry.get('ev') == 'CAS':  # Per-second data
@@ -141,6 +289,8 @@ class MarketDataServer:
                         'HL': entry['l'],
                         'LH': entry['h'],
                         'LL': entry['l'],
+                        'open': entry['o'],
+                        'close': entry['c'],
                         'timestamp': entry['s']
                     }
                 elif entry.get('ev') == 'C':  # Quote data
@@ -155,7 +305,12 @@ class MarketDataServer:
                 if output_data:
                     pair = output_data['pair'].replace('/', '-')
                     if pair in self.pairs:
-                        self.data_buffer[pair].append(output_data)
+                        self._append(pair, output_data)
+                        for listener in self.tick_listeners:
+                            try:
+                                listener(pair, output_data)
+                            except Exception as e:
+                                logger.error(f"Tick listener failed for {pair}: {str(e)}")
                         self.save_to_json(output_data, pair)
                         
         except Exception as e:
@@ -276,19 +431,38 @@ class MarketDataServer:
                 # Update if more than update_interval has passed
                 if current_time - self.last_historical_update.get(pair, 0) > self.historical_update_interval:
                     self.fetch_historical_data(pair)
+            self.detach_idle_indicators()
             time.sleep(60)  # Check every minute
 
-    def get_data(self, pair, limit=None):
-        """Get the latest data for a pair"""
+    def get_data(self, pair, limit=None, since=None):
+        """Get the latest data for a pair, optionally only entries newer than since (ms)"""
         pair = pair.replace('/', '-')
         if pair not in self.data_buffer:
             return []
             
         data = list(self.data_buffer[pair])
+        if since is not None:
+            data = [entry for entry in data if entry['timestamp'] > since]
         if limit:
             data = data[-limit:]
         return data
 
+    def get_version(self, pair):
+        """Change counter for a pair's buffer; differs whenever its data changed"""
+        return self.versions.get(pair.replace('/', '-'), 0)
+
+    def get_last_price(self, pair):
+        """Latest quote mid or bar close for a pair, or None"""
+        return self.last_prices.get(pair.replace('/', '-').replace('_', '-'))
+
+    def get_chart_snapshot(self, pair, timeframe=DEFAULT_TIMEFRAME):
+        """Pre-serialized chart payload for a pair, or None if the pair or timeframe is unknown"""
+        return self.snapshots.get(pair.replace('/', '-'), {}).get(timeframe)
+
+    def get_last_timestamp(self, pair):
+        """Timestamp (ms) of the newest tick received for a pair, or None"""
+        return self.last_timestamps.get(pair.replace('/', '-'))
+
 if __name__ == "__main__":
     # Load API key from config
     import configparser
@@ -0,0 +1,97 @@
+"""
+Database configuration
+---
+Single place that decides which database TradingPal talks to and how.
+
+The URL comes from the DATABASE_URL environment variable, then
+[DATABASE] URI in config.ini, then defaults to instance/tradingpal.db.
+SQLite connections are switched to WAL journaling with tuned pragmas so
+readers don't block on the writer; Postgres URLs get a pooled engine
+suitable for multi-worker deployments.
+"""
+
+from typing import Dict, Any, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+import configparser
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTANCE_PATH = os.path.join(BASE_DIR, 'instance')
+DEFAULT_SQLITE_PATH = os.path.join(INSTANCE_PATH, 'tradingpal.db')
+
+# Pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,       # ~20MB page cache (negative = KiB)
+    'temp_store': 'MEMORY',
+    'mmap_size': 134217728,     # 128MB memory-mapped reads
+}
+# No busy_timeout here: the driver's connect timeout ([DATABASE] SQLITE_TIMEOUT) sets it,
+# and a pragma run after connect would silently override that setting
+
+def _load_config(config: Optional[configparser.ConfigParser]) -> configparser.ConfigParser:
+    if config is None:
+        config = configparser.ConfigParser()
+        config.read(os.path.join(BASE_DIR, 'config.ini'))
+    return config
+
+def get_database_uri(config: Optional[configparser.ConfigParser] = None) -> str:
+    """Resolve the database URL for this deployment"""
+    config = _load_config(config)
+    uri = os.environ.get('DATABASE_URL') or config.get('DATABASE', 'URI', fallback=None)
+    if not uri:
+        os.makedirs(INSTANCE_PATH, exist_ok=True)
+        return f'sqlite:///{DEFAULT_SQLITE_PATH}'
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def get_engine_options(uri: str, config: Optional[configparser.ConfigParser] = None) -> Dict[str, Any]:
+    """Connection pool settings appropriate for the database backend"""
+    config = _load_config(config)
+    if uri.startswith('sqlite'):
+        if ':memory:' in uri or uri in ('sqlite://', 'sqlite:///'):
+            return {}
+        return {
+            'pool_size': config.getint('DATABASE', 'POOL_SIZE', fallback=10),
+            'max_overflow': config.getint('DATABASE', 'MAX_OVERFLOW', fallback=20),
+            'connect_args': {
+                'timeout': config.getint('DATABASE', 'SQLITE_TIMEOUT', fallback=30),
+                'check_same_thread': False,
+            },
+        }
+    return {
+        'pool_size': config.getint('DATABASE', 'POOL_SIZE', fallback=10),
+        'max_overflow': config.getint('DATABASE', 'MAX_OVERFLOW', fallback=20),
+        'pool_timeout': config.getint('DATABASE', 'POOL_TIMEOUT', fallback=30),
+        'pool_recycle': config.getint('DATABASE', 'POOL_RECYCLE', fallback=1800),
+        'pool_pre_ping': True,
+    }
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def init_database(app, db, config: Optional[configparser.ConfigParser] = None) -> None:
+    """Configure the app's database URL/pool, bind db and tune SQLite connections"""
+    config = _load_config(config)
+    uri = get_database_uri(config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(uri, config)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    if uri.startswith('sqlite'):
+        with app.app_context():
+            event.listen(db.engine, 'connect', _apply_sqlite_pragmas)
+    logger.info(f"Database configured: {make_url(uri).render_as_string(hide_password=True)}")
@@ -0,0 +1,150 @@
+"""
+HTTP caching and compression helpers
+---
+Conditional GET and content-encoding negotiation for polled data
+endpoints (chart data, candles).
+
+    not_modified = check_not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    ...
+    return finalize(jsonify(payload), etag, last_modified)
+
+ETags are weak (W/"...") because the same representation may be sent
+gzip- or brotli-encoded. Brotli is used when the optional ``brotli``
+package is installed, gzip otherwise.
+
+Bodies served many times over (chart snapshots) can be wrapped in an
+EncodedBody and sent with send_encoded(), which compresses each encoding
+once and then serves it from memory.
+"""
+
+from typing import Optional
+from datetime import datetime, timezone
+from flask import request, make_response
+import functools
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Payloads smaller than this aren't worth the CPU to compress
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+def make_etag(*parts) -> str:
+    """Weak ETag value built from the parts that determine a representation"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def _to_http_datetime(timestamp_ms: Optional[int]) -> Optional[datetime]:
+    if timestamp_ms is None:
+        return None
+    # HTTP dates have second resolution
+    return datetime.fromtimestamp(int(timestamp_ms) // 1000, tz=timezone.utc)
+
+def check_not_modified(etag: str, last_modified_ms: Optional[int] = None):
+    """Return a 304 response if the client's copy is current, else None.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(etag.removeprefix('W/').strip('"')):
+            return None
+    else:
+        last_modified = _to_http_datetime(last_modified_ms)
+        since = request.if_modified_since
+        if last_modified is None or since is None or last_modified > since:
+            return None
+
+    response = make_response('', 304)
+    _set_cache_headers(response, etag, last_modified_ms)
+    return response
+
+def _set_cache_headers(response, etag: str, last_modified_ms: Optional[int]) -> None:
+    response.headers['ETag'] = etag
+    last_modified = _to_http_datetime(last_modified_ms)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Per-user data: browsers may store it but must revalidate every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+
+def _negotiate_encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def encode(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class EncodedBody:
+    """A serialized body plus its compressed forms, each computed on first use"""
+
+    __slots__ = ('body', '_encoded', '_lock')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def get(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        with self._lock:
+            encoded = self._encoded.get(encoding)
+            if encoded is None:
+                encoded = self._encoded[encoding] = encode(self.body, encoding)
+        return encoded
+
+def compress_response(response):
+    """Encode the body with the best encoding the client accepts"""
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(encode(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def finalize(response, etag: str, last_modified_ms: Optional[int] = None):
+    """Attach validators and cache headers, then compress"""
+    _set_cache_headers(response, etag, last_modified_ms)
+    return compress_response(response)
+
+def send_encoded(encoded: EncodedBody, etag: str, last_modified_ms: Optional[int] = None,
+                 mimetype: str = 'application/json'):
+    """finalize() for an EncodedBody: no serialization or compression per request"""
+    encoding = _negotiate_encoding() if len(encoded.body) >= MIN_COMPRESS_SIZE else None
+    response = make_response(encoded.get(encoding))
+    response.mimetype = mimetype
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return finalize(response, etag, last_modified_ms)
+
+def compressed(view):
+    """Route decorator compressing successful responses"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return compress_response(make_response(view(*args, **kwargs)))
+    return wrapper
@@ -0,0 +1,282 @@
+"""
+Custom indicator sandbox
+---
+Validates, compiles and runs user-defined Indicator.calculation_code.
+
+calculation_code is a restricted Python snippet. It sees the price arrays
+``open``, ``high``, ``low``, ``close`` and ``volume`` (NumPy float64 arrays),
+a ``params`` dict (Indicator.parameters plus per-call overrides) and ``np``,
+a whitelisted subset of NumPy. It must assign ``result``: an array, or a
+dict of arrays for multi-line indicators.
+
+    fast = np.convolve(close, np.ones(params['n']) / params['n'], mode='same')
+    result = {'value': close - fast}
+
+The source is checked against an AST whitelist (no imports, while loops,
+classes, or private/dunder names and attributes, no file/array-dump
+methods) and runs with only whitelisted builtins and NumPy functions in
+scope. It is compiled once and cached by (indicator id, updated_at). Code runs in a
+worker-process pool whose processes have an address-space limit, and each
+evaluation gets a CPU-time budget, so a runaway indicator can't take down
+or stall the web workers.
+"""
+
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+import ast
+import builtins
+import logging
+import marshal
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ('open', 'high', 'low', 'close', 'volume')
+
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.If, ast.For, ast.Break,
+    ast.Continue, ast.Pass, ast.FunctionDef, ast.Return, ast.arguments, ast.arg,
+    ast.Name, ast.Load, ast.Store, ast.Del, ast.Constant, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.Tuple, ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp, ast.GeneratorExp,
+    ast.comprehension, ast.Starred, ast.keyword, ast.Call, ast.IfExp, ast.Lambda,
+    ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop, ast.expr_context,
+)
+
+SAFE_BUILTINS = {
+    name: getattr(builtins, name) for name in (
+        'abs', 'all', 'any', 'bool', 'dict', 'enumerate', 'float', 'int', 'len', 'list',
+        'max', 'min', 'range', 'reversed', 'round', 'sorted', 'sum', 'tuple', 'zip',
+        'isinstance', 'ValueError', 'ZeroDivisionError',
+    )
+}
+
+NUMPY_FUNCTIONS = (
+    'abs', 'absolute', 'add', 'arange', 'argmax', 'argmin', 'array', 'asarray', 'clip', 'concatenate',
+    'convolve', 'cumprod', 'cumsum', 'diff', 'divide', 'empty', 'empty_like', 'exp', 'full', 'full_like',
+    'isfinite', 'isnan', 'log', 'log1p', 'maximum', 'mean', 'median', 'minimum', 'multiply', 'nan',
+    'nan_to_num', 'nanmax', 'nanmean', 'nanmin', 'nanstd', 'nansum', 'ones', 'ones_like', 'percentile',
+    'power', 'roll', 'sign', 'sqrt', 'square', 'std', 'subtract', 'sum', 'where', 'zeros', 'zeros_like',
+    'inf', 'pi', 'float64', 'int64', 'bool_', 'r_', 'flatnonzero', 'count_nonzero',
+)
+
+# Array/module attributes that reach the filesystem or raw memory
+FORBIDDEN_ATTRIBUTES = {
+    'tofile', 'dump', 'dumps', 'ctypes', 'base', 'data', 'lib', 'load', 'save', 'memmap',
+    'fromfile', 'frombuffer', 'setflags', 'resize', 'view', 'getfield', 'setfield',
+    'f_globals', 'f_locals', 'gi_frame', 'gi_code', 'cr_frame', 'tb_frame', 'func_globals',
+}
+
+class IndicatorCodeError(ValueError):
+    """calculation_code failed validation or evaluation"""
+
+def validate(source: str) -> ast.Module:
+    """Parse calculation_code and reject anything outside the whitelist"""
+    try:
+        tree = ast.parse(source, mode='exec')
+    except SyntaxError as e:
+        raise IndicatorCodeError(f"Syntax error on line {e.lineno}: {e.msg}")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise IndicatorCodeError(f"{type(node).__name__} is not allowed (line {getattr(node, 'lineno', '?')})")
+        if isinstance(node, ast.Name) and node.id.startswith('_'):
+            raise IndicatorCodeError(f"Name '{node.id}' is not allowed (line {node.lineno})")
+        if isinstance(node, ast.Attribute) and (node.attr.startswith('_') or node.attr in FORBIDDEN_ATTRIBUTES):
+            raise IndicatorCodeError(f"Attribute '{node.attr}' is not allowed (line {node.lineno})")
+        if isinstance(node, (ast.FunctionDef, ast.arg)):
+            name = node.name if isinstance(node, ast.FunctionDef) else node.arg
+            if name.startswith('_'):
+                raise IndicatorCodeError(f"Name '{name}' is not allowed (line {node.lineno})")
+            if isinstance(node, ast.FunctionDef) and node.decorator_list:
+                raise IndicatorCodeError(f"Decorators are not allowed (line {node.lineno})")
+
+    assigns_result = any(
+        isinstance(node, ast.Name) and node.id == 'result' and isinstance(node.ctx, ast.Store)
+        for node in ast.walk(tree)
+    )
+    if not assigns_result:
+        raise IndicatorCodeError("calculation_code must assign 'result'")
+    return tree
+
+def compile_code(source: str, label: str = '<indicator>') -> bytes:
+    """Validate and compile to a marshalled code object workers can load cheaply"""
+    return marshal.dumps(compile(validate(source), label, 'exec'))
+
+# -- worker side -----------------------------------------------------------------
+
+_worker_code: Dict[Tuple, Any] = {}
+_safe_numpy = None
+
+def _address_space() -> int:
+    """Current virtual memory size of this process in bytes (0 if unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+def _init_worker(memory_mb: int) -> None:
+    """Pool initializer: load NumPy, then cap further address-space growth"""
+    global _safe_numpy
+    import numpy as np
+    _safe_numpy = SimpleNamespace(**{name: getattr(np, name) for name in NUMPY_FUNCTIONS
+                                     if hasattr(np, name)})
+
+    try:
+        import resource
+        # Forked workers inherit the parent's mappings, so the budget is on top of those
+        limit = _address_space() + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.RLIM_INFINITY))
+    except (ImportError, ValueError, OSError) as e:  # pragma: no cover - platform dependent
+        logger.warning(f"Could not apply indicator memory limit: {str(e)}")
+
+class _CpuBudgetExceeded(Exception):
+    pass
+
+def _raise_cpu_budget(signum, frame):
+    raise _CpuBudgetExceeded()
+
+def _run(key: Tuple, code: bytes, arrays: Dict[str, Any], params: Dict[str, Any], cpu_seconds: float):
+    """Execute one compiled indicator over one symbol's arrays"""
+    import signal
+    import numpy as np
+
+    code_object = _worker_code.get(key)
+    if code_object is None:
+        code_object = _worker_code[key] = marshal.loads(code)
+
+    namespace = {'__builtins__': SAFE_BUILTINS, 'np': _safe_numpy, 'params': dict(params)}
+    for name in INPUT_NAMES:
+        namespace[name] = np.asarray(arrays.get(name, ()), dtype=np.float64)
+
+    # CPU budget for pure-Python loops; the parent's wall-clock timeout backs it up
+    previous = signal.signal(signal.SIGPROF, _raise_cpu_budget)
+    signal.setitimer(signal.ITIMER_PROF, cpu_seconds)
+    try:
+        exec(code_object, namespace)
+    except _CpuBudgetExceeded:
+        return {'error': f"Exceeded CPU budget of {cpu_seconds}s"}
+    except MemoryError:
+        return {'error': "Exceeded memory limit"}
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {str(e)}"}
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+
+    result = namespace.get('result')
+    if not isinstance(result, dict):
+        result = {'value': result}
+    try:
+        return {'result': {name: np.asarray(values, dtype=np.float64) for name, values in result.items()}}
+    except (TypeError, ValueError) as e:
+        return {'error': f"result must be numeric arrays: {str(e)}"}
+
+# -- coordinator -----------------------------------------------------------------
+
+class IndicatorExecutor:
+    def __init__(self, max_workers: int = 2, cpu_seconds: float = 2.0, memory_mb: int = 512,
+                 cache_size: int = 256):
+        self.max_workers = max_workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.cache_size = cache_size
+        self._compiled: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @staticmethod
+    def cache_key(indicator) -> Tuple:
+        return (indicator.id, indicator.updated_at.isoformat() if indicator.updated_at else None)
+
+    def compile(self, indicator) -> bytes:
+        """Compiled code for an Indicator row, reused until its updated_at changes"""
+        key = self.cache_key(indicator)
+        with self._lock:
+            code = self._compiled.get(key)
+            if code is not None:
+                self._compiled.move_to_end(key)
+                return code
+        code = compile_code(indicator.calculation_code, f"<indicator {indicator.name}>")
+        with self._lock:
+            self._compiled[key] = code
+            while len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return code
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # The web process already runs feed, prober and poller threads; forking it
+                # would copy their held locks into the workers, so start from a clean server
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=_init_worker, initargs=(self.memory_mb,),
+                    mp_context=multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    )
+                )
+            return self._executor
+
+    def _reset_pool(self, terminate: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        if terminate:
+            # shutdown() can't interrupt a stuck task; kill the workers outright
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.terminate()
+        executor.shutdown(wait=not terminate, cancel_futures=True)
+
+    def evaluate_many(self, indicator, symbols: Dict[str, Dict[str, Any]],
+                      params: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """Run one indicator over several symbols' arrays concurrently.
+
+        Returns {symbol: {'result': {name: array}} or {'error': message}}.
+        """
+        code = self.compile(indicator)
+        key = self.cache_key(indicator)
+        merged = {**(indicator.parameters or {}), **(params or {})}
+
+        pool = self._pool()
+        futures = {symbol: pool.submit(_run, key, code, arrays, merged, self.cpu_seconds)
+                   for symbol, arrays in symbols.items()}
+        # Wall-clock backstop for time spent inside C extensions, which ITIMER_PROF can't interrupt.
+        # One deadline for the whole batch: tasks run max_workers at a time, each within the budget.
+        rounds = math.ceil(len(futures) / self.max_workers) if futures else 0
+        deadline = time.monotonic() + (self.cpu_seconds * 5 + 5) * rounds
+
+        results = {}
+        broken = False
+        for symbol, future in futures.items():
+            try:
+                results[symbol] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                results[symbol] = {'error': "Indicator evaluation timed out"}
+                broken = True
+            except BrokenProcessPool:
+                results[symbol] = {'error': "Indicator worker crashed"}
+                broken = True
+        if broken:
+            # A stuck or dead worker can't be reclaimed; start a fresh pool next time
+            logger.error(f"Resetting indicator worker pool after failure in {indicator.name}")
+            self._reset_pool(terminate=True)
+        return results
+
+    def evaluate(self, indicator, arrays: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run one indicator over one symbol; raises IndicatorCodeError on failure"""
+        outcome = self.evaluate_many(indicator, {'_': arrays}, params)['_']
+        if 'error' in outcome:
+            raise IndicatorCodeError(outcome['error'])
+        return outcome['result']
+
+    def shutdown(self) -> None:
+        self._reset_pool()
@@ -0,0 +1,364 @@
+"""
+Technical indicator engine
+---
+Streaming implementations of SMA, EMA, RSI, MACD, Bollinger Bands and ATR.
+Each indicator can:
+
+- compute(high, low, close): evaluate a whole history with vectorized
+  NumPy/pandas operations,
+- prime(high, low, close): do the same and keep the final state, so
+- update(high, low, close): can advance it by one bar in O(1).
+
+    rsi = create_indicator('rsi', period=14)
+    history = rsi.prime(highs, lows, closes)     # {'value': array}
+    latest = rsi.update(high, low, close)        # {'value': 61.2} or None while warming up
+
+Definitions follow the ``ta`` package used in the research notebook: EMAs
+are seeded with the first value (pandas ``adjust=False``), RSI and ATR use
+Wilder smoothing, Bollinger Bands use the population standard deviation.
+Streaming and vectorized results agree to floating-point precision.
+
+INDICATORS maps names to classes; from_model() builds an instance from a
+models.Indicator row whose name matches a built-in.
+"""
+
+from typing import Dict, Optional, Tuple, Type
+from collections import deque
+import inspect
+import math
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Output = Optional[Dict[str, float]]
+
+def _ewm(values: np.ndarray, alpha: float, min_periods: int) -> Tuple[np.ndarray, float]:
+    """Exponentially weighted mean (adjust=False) and its final unmasked value"""
+    import pandas as pd
+    if len(values) == 0:
+        return np.array([], dtype=np.float64), math.nan
+    smoothed = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    last = smoothed[-1]
+    valid = np.cumsum(~np.isnan(values))
+    smoothed[valid < min_periods] = np.nan
+    return smoothed, last
+
+def _period(value, name: str = 'period') -> int:
+    """A window length of at least one bar; ValueError otherwise"""
+    try:
+        period = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    if period < 1:
+        raise ValueError(f"{name} must be at least 1, got {value!r}")
+    return period
+
+class _Ewm:
+    """O(1) exponentially weighted mean seeded with its first value"""
+
+    def __init__(self, alpha: float, min_periods: int):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = math.nan
+        self.count = 0
+
+    def update(self, x: float) -> Optional[float]:
+        self.value = x if self.count == 0 else self.value + self.alpha * (x - self.value)
+        self.count += 1
+        return self.value if self.count >= self.min_periods else None
+
+    def restore(self, value: float, count: int) -> None:
+        self.value, self.count = value, count
+
+class StreamingIndicator:
+    """Base class; subclasses define outputs, compute(), prime() and update()"""
+
+    name = ''
+    outputs: Tuple[str, ...] = ('value',)
+
+    def __init__(self, **params):
+        self.params = params
+
+    def compute(self, high, low, close) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def prime(self, high, low, close) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def update(self, high: float, low: float, close: float) -> Output:
+        raise NotImplementedError
+
+    def __repr__(self):
+        params = ', '.join(f"{k}={v}" for k, v in self.params.items())
+        return f"<{type(self).__name__} {params}>"
+
+class SMA(StreamingIndicator):
+    name = 'sma'
+
+    def __init__(self, period: int = 20):
+        super().__init__(period=period)
+        self.period = _period(period)
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+
+    def compute(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        result = np.full(len(close), np.nan)
+        if len(close) >= self.period:
+            cumsum = np.cumsum(np.r_[0.0, close])
+            result[self.period - 1:] = (cumsum[self.period:] - cumsum[:-self.period]) / self.period
+        return {'value': result}
+
+    def prime(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        self.window = deque(close[-self.period:].tolist(), maxlen=self.period)
+        self.total = float(sum(self.window))
+        return self.compute(high, low, close)
+
+    def update(self, high, low, close):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(close)
+        self.total += close
+        if len(self.window) < self.period:
+            return None
+        return {'value': self.total / self.period}
+
+class EMA(StreamingIndicator):
+    name = 'ema'
+
+    def __init__(self, period: int = 20):
+        super().__init__(period=period)
+        self.period = _period(period)
+        self.ema = _Ewm(2 / (self.period + 1), self.period)
+
+    def compute(self, high, low, close):
+        return {'value': _ewm(np.asarray(close, dtype=np.float64), self.ema.alpha, self.period)[0]}
+
+    def prime(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        values, last = _ewm(close, self.ema.alpha, self.period)
+        self.ema.restore(last, len(close))
+        return {'value': values}
+
+    def update(self, high, low, close):
+        value = self.ema.update(close)
+        return None if value is None else {'value': value}
+
+class RSI(StreamingIndicator):
+    name = 'rsi'
+
+    def __init__(self, period: int = 14):
+        super().__init__(period=period)
+        self.period = _period(period)
+        self.gains = _Ewm(1 / self.period, self.period)
+        self.losses = _Ewm(1 / self.period, self.period)
+        self.prev_close = None
+
+    @staticmethod
+    def _rsi(gain, loss):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+
+    def _smoothed(self, close):
+        change = np.diff(close)
+        gain, last_gain = _ewm(np.clip(change, 0, None), self.gains.alpha, self.period)
+        loss, last_loss = _ewm(np.clip(-change, 0, None), self.losses.alpha, self.period)
+        return gain, loss, last_gain, last_loss
+
+    def compute(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) < 2:
+            return {'value': np.full(len(close), np.nan)}
+        gain, loss, _, _ = self._smoothed(close)
+        return {'value': np.r_[np.nan, self._rsi(gain, loss)]}
+
+    def prime(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) < 2:
+            self.prev_close = float(close[-1]) if len(close) else None
+            return {'value': np.full(len(close), np.nan)}
+        gain, loss, last_gain, last_loss = self._smoothed(close)
+        self.gains.restore(last_gain, len(close) - 1)
+        self.losses.restore(last_loss, len(close) - 1)
+        self.prev_close = float(close[-1])
+        return {'value': np.r_[np.nan, self._rsi(gain, loss)]}
+
+    def update(self, high, low, close):
+        prev_close, self.prev_close = self.prev_close, close
+        if prev_close is None:
+            return None
+        change = close - prev_close
+        gain = self.gains.update(max(change, 0.0))
+        loss = self.losses.update(max(-change, 0.0))
+        if gain is None:
+            return None
+        return {'value': 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)}
+
+class MACD(StreamingIndicator):
+    name = 'macd'
+    outputs = ('macd', 'signal', 'histogram')
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        super().__init__(fast=fast, slow=slow, signal=signal)
+        fast, slow, signal = _period(fast, 'fast'), _period(slow, 'slow'), _period(signal, 'signal')
+        self.fast = _Ewm(2 / (fast + 1), fast)
+        self.slow = _Ewm(2 / (slow + 1), slow)
+        self.signal = _Ewm(2 / (signal + 1), signal)
+
+    def _series(self, close):
+        fast, last_fast = _ewm(close, self.fast.alpha, self.fast.min_periods)
+        slow, last_slow = _ewm(close, self.slow.alpha, self.slow.min_periods)
+        macd = fast - slow
+        # Signal line starts once the slow EMA has warmed up, as in ta.trend.MACD
+        signal, last_signal = _ewm(macd, self.signal.alpha, self.signal.min_periods)
+        return macd, signal, (last_fast, last_slow, last_signal)
+
+    def compute(self, high, low, close):
+        macd, signal, _ = self._series(np.asarray(close, dtype=np.float64))
+        return {'macd': macd, 'signal': signal, 'histogram': macd - signal}
+
+    def prime(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        macd, signal, (last_fast, last_slow, last_signal) = self._series(close)
+        self.fast.restore(last_fast, len(close))
+        self.slow.restore(last_slow, len(close))
+        self.signal.restore(last_signal, max(0, len(close) - self.slow.min_periods + 1))
+        return {'macd': macd, 'signal': signal, 'histogram': macd - signal}
+
+    def update(self, high, low, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        if slow is None:
+            return None
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if signal is None:
+            return {'macd': macd, 'signal': math.nan, 'histogram': math.nan}
+        return {'macd': macd, 'signal': signal, 'histogram': macd - signal}
+
+class BollingerBands(StreamingIndicator):
+    name = 'bollinger'
+    outputs = ('middle', 'upper', 'lower')
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        super().__init__(period=period, std_dev=std_dev)
+        self.period = _period(period)
+        self.std_dev = float(std_dev)
+        if not math.isfinite(self.std_dev) or self.std_dev < 0:
+            raise ValueError(f"std_dev must be a non-negative number, got {std_dev!r}")
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def compute(self, high, low, close):
+        import pandas as pd
+        rolling = pd.Series(np.asarray(close, dtype=np.float64)).rolling(self.period)
+        middle = rolling.mean().to_numpy()
+        std = rolling.std(ddof=0).to_numpy()
+        return {'middle': middle, 'upper': middle + self.std_dev * std, 'lower': middle - self.std_dev * std}
+
+    def prime(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        self.window = deque(close[-self.period:].tolist(), maxlen=self.period)
+        self.total = float(sum(self.window))
+        self.total_sq = float(sum(x * x for x in self.window))
+        return self.compute(high, low, close)
+
+    def update(self, high, low, close):
+        if len(self.window) == self.period:
+            dropped = self.window[0]
+            self.total -= dropped
+            self.total_sq -= dropped * dropped
+        self.window.append(close)
+        self.total += close
+        self.total_sq += close * close
+        if len(self.window) < self.period:
+            return None
+        middle = self.total / self.period
+        std = math.sqrt(max(self.total_sq / self.period - middle * middle, 0.0))
+        return {'middle': middle, 'upper': middle + self.std_dev * std, 'lower': middle - self.std_dev * std}
+
+class ATR(StreamingIndicator):
+    name = 'atr'
+
+    def __init__(self, period: int = 14):
+        super().__init__(period=period)
+        self.period = _period(period)
+        self.atr = _Ewm(1 / self.period, self.period)
+        self.prev_close = None
+
+    @staticmethod
+    def _true_range(high, low, close):
+        prev_close = np.r_[np.nan, close[:-1]]
+        ranges = np.vstack([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+        return np.nanmax(ranges, axis=0)
+
+    def compute(self, high, low, close):
+        high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+        return {'value': _ewm(self._true_range(high, low, close), self.atr.alpha, self.period)[0]}
+
+    def prime(self, high, low, close):
+        high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+        values, last = _ewm(self._true_range(high, low, close), self.atr.alpha, self.period)
+        self.atr.restore(last, len(close))
+        self.prev_close = float(close[-1]) if len(close) else None
+        return {'value': values}
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        value = self.atr.update(true_range)
+        return None if value is None else {'value': value}
+
+INDICATORS: Dict[str, Type[StreamingIndicator]] = {
+    cls.name: cls for cls in (SMA, EMA, RSI, MACD, BollingerBands, ATR)
+}
+
+def create_indicator(name: str, **params) -> StreamingIndicator:
+    """Instantiate a built-in indicator by name (case-insensitive)"""
+    cls = INDICATORS.get(name.lower())
+    if cls is None:
+        raise ValueError(f"Unknown indicator: {name}")
+    return cls(**params)
+
+def parse_indicator_spec(spec: str) -> Tuple[str, StreamingIndicator]:
+    """Parse 'name[:arg[:arg...]]' (e.g. 'macd:12:26:9') into a canonical key and an instance.
+
+    Arguments are positional in the order of the indicator's constructor.
+    """
+    name, *args = spec.strip().lower().split(':')
+    cls = INDICATORS.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown indicator: {name}")
+    names = list(inspect.signature(cls.__init__).parameters)[1:]
+    if len(args) > len(names):
+        raise ValueError(f"Too many arguments for {name}")
+    try:
+        params = {param: float(arg) if '.' in arg else int(arg) for param, arg in zip(names, args)}
+    except ValueError:
+        raise ValueError(f"Invalid arguments for {name}: {spec}")
+    indicator = cls(**params)
+    key = ':'.join([name] + [str(value) for value in indicator.params.values()])
+    return key, indicator
+
+def from_model(indicator, **overrides) -> Optional[StreamingIndicator]:
+    """Build the streaming implementation for a models.Indicator row.
+
+    Returns None when the row isn't a built-in; those run their own
+    calculation_code instead. Raises ValueError if a built-in's parameters
+    are invalid.
+    """
+    cls = INDICATORS.get((indicator.name or '').lower())
+    if cls is None:
+        return None
+    params = {**(indicator.parameters or {}), **overrides}
+    try:
+        return cls(**params)
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        raise ValueError(f"Invalid parameters for indicator {indicator.name}: {str(e)}")
@@ -0,0 +1,282 @@
+"""
+Request instrumentation
+---
+Lightweight timing spans and histograms for the Flask app.
+
+    with span('broker', broker='oanda', method='get_account_details'):
+        ...
+
+Every span is recorded into a process-wide histogram and, inside a
+request, into a per-request breakdown returned as a Server-Timing header.
+Histograms are exposed in Prometheus text format on /metrics.
+
+An opt-in sampling profiler can be attached to a single request by
+sending ?_profile=1 (or an X-Profile: 1 header) when [PROFILING] ENABLED
+is set; collapsed stacks (flamegraph input) are written to PROFILE_DIR.
+
+All three are operator-only: Server-Timing, /metrics and the profiler are
+served only to requests from an address in [METRICS] ALLOW (default
+127.0.0.1, ::1) or carrying "Authorization: Bearer <[METRICS] TOKEN>".
+Anyone else gets no Server-Timing header, a 404 and an unprofiled request.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request, current_app, has_app_context, Response, abort
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+import functools
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans from sub-millisecond DB reads to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_METRIC = 'tradingpal_request_duration_seconds'
+SPAN_METRIC = 'tradingpal_span_duration_seconds'
+
+class Histogram:
+    """Cumulative-bucket histogram compatible with the Prometheus text format"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record one observation for a histogram series"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + '}'
+
+    def render_prometheus(self) -> str:
+        """Serialize all histograms in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            series = sorted(self._histograms.items(), key=lambda item: item[0])
+            names_seen = set()
+            for (name, labels), histogram in series:
+                if name not in names_seen:
+                    names_seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._format_labels(labels, ('le', repr(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.describe(REQUEST_METRIC, 'HTTP request latency by endpoint')
+metrics.describe(SPAN_METRIC, 'Latency of instrumented operations (broker, llm, db, serialize)')
+
+# Tool workers share the request's g, so span totals can be updated from several threads
+_spans_lock = threading.Lock()
+
+def _record_request_span(name: str, elapsed: float) -> None:
+    if has_app_context() and 'spans' in g:
+        totals = g.spans
+        with _spans_lock:
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + elapsed)
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block into the span histogram and the current request breakdown"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe(SPAN_METRIC, elapsed, span=name, **labels)
+        _record_request_span(name, elapsed)
+
+def timed(name: str, **labels):
+    """Decorator form of span()"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_broker(broker_name: str):
+    """Class decorator timing every public method of a broker client"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or not callable(value):
+                continue
+            setattr(cls, attr, timed('broker', broker=broker_name, method=attr)(value))
+        return cls
+    return decorator
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider with serialization recorded as a span"""
+
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> str:
+        """Stop sampling and return collapsed stacks, one 'stack count' per line"""
+        self._stop.set()
+        self._thread.join()
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+def _install_sqlalchemy_hooks(app, db) -> None:
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        operation = statement.lstrip().split(' ', 1)[0].upper()
+        metrics.observe(SPAN_METRIC, elapsed, span='db', operation=operation)
+        _record_request_span('db', elapsed)
+
+def is_operator() -> bool:
+    """Whether the current request passes the operator gate installed by init_app"""
+    gate = current_app.extensions.get('operator_gate')
+    return bool(gate and gate())
+
+def init_app(app, db, config=None) -> None:
+    """Install request timing, DB hooks, the metrics endpoint and the profiler toggle"""
+    profiling_enabled = bool(config and config.getboolean('PROFILING', 'ENABLED', fallback=False))
+    profile_dir = config.get('PROFILING', 'PROFILE_DIR', fallback='profiles') if config else 'profiles'
+    allowed_addresses = {
+        address.strip() for address in
+        (config.get('METRICS', 'ALLOW', fallback='127.0.0.1,::1') if config else '127.0.0.1,::1').split(',')
+        if address.strip()
+    }
+    token = config.get('METRICS', 'TOKEN', fallback='') if config else ''
+
+    def _is_operator() -> bool:
+        """Request from an allowlisted address or with the metrics bearer token"""
+        if request.remote_addr in allowed_addresses:
+            return True
+        supplied = request.headers.get('Authorization', '')
+        return bool(token) and hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+
+    app.extensions['operator_gate'] = _is_operator
+
+    if not isinstance(app.json, TimedJSONProvider):
+        app.json = TimedJSONProvider(app)
+    _install_sqlalchemy_hooks(app, db)
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        g.spans = {}
+        wants_profile = request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+        if profiling_enabled and wants_profile and _is_operator():
+            g.profiler = SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def _finish_request_timer(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        metrics.observe(
+            REQUEST_METRIC, elapsed,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=response.status_code
+        )
+
+        spans = g.pop('spans', {})
+        if _is_operator():
+            timings = [f'{name};dur={total * 1000:.1f};desc="{count}x"' for name, (count, total) in spans.items()]
+            timings.append(f'total;dur={elapsed * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            stacks = profiler.stop()
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{request.endpoint or 'request'}-{int(time.time() * 1000)}.folded")
+            with open(path, 'w') as f:
+                f.write(stacks)
+            response.headers['X-Profile-Id'] = os.path.basename(path)
+            logger.info(f"Wrote request profile to {path}")
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Expose histograms in Prometheus text format"""
+        if not _is_operator():
+            abort(404)
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -13,31 +13,46 @@ import threading
 import time
 from flask import (
     Flask, request, jsonify, render_template, redirect, 
-    session, url_for, g
+    session, url_for, g, Response, abort
 )
 from flask_cors import CORS
-import google.generativeai as genai
 import configparser
 import traceback
+import atexit
+import queue
 import os
 import json
+import hashlib
 import logging
 import broker_factory
-from models import BrokerConfig, db, User, Conversation
-import requests
-from oandapyV20 import API
-from oandapyV20.exceptions import V20Error
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-from tools import ToolRegistry
+from models import BrokerConfig, db, User, Conversation, Indicator, PriceAlert, TradingPreferences
+from database import init_database
+from user_snapshot import load_user_snapshot
+import instrumentation
+from json_provider import FastJSONProvider, to_columnar, wants_columnar
+from http_cache import make_etag, check_not_modified, finalize, send_encoded
+from chart_snapshot import CHART_COLUMNS, TIMEFRAMES, DEFAULT_TIMEFRAME, chart_row
+from single_flight import coalescer
+from tools import ToolRegistry, parse_tool_calls
+from prompt_builder import PromptBuilder
+from persistence import WriteBehindQueue
+from order_pipeline import OrderPipeline
+from risk_engine import RiskEngine, RiskRejected
+from alerts import AlertEngine
+from notifications import NotificationCenter
+from portfolio import PortfolioService, POSITION_COLUMNS, instrument_key
+from rate_limit import rate_limiter, DEFAULT_LIMITS, RateLimitTimeout
+from circuit_breaker import breakers, BrokerUnavailable
+from concurrency import fan_out
+import conversation_history
 from words import endpoint_phrases, trading_keywords
-from oanda_broker import OandaBroker
-from trading import load_historical_data
+from trading import standardize_currency_pair
 from broker_factory import BrokerFactory
 from flask_login import login_required, current_user, LoginManager
 from auth import auth_bp
 from user_config import user_config_bp
+from trading import trading_bp
 from utils import get_gemini_response
-from sqlalchemy import desc
 
 # Setup logging
 logging.basicConfig(
@@ -58,17 +73,44 @@ config.read('config.ini')
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev')  # Change in production
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tradingpal.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+app.json = FastJSONProvider(app)
 
 # Initialize extensions
-db.init_app(app)
+init_database(app, db, config)
+instrumentation.init_app(app, db, config)
+# The search index is built by the migration, or on the first search; never at import
+conversation_history.build_index_on_demand = config.getboolean('DATABASE', 'ENABLE_SEARCH_INDEX', fallback=True)
+conversation_writer = WriteBehindQueue(
+    db,
+    app,
+    mode=config.get('PERSISTENCE', 'MODE', fallback='async'),
+    batch_size=config.getint('PERSISTENCE', 'BATCH_SIZE', fallback=100),
+    flush_interval=config.getfloat('PERSISTENCE', 'FLUSH_INTERVAL', fallback=0.5),
+    max_queue=config.getint('PERSISTENCE', 'MAX_QUEUE', fallback=10000)
+)
+# Notifications and alert state changes are written in their own batches
+notification_writer = WriteBehindQueue(
+    db,
+    app,
+    mode=config.get('PERSISTENCE', 'MODE', fallback='async'),
+    batch_size=config.getint('NOTIFICATIONS', 'BATCH_SIZE', fallback=100),
+    flush_interval=config.getfloat('NOTIFICATIONS', 'FLUSH_INTERVAL', fallback=0.25),
+    max_queue=config.getint('NOTIFICATIONS', 'MAX_QUEUE', fallback=10000)
+)
+notifications = NotificationCenter(
+    notification_writer,
+    subscriber_queue_size=config.getint('NOTIFICATIONS', 'SUBSCRIBER_QUEUE', fallback=100),
+    counter_cache_size=config.getint('NOTIFICATIONS', 'COUNTER_CACHE_SIZE', fallback=10000),
+    max_subscribers=config.getint('NOTIFICATIONS', 'MAX_STREAMS', fallback=24)
+)
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login_page'
 login_manager.init_app(app)
 
-# Initialize market data server
-from data_server import MarketDataServer
+# Market data server is created on first chart request
+# Pairs it subscribes to; price alerts are only accepted for these
+STREAMED_PAIRS = ['EUR-USD']
 market_data_server = None
 market_data_lock = threading.Lock()
 
@@ -78,8 +120,21 @@ def get_market_data_server():
     with market_data_lock:
         if market_data_server is None:
             try:
+                from data_server import MarketDataServer
+
                 api_key = config.get('API_KEYS', 'POLYGON_API_KEY')
-                market_data_server = MarketDataServer(api_key, pairs=['EUR-USD'])
+                market_data_server = MarketDataServer(
+                    api_key,
+                    pairs=list(STREAMED_PAIRS),
+                    max_indicators=config.getint('INDICATORS', 'MAX_LIVE_PER_PAIR', fallback=32),
+                    indicator_idle_ttl=config.getfloat('INDICATORS', 'LIVE_IDLE_TTL', fallback=600.0)
+                )
+                market_data_server.add_tick_listener(portfolio_service.on_tick)
+                # Armed alerts listen from the first tick, not from the next alert request
+                try:
+                    market_data_server.add_tick_listener(load_alert_engine().on_tick)
+                except Exception as e:
+                    logger.warning(f"Price alerts not loaded with the feed: {str(e)}")
                 
                 # Start server in a background thread
                 def run_server():
@@ -111,33 +166,169 @@ def get_market_data_server():
                 
     return market_data_server
 
-# API and model configurations
-genai.configure(api_key=config.get('API_KEYS', 'GEMINI_API_KEY'))
-OANDA_API_KEY = config.get('API_KEYS', 'OANDA_API_KEY')
-BASE_URL = "https://api-fxpractice.oanda.com"
-ACCOUNT_ID = config.get('API_KEYS', 'OANDA_ACCOUNT_ID')
-api = API(access_token=OANDA_API_KEY)
+# Price alert index, loaded from the database on first use
+alert_engine = None
+alert_engine_lock = threading.Lock()
+
+def load_alert_engine():
+    """Get or build the alert engine from the armed alerts, without touching the feed"""
+    global alert_engine
+    with alert_engine_lock:
+        if alert_engine is None:
+            engine = AlertEngine(notification_writer, notifications)
+            with app.app_context():
+                engine.load(
+                    PriceAlert.query
+                    .join(TradingPreferences, TradingPreferences.user_id == PriceAlert.user_id)
+                    .filter(PriceAlert.active.is_(True), TradingPreferences.enable_price_alerts.is_(True))
+                )
+            alert_engine = engine
+    return alert_engine
+
+def get_alert_engine():
+    """Get or build the alert engine and make sure it is listening to the live feed"""
+    load_alert_engine()
+    try:
+        get_market_data_server().add_tick_listener(alert_engine.on_tick)
+    except Exception as e:
+        logger.warning(f"Price alerts armed but not receiving ticks: {str(e)}")
+    return alert_engine
 
 # Initialize tool registry
-tool_registry = ToolRegistry()
+tool_registry = ToolRegistry(
+    max_workers=config.getint('TOOLS', 'MAX_WORKERS', fallback=4),
+    cache_entries=config.getint('TOOLS', 'CACHE_ENTRIES', fallback=2048)
+)
+
+# Token-budgeted prompt assembly for chat queries
+prompt_builder = PromptBuilder(
+    max_tokens=config.getint('PROMPT', 'MAX_TOKENS', fallback=6000),
+    recent_turns=config.getint('PROMPT', 'RECENT_TURNS', fallback=6),
+    max_message_tokens=config.getint('PROMPT', 'MAX_MESSAGE_TOKENS', fallback=800)
+)
+
+# Events that change account state and so invalidate cached account reads
+ORDER_MUTATIONS = ['create_order', 'close_position']
+
+# Upstream API limits shared by every user: [RATE_LIMITS] OANDA_RATE (requests/s), OANDA_BURST, ...
+for upstream, (default_rate, default_burst) in DEFAULT_LIMITS.items():
+    rate_limiter.configure(
+        upstream,
+        config.getfloat('RATE_LIMITS', f'{upstream.upper()}_RATE', fallback=default_rate),
+        config.getint('RATE_LIMITS', f'{upstream.upper()}_BURST', fallback=default_burst)
+    )
+rate_limiter.max_wait = config.getfloat('RATE_LIMITS', 'MAX_WAIT', fallback=30.0)
+
+# Per-credential broker circuit breakers
+breakers.configure(
+    window=config.getfloat('CIRCUIT_BREAKER', 'WINDOW', fallback=30.0),
+    min_calls=config.getint('CIRCUIT_BREAKER', 'MIN_CALLS', fallback=5),
+    error_rate=config.getfloat('CIRCUIT_BREAKER', 'ERROR_RATE', fallback=0.5),
+    slow_call=config.getfloat('CIRCUIT_BREAKER', 'SLOW_CALL', fallback=5.0),
+    slow_rate=config.getfloat('CIRCUIT_BREAKER', 'SLOW_RATE', fallback=0.8),
+    cooldown=config.getfloat('CIRCUIT_BREAKER', 'COOLDOWN', fallback=15.0)
+)
+
+# How long identical chart/candle requests keep sharing one computed body
+coalescer.window = config.getfloat('COALESCE', 'WINDOW', fallback=1.0)
+
+# Combined positions across brokers, marked to market from the live feed
+portfolio_service = PortfolioService(
+    ttl=config.getfloat('PORTFOLIO', 'TTL', fallback=30.0),
+    max_workers=config.getint('PORTFOLIO', 'MAX_WORKERS', fallback=4)
+)
+
+def account_changed(event, user_id):
+    """Drop cached account reads after an order or position close"""
+    tool_registry.notify_mutation(event, user_id)
+    portfolio_service.invalidate(user_id)
+
+# Pre-built order payloads and submit-to-ack latency tracking
+order_pipeline = OrderPipeline(
+    template_cache_size=config.getint('ORDERS', 'TEMPLATE_CACHE_SIZE', fallback=512),
+    latency_window=config.getint('ORDERS', 'LATENCY_WINDOW', fallback=500)
+)
+
+def reference_price(user_id, instrument):
+    """Latest known price for sizing market orders: the live feed, else the user's marked positions"""
+    if market_data_server is not None:
+        price = market_data_server.get_last_price(instrument)
+        if price is not None:
+            return price
+    portfolio = portfolio_service.portfolios.get(user_id)
+    if portfolio is not None:
+        key = instrument_key(instrument)
+        for position in portfolio.positions:
+            if position.key == key and position.current_price:
+                return position.current_price
+    return None
+
+# In-memory pre-trade checks against each user's TradingPreferences
+risk_engine = RiskEngine(
+    refresh_interval=config.getfloat('RISK', 'REFRESH_INTERVAL', fallback=15.0),
+    enabled=config.getboolean('RISK', 'ENABLED', fallback=True),
+    price_source=reference_price,
+    idle_ttl=config.getfloat('RISK', 'IDLE_TTL', fallback=900.0)
+)
+
+def prepare_order(broker, order_data):
+    """Risk-check an order request and build its broker payload; no network calls
+    beyond the first account load for a broker.
+
+    Returns (prepared, risk) where risk describes any clipping, else None.
+    Raises RiskRejected (a ValueError) if the order breaks a hard limit.
+    """
+    checked, risk = risk_engine.check(get_user_snapshot(), broker, order_pipeline.normalize(order_data or {}))
+    return order_pipeline.prepare(broker, checked), risk
+
+def trade_confirmations_enabled():
+    """enable_trade_confirmations for the current user (on unless turned off)"""
+    user_prefs = get_user_snapshot().trading_preferences
+    return user_prefs is None or user_prefs.enable_trade_confirmations is not False
+
+def confirm_order(user_id, broker_name, prepared):
+    side = 'Buy' if prepared.units > 0 else 'Sell'
+    notifications.notify(user_id, 'trade', f"{side} {abs(prepared.units):g} {prepared.instrument} accepted by {broker_name}", {
+        'instrument': prepared.instrument, 'units': prepared.units, 'broker': broker_name
+    })
+
+def confirm_close(user_id, broker_name, instrument):
+    notifications.notify(user_id, 'trade', f"Closed {instrument} position on {broker_name}", {
+        'instrument': instrument, 'broker': broker_name
+    })
 
 @login_manager.user_loader
 def load_user(user_id):
     """Load user by ID for Flask-Login"""
     return db.session.get(User, int(user_id))
 
-def get_account_details(broker_type=None):
+def resolve_tool_broker(broker_type=None, broker=None):
+    """Resolve the broker instance a tool should run against"""
+    if broker is not None:
+        return broker
+
+    broker_type = broker_type or request.headers.get('X-Selected-Broker')
+    if not broker_type:
+        raise ValueError("No broker specified")
+
+    broker = g.broker_factory.get_broker(broker_type)
+    if not broker:
+        raise ValueError(f"Broker {broker_type} not initialized")
+    return broker
+
+def get_account_details(broker_type=None, broker=None):
     """Get account details from current or specified broker"""
     try:
-        broker_type = broker_type or request.headers.get('X-Selected-Broker')
-        if not broker_type:
-            raise ValueError("No broker specified")
-            
-        broker = g.broker_factory.get_broker(broker_type)
-        if not broker:
-            raise ValueError(f"Broker {broker_type} not initialized")
-            
-        return broker.get_account_details()
+        return resolve_tool_broker(broker_type, broker).get_account_details()
+    except Exception as e:
+        logger.error(f"Tool execution error: {str(e)}")
+        raise
+
+def get_candlestick_data(instrument='EUR_USD', granularity='M1', count=100, broker_type=None, broker=None):
+    """Get recent candles for an instrument from current or specified broker"""
+    try:
+        instrument = standardize_currency_pair(instrument) or instrument
+        return resolve_tool_broker(broker_type, broker).get_candlestick_data(instrument, granularity, int(count))
     except Exception as e:
         logger.error(f"Tool execution error: {str(e)}")
         raise
@@ -147,10 +338,16 @@ def create_order(account_id=None, order_data=None):
     """Enhanced order creation with broker context"""
     try:
         broker = g.broker_factory.get_broker()
-        order_response = broker.create_order(order_data)
+        prepared, risk = prepare_order(broker, order_data)
+        order_response = order_pipeline.submit(broker, prepared)
+        risk_engine.apply_fill(current_user.id, broker.name, prepared.instrument, prepared.units)
+        if trade_confirmations_enabled():
+            confirm_order(current_user.id, broker.name, prepared)
+        account_changed('create_order', current_user.id)
         
         response_data = {
             "order": order_response,
+            "risk": risk,
             "broker_used": broker.name,
             "broker_status": g.broker_factory.get_broker_status(broker.name),
             "account_id": account_id
@@ -173,21 +370,18 @@ def detect_intent(user_message):
     return None
 
 def get_broker_for_request(user_message=None):
-    """Get appropriate broker based on user context and message"""
+    """Get the broker selected in the UI, or the user's current one"""
     try:
-        if not current_user.is_authenticated:
-            broker = broker_factory.get_broker(message=user_message)
-        else:
-            user_prefs = current_user.trading_preferences
-            broker = broker_factory.get_broker(
-                message=user_message,
-                user_prefs=user_prefs
-            )
-            
-        if not broker:
+        if not current_user.is_authenticated or not getattr(g, 'broker_factory', None) \
+                or not g.broker_factory.brokers:
             raise ValueError("No available brokers configured")
-            
-        if not broker_factory.check_broker_status(broker.name):
+
+        selected = request.headers.get('X-Selected-Broker') or session.get('selected_broker')
+        if selected not in g.broker_factory.brokers:
+            selected = None
+        broker = g.broker_factory.get_broker(selected)
+
+        if not g.broker_factory.check_broker_status(broker.name):
             raise ValueError(f"Broker {broker.name} is not connected")
             
         return broker
@@ -201,7 +395,7 @@ def execute_endpoint_action(intent, user_message=None):
     try:
         broker = get_broker_for_request(user_message)
         
-        if not broker_factory.check_broker_status(broker.name):
+        if not g.broker_factory.check_broker_status(broker.name):
             return jsonify({
                 "error": f"Broker {broker.name} is not connected. Please check your configuration."
             }), 503
@@ -223,12 +417,16 @@ def execute_endpoint_action(intent, user_message=None):
         elif intent == "close_position":
             instrument = extract_instrument(user_message)
             response_data = broker.close_position(instrument)
+            risk_engine.apply_close(current_user.id, broker.name, instrument)
+            if trade_confirmations_enabled():
+                confirm_close(current_user.id, broker.name, instrument)
+            account_changed('close_position', current_user.id)
 
         if response_data:
             response_data.update({
                 "broker_used": broker.name,
-                "broker_status": broker_factory.get_broker_status(broker.name),
-                "available_brokers": broker_factory.get_available_brokers()
+                "broker_status": g.broker_factory.get_broker_status(broker.name),
+                "available_brokers": g.broker_factory.get_available_brokers()
             })
             
             prompt = f"""
@@ -261,11 +459,22 @@ def extract_instrument(message):
             return pair
     return None
 
-# Register tool
+# Register tools
 tool_registry.register(
     "get_account_details",
     "Fetch current account details including balance, margin, positions, etc.",
-    get_account_details
+    get_account_details,
+    timeout=config.getfloat('TOOLS', 'ACCOUNT_TIMEOUT', fallback=10.0),
+    ttl=config.getfloat('TOOLS', 'ACCOUNT_TTL', fallback=15.0),
+    invalidated_by=ORDER_MUTATIONS
+)
+tool_registry.register(
+    "get_candlestick_data",
+    "Fetch recent candlestick (OHLC) data for an instrument such as EUR_USD",
+    get_candlestick_data,
+    optional_params=['instrument', 'granularity', 'count'],
+    timeout=config.getfloat('TOOLS', 'CANDLES_TIMEOUT', fallback=10.0),
+    ttl=config.getfloat('TOOLS', 'CANDLES_TTL', fallback=5.0)
 )
 
 # Routes
@@ -316,63 +525,58 @@ def query():
         {tools_desc}
         
         If the user asks about account details, use the get_account_details tool.
-        Respond with "EXECUTE_TOOL:get_account_details" if you determine this tool should be used.
+        Respond with "EXECUTE_TOOL:<tool_name>" for each tool you determine should be used,
+        one per line, e.g. "EXECUTE_TOOL:get_account_details". Pass optional parameters as
+        "EXECUTE_TOOL:get_candlestick_data(instrument=EUR_USD, granularity=M5)".
+        Request every tool needed to answer in the same response; they run together.
         Otherwise respond naturally to the query.
         """
 
-        messages = [{
-            "role": "system",
-            "content": system_prompt
-        }]
-        
-        messages.extend(conversation_history)
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        messages, prompt_stats = prompt_builder.build(system_prompt, conversation_history, user_message)
+        logger.info(f"[query] Prompt stats: {prompt_stats}")
 
         # Get initial response to check if tool needed
         response = get_gemini_response(messages)
         logger.info(f"[query] Initial response: {response}")
 
         # Check if response indicates tool usage
-        if "EXECUTE_TOOL:" in response:
-            tool_name = response.split("EXECUTE_TOOL:")[1].strip()
-            logger.info(f"[query] Tool selected: {tool_name}")
-            
-            # Get tool from registry
-            tool = tool_registry.get_tool(tool_name)
-            if not tool:
-                logger.error(f"[query] Tool {tool_name} not found")
-                return jsonify({"error": f"Tool {tool_name} not available"}), 500
-                
-            # Execute tool with broker context
-            try:
-                account_data = tool.execute(broker=g.broker_factory.brokers[current_broker])
-                logger.info(f"[query] Tool execution result: {account_data}")
-                
-                # Get final response with real data
-                data_prompt = f"""The {tool_name} tool returned this data:
-                {json.dumps(account_data, indent=2)}
-                
-                Please provide a natural language summary of this account information."""
-                
-                messages.append({
-                    "role": "assistant",
-                    "content": data_prompt
-                })
-                
-                response = get_gemini_response(messages)
-            except Exception as e:
-                logger.error(f"[query] Tool execution error: {str(e)}")
-                return jsonify({"error": f"Failed to execute tool: {str(e)}"}), 500
+        tool_calls = parse_tool_calls(response)
+        if tool_calls:
+            logger.info(f"[query] Tools selected: {[call['tool'] for call in tool_calls]}")
+
+            unknown = [call['tool'] for call in tool_calls if not tool_registry.get_tool(call['tool'])]
+            if unknown:
+                logger.error(f"[query] Tools not found: {unknown}")
+                return jsonify({"error": f"Tool {', '.join(unknown)} not available"}), 500
+
+            # Execute all requested tools in one parallel fan-out with broker context
+            results = tool_registry.execute_many(
+                tool_calls,
+                context={'broker_type': current_broker},
+                user_id=current_user.id
+            )
+            logger.info(f"[query] Tool execution results: {results}")
+
+            if all('error' in result for result in results):
+                errors = "; ".join(result['error'] for result in results)
+                logger.error(f"[query] Tool execution error: {errors}")
+                return jsonify({"error": f"Failed to execute tool: {errors}"}), 500
+
+            # Get final response with real data
+            data_message, data_tokens = prompt_builder.tool_data_message(results, prompt_stats['prompt_tokens'])
+            messages.append(data_message)
+            prompt_stats['tool_data_tokens'] = data_tokens
+            prompt_stats['prompt_tokens'] += data_tokens
+            logger.info(f"[query] Prompt stats with tool data: {prompt_stats}")
+
+            response = get_gemini_response(messages)
                 
-        # Save conversation
-        conversation = save_conversation_to_db(user_message, response, current_broker)
+        # Queued for write-behind, so there is no row id to return yet
+        save_conversation_to_db(user_message, response, current_broker)
 
         return jsonify({
             "response": response,
-            "conversation_id": conversation.id if conversation else None
+            "prompt_stats": prompt_stats
         })
 
     except Exception as e:
@@ -381,32 +585,36 @@ def query():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/v1/tools/cache_stats', methods=['GET'])
+def get_tool_cache_stats():
+    """Get hit/miss statistics for the tool result cache (operators only, like /metrics)"""
+    if not instrumentation.is_operator():
+        abort(404)
+    return jsonify(tool_registry.get_cache_stats())
+
 @app.route('/api/v1/conversation_history', methods=['GET'])
 @login_required
 def get_conversation_history():
-    """Get user's conversation history"""
+    """Get one page of the user's conversation history.
+
+    Query parameters: ``cursor`` (from the previous page's ``next_cursor``),
+    ``limit``, ``view=full`` to include message/response bodies, and ``q``
+    for full-text search over messages.
+    """
     try:
         thirty_days_ago = datetime.now() - timedelta(days=30)
-        conversations = Conversation.query.filter(
-            Conversation.user_id == current_user.id,
-            Conversation.timestamp >= thirty_days_ago
-        ).order_by(desc(Conversation.timestamp)).all()
-        
-        history = []
-        for conv in conversations:
-            history.append({
-                'id': conv.id,
-                'message': conv.message,
-                'response': conv.response,
-                'broker_context': conv.broker_context,
-                'timestamp': conv.timestamp.isoformat() if conv.timestamp else None
-            })
-            
-        return jsonify({
-            'conversations': history,
-            'count': len(history)
-        })
-        
+        page = conversation_history.fetch_page(
+            current_user.id,
+            since=thirty_days_ago,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', conversation_history.DEFAULT_PAGE_SIZE, type=int),
+            full=request.args.get('view') == 'full',
+            search=request.args.get('q')
+        )
+        return jsonify(page)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting conversation history: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -423,35 +631,42 @@ def store_conversation():
         data = request.json.get('conversation_data', {})
         messages = data.get('messages', [])
         
+        if not messages:
+            return jsonify({'error': 'No messages provided'}), 400
+
+        # Each message overwrites the previous one, so only the last is written
+        last = messages[-1]
+        timestamp = datetime.now()
+
         conversation_id = data.get('id')
         if conversation_id:
             conversation = Conversation.query.get(conversation_id)
             if not conversation or conversation.user_id != current_user.id:
                 return jsonify({'error': 'Conversation not found'}), 404
+
+            # Updates of known rows go through the write-behind queue
+            conversation_writer.update(Conversation, {
+                'id': conversation.id,
+                'message': last.get('content', ''),
+                'response': last.get('response', ''),
+                'timestamp': timestamp
+            })
         else:
-            conversation = None
-            
-        for msg in messages:
-            if conversation:
-                conversation.message = msg.get('content', '')
-                conversation.response = msg.get('response', '')
-                conversation.timestamp = datetime.now()
-            else:
-                conversation = Conversation(
-                    user_id=current_user.id,
-                    message=msg.get('content', ''),
-                    response=msg.get('response', ''),
-                    broker_context=session.get('selected_broker'),
-                    timestamp=datetime.now()
-                )
-                db.session.add(conversation)
-        
-        db.session.commit()
+            # New rows are written now because the client needs the id
+            conversation = Conversation(
+                user_id=current_user.id,
+                message=last.get('content', ''),
+                response=last.get('response', ''),
+                broker_context=session.get('selected_broker'),
+                timestamp=timestamp
+            )
+            db.session.add(conversation)
+            db.session.commit()
         
         return jsonify({
             'success': True,
             'id': conversation.id,
-            'timestamp': conversation.timestamp.isoformat()
+            'timestamp': timestamp.isoformat()
         })
         
     except Exception as e:
@@ -541,21 +756,28 @@ def update_conversation(conversation_id):
 @app.route('/api/v1/broker/status', methods=['GET'])
 @login_required
 def get_broker_status():
-    """Get status of all configured brokers"""
+    """Get status and circuit breaker health of all configured brokers"""
     try:
-        available_brokers = broker_factory.get_available_brokers()
+        factory = getattr(g, 'broker_factory', None)
+        configured = sorted(set(factory.broker_status) | set(factory.brokers)) if factory else []
+        available_brokers = [broker for broker in configured if factory.check_broker_status(broker)]
         status = {
-            broker: broker_factory.get_broker_status(broker)
-            for broker in available_brokers
+            broker: factory.get_broker_status(broker)
+            for broker in configured
+        }
+        health = {
+            broker: factory.get_health(broker)
+            for broker in configured
         }
         
         # Get user's trading preferences
-        user_prefs = current_user.trading_preferences
+        user_prefs = get_user_snapshot().trading_preferences
         preferred_markets = user_prefs.preferred_markets if user_prefs else []
         
         return jsonify({
             "active_brokers": available_brokers,
             "status": status,
+            "health": health,
             "preferred_markets": preferred_markets,
             "default_broker": next(iter(available_brokers), None)
         })
@@ -564,6 +786,325 @@ def get_broker_status():
         logger.error(f"Error getting broker status: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/v1/orders', methods=['POST'])
+@login_required
+def submit_order():
+    """Place an order directly, without going through the chat/LLM path.
+
+    Body: {"broker": "oanda", "order": {"instrument": "EUR_USD", "units": 1000,
+    "type": "MARKET"}, "stop_loss": ..., "take_profit": ...}. A bare order
+    body (instrument/units/type at the top level) is accepted too.
+    """
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    try:
+        broker = g.broker_factory.get_broker(data.get('broker') or request.headers.get('X-Selected-Broker'))
+    except ValueError as e:
+        return jsonify({"error": str(e), "need_configuration": True}), 400
+
+    try:
+        prepared, risk = prepare_order(broker, data)
+    except RiskRejected as e:
+        return jsonify({"error": str(e), "risk_rejected": True, "reasons": e.reasons}), 422
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        order_response = order_pipeline.submit(broker, prepared)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return jsonify({"error": str(e), "broker_used": broker.name}), 503
+    except Exception as e:
+        logger.error(f"[submit_order] ERROR: {str(e)}")
+        return jsonify({"error": str(e), "broker_used": broker.name}), 502
+
+    risk_engine.apply_fill(current_user.id, broker.name, prepared.instrument, prepared.units)
+    if trade_confirmations_enabled():
+        confirm_order(current_user.id, broker.name, prepared)
+    account_changed('create_order', current_user.id)
+    return jsonify({
+        "order": order_response,
+        "broker_used": broker.name,
+        "instrument": prepared.instrument,
+        "units": prepared.units,
+        "risk": risk,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@app.route('/api/v1/orders/batch', methods=['POST'])
+@login_required
+def submit_order_batch():
+    """Place a basket of orders and/or close a list of positions in one call.
+
+    Body: {"broker": "oanda", "orders": [{...}, ...], "close": ["EUR_USD", ...]}.
+    Each order or close item may name its own "broker" (a close item is then
+    {"instrument": ..., "broker": ...}). Items are grouped per broker, groups
+    run in parallel and each broker fans out with bounded parallelism.
+    Results come back per item, in request order.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    orders = data.get('orders') or []
+    closes = data.get('close') or []
+    if not isinstance(orders, list) or not isinstance(closes, list):
+        return jsonify({"error": "orders and close must be lists"}), 400
+    max_batch = config.getint('ORDERS', 'MAX_BATCH', fallback=50)
+    max_workers = config.getint('ORDERS', 'BATCH_WORKERS', fallback=4)
+    if not orders and not closes:
+        return jsonify({"error": "orders or close is required"}), 400
+    if len(orders) + len(closes) > max_batch:
+        return jsonify({"error": f"At most {max_batch} items per batch"}), 400
+
+    default_broker = data.get('broker') or request.headers.get('X-Selected-Broker')
+    order_results = [None] * len(orders)
+    close_results = [None] * len(closes)
+    order_risk = [None] * len(orders)
+    groups = {}  # broker name -> {'broker', 'orders': [(index, prepared)], 'close': [(index, instrument)]}
+
+    def group_for(broker_type):
+        broker = g.broker_factory.get_broker(broker_type)
+        return groups.setdefault(broker.name, {'broker': broker, 'orders': [], 'close': []})
+
+    for index, item in enumerate(orders):
+        if not isinstance(item, dict):
+            order_results[index] = {'error': "Each order must be an object"}
+            continue
+        try:
+            group = group_for(item.get('broker') or default_broker)
+            prepared, order_risk[index] = prepare_order(group['broker'], item)
+            group['orders'].append((index, prepared))
+        except RiskRejected as e:
+            order_results[index] = {'error': str(e), 'risk_rejected': True, 'reasons': e.reasons}
+        except ValueError as e:
+            order_results[index] = {'error': str(e)}
+    for index, item in enumerate(closes):
+        if not isinstance(item, (str, dict)):
+            close_results[index] = {'error': "Each close item must be an instrument or an object"}
+            continue
+        instrument, broker_type = (item, default_broker) if isinstance(item, str) else \
+            (item.get('instrument'), item.get('broker') or default_broker)
+        try:
+            group = group_for(broker_type)
+            group['close'].append((index, standardize_currency_pair(instrument) or instrument))
+        except (ValueError, AttributeError) as e:
+            close_results[index] = {'error': str(e)}
+
+    def run_group(group):
+        broker = group['broker']
+        if group['orders']:
+            outcomes = order_pipeline.submit_many(broker, [p for _, p in group['orders']], max_workers)
+            for (index, prepared), outcome in zip(group['orders'], outcomes):
+                order_results[index] = {**outcome, 'broker_used': broker.name}
+                if order_risk[index]:
+                    order_results[index]['risk'] = order_risk[index]
+                if 'result' in outcome:
+                    risk_engine.apply_fill(user_id, broker.name, prepared.instrument, prepared.units)
+                    if confirm:
+                        confirm_order(user_id, broker.name, prepared)
+        if group['close']:
+            outcomes = broker.close_positions([i for _, i in group['close']], max_workers=max_workers)
+            for (index, instrument), outcome in zip(group['close'], outcomes):
+                close_results[index] = {**outcome, 'instrument': instrument, 'broker_used': broker.name}
+                if 'result' in outcome:
+                    risk_engine.apply_close(user_id, broker.name, instrument)
+                    if confirm:
+                        confirm_close(user_id, broker.name, instrument)
+
+    # run_group executes on worker threads, outside the request context
+    user_id = current_user.id
+    confirm = trade_confirmations_enabled()
+    started = time.perf_counter()
+    group_list = list(groups.values())
+    for group, outcome in zip(group_list, fan_out(run_group, group_list, max_workers=len(group_list) or 1)):
+        if 'error' not in outcome:
+            continue
+        # The whole group failed (e.g. the position download); report it on each unset item
+        logger.error(f"[submit_order_batch] ERROR ({group['broker'].name}): {outcome['error']}")
+        for index, _ in group['orders']:
+            order_results[index] = order_results[index] or {'error': outcome['error']}
+        for index, _ in group['close']:
+            close_results[index] = close_results[index] or {'error': outcome['error']}
+
+    if any('result' in r for r in order_results + close_results):
+        account_changed('create_order', current_user.id)
+
+    return jsonify({
+        "orders": order_results,
+        "close": close_results,
+        "succeeded": sum('result' in r for r in order_results + close_results),
+        "failed": sum('error' in r for r in order_results + close_results),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@app.route('/api/v1/orders/latency', methods=['GET'])
+@login_required
+def order_latency():
+    """Recent submit-to-ack latency per broker and template cache counters"""
+    return jsonify(order_pipeline.latency_stats())
+
+@app.route('/api/v1/alerts', methods=['GET'])
+@login_required
+def list_price_alerts():
+    """The current user's price alerts, newest first"""
+    alerts = PriceAlert.query.filter_by(user_id=current_user.id).order_by(PriceAlert.created_at.desc()).all()
+    return jsonify({
+        "alerts": [{
+            "id": alert.id,
+            "instrument": alert.instrument,
+            "condition": alert.condition,
+            "price": alert.price,
+            "message": alert.message,
+            "active": alert.active,
+            "triggered_at": alert.triggered_at.isoformat() if alert.triggered_at else None,
+            "created_at": alert.created_at.isoformat() if alert.created_at else None
+        } for alert in alerts]
+    })
+
+@app.route('/api/v1/alerts', methods=['POST'])
+@login_required
+def create_price_alert():
+    """Arm a price alert. Body: {"instrument": "EUR_USD", "condition": "above"|"below", "price": 1.1}"""
+    data = request.get_json(silent=True) or {}
+    user_prefs = get_user_snapshot().trading_preferences
+    if not user_prefs or not user_prefs.enable_price_alerts:
+        return jsonify({"error": "Enable price alerts in your trading preferences first"}), 400
+
+    instrument = data.get('instrument') or ''
+    instrument = standardize_currency_pair(instrument) or instrument
+    try:
+        price = AlertEngine.validate(instrument, data.get('condition'), data.get('price'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if instrument_key(instrument) not in {instrument_key(pair) for pair in STREAMED_PAIRS}:
+        streamed = ', '.join(pair.replace('-', '_') for pair in STREAMED_PAIRS)
+        return jsonify({"error": f"Price alerts are only available for streamed instruments: {streamed}"}), 400
+
+    alert = PriceAlert(
+        user_id=current_user.id,
+        instrument=instrument,
+        condition=data['condition'],
+        price=price,
+        message=(data.get('message') or None) and str(data['message'])[:200]
+    )
+    db.session.add(alert)
+    db.session.commit()
+    get_alert_engine().add(alert)
+    return jsonify({"id": alert.id, "instrument": alert.instrument, "condition": alert.condition,
+                    "price": alert.price, "active": True}), 201
+
+@app.route('/api/v1/alerts/<int:alert_id>', methods=['DELETE'])
+@login_required
+def delete_price_alert(alert_id):
+    alert = PriceAlert.query.filter_by(id=alert_id, user_id=current_user.id).first()
+    if not alert:
+        return jsonify({"error": "Alert not found"}), 404
+    get_alert_engine().remove(alert.id)
+    db.session.delete(alert)
+    db.session.commit()
+    return jsonify({"deleted": alert_id})
+
+@app.route('/api/v1/notifications', methods=['GET'])
+@login_required
+def list_notifications():
+    """Newest notifications first. Query: ?unread=1, ?limit=, ?before_id= for the next page"""
+    limit = max(1, min(request.args.get('limit', default=50, type=int), 200))
+    items = notifications.recent(
+        current_user.id,
+        limit=limit,
+        unread_only=request.args.get('unread') in ('1', 'true'),
+        before_id=request.args.get('before_id', type=int)
+    )
+    return jsonify({
+        "notifications": items,
+        "unread": notifications.unread_count(current_user.id),
+        "next_before_id": items[-1]['id'] if len(items) == limit else None
+    })
+
+@app.route('/api/v1/notifications/unread_count', methods=['GET'])
+@login_required
+def notification_unread_count():
+    return jsonify({"unread": notifications.unread_count(current_user.id)})
+
+@app.route('/api/v1/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Body: {"ids": [...]} to mark some notifications read, or {} for all"""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+        return jsonify({"error": "ids must be a list of notification ids"}), 400
+    return jsonify({"unread": notifications.mark_read(current_user.id, ids)})
+
+@app.route('/api/v1/notifications/stream', methods=['GET'])
+@login_required
+def stream_notifications():
+    """Server-sent events: one event per notification (trade confirmations,
+    price alerts, ...) named after its type, plus "read" when badges change.
+
+    Each stream holds a worker thread, so streams are capped ([NOTIFICATIONS]
+    MAX_STREAMS, 503 beyond that; the client then polls) and closed after
+    STREAM_SECONDS, when the browser reconnects.
+    """
+    user_id = current_user.id
+    unread = notifications.unread_count(user_id)
+    heartbeat = config.getfloat('NOTIFICATIONS', 'HEARTBEAT_SECONDS', fallback=15.0)
+    lifetime = config.getfloat('NOTIFICATIONS', 'STREAM_SECONDS', fallback=300.0)
+    user_prefs = get_user_snapshot().trading_preferences
+    if user_prefs and user_prefs.enable_price_alerts:
+        get_alert_engine()  # armed alerts start listening once someone can receive them
+    subscriber = notifications.subscribe(user_id)
+    if subscriber is None:
+        return jsonify({"error": "Too many notification streams open", "poll": True}), 503
+    # The generator only needs user_id; don't hold a pooled connection for the stream's life
+    db.session.remove()
+
+    def events():
+        deadline = time.monotonic() + lifetime
+        try:
+            yield f"retry: 3000\nevent: read\ndata: {app.json.dumps({'type': 'read', 'unread': unread})}\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = subscriber.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {app.json.dumps(event)}\n\n"
+        finally:
+            notifications.unsubscribe(user_id, subscriber)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/v1/portfolio', methods=['GET'])
+@login_required
+def get_portfolio():
+    """Positions and account totals across every configured broker.
+
+    Served from memory between broker fetches ([PORTFOLIO] TTL); ?refresh=1
+    forces a refetch. Positions in streamed instruments are re-marked on
+    every tick, and the ETag changes whenever anything does.
+    ``?format=columnar`` returns the positions as one array per field.
+    """
+    brokers = g.broker_factory.brokers if hasattr(g, 'broker_factory') else {}
+    if not brokers:
+        return jsonify({"error": "No brokers configured", "need_configuration": True}), 400
+
+    refresh = request.args.get('refresh') in ('1', 'true')
+    portfolio = portfolio_service.get(current_user.id, brokers, refresh=refresh)
+    columnar = wants_columnar(request.args)
+    etag = make_etag('portfolio', current_user.id, portfolio.fetched_ms, portfolio.version, sorted(brokers), columnar)
+    not_modified = check_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    view = portfolio_service.view(portfolio)
+    if columnar:
+        view['positions'] = to_columnar(view['positions'], POSITION_COLUMNS)
+    view['format'] = 'columnar' if columnar else 'records'
+    return finalize(jsonify(view), etag)
+
 @app.route('/api/v1/account_details', methods=['GET'])
 @login_required
 def account_details():
@@ -573,11 +1114,7 @@ def account_details():
         if not broker_type:
             return jsonify({"error": "Broker type not specified"}), 400
             
-        broker_config = BrokerConfig.query.filter_by(
-            user_id=current_user.id,
-            broker_type=broker_type,
-            is_active=True
-        ).first()
+        broker_config = get_user_snapshot().get_broker_config(broker_type)
         
         if not broker_config:
             return jsonify({
@@ -585,19 +1122,21 @@ def account_details():
                 "need_configuration": True
             }), 400
             
-        broker_factory = BrokerFactory()
-        success = broker_factory.add_broker(
-            broker_type=broker_config.broker_type,
-            api_key=broker_config.api_key,
-            api_secret=broker_config.api_secret,
-            account_id=broker_config.account_id
-        )
-        
-        if not success:
-            return jsonify({
-                "error": f"Failed to initialize {broker_type} broker",
-                "need_configuration": True
-            }), 400
+        # Reuse the broker initialized for this request when available
+        broker_factory = g.broker_factory
+        if not broker_factory.check_broker_ready(broker_type):
+            success = broker_factory.add_broker(
+                broker_type=broker_config.broker_type,
+                api_key=broker_config.api_key,
+                api_secret=broker_config.api_secret,
+                account_id=broker_config.account_id
+            )
+            
+            if not success:
+                return jsonify({
+                    "error": f"Failed to initialize {broker_type} broker",
+                    "need_configuration": True
+                }), 400
             
         broker = broker_factory.get_broker(broker_type)
         details = broker.get_account_details()
@@ -611,12 +1150,20 @@ def account_details():
             "status": "connected"
         })
         
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({
             "error": str(e),
             "need_configuration": "configure broker credentials" in str(e).lower()
         }), 500
 
+def get_user_snapshot():
+    """Configuration snapshot for the current user, loaded once per request"""
+    if 'user_snapshot' not in g:
+        g.user_snapshot = load_user_snapshot(current_user.id)
+    return g.user_snapshot
+
 @app.before_request
 def initialize_user_brokers():
     """Initialize broker factory before each request if user is authenticated"""
@@ -624,13 +1171,9 @@ def initialize_user_brokers():
         if not hasattr(g, 'broker_factory'):
             g.broker_factory = BrokerFactory()
         if hasattr(g, 'broker_factory') and not g.broker_factory.brokers:
-            active_configs = BrokerConfig.query.filter_by(
-                user_id=current_user.id,
-                is_active=True
-            ).all()
-            
-            if active_configs:
-                g.broker_factory.initialize_user_brokers(current_user)
+            snapshot = get_user_snapshot()
+            if snapshot and snapshot.broker_configs:
+                g.broker_factory.initialize_user_brokers(snapshot)
 
 @app.teardown_appcontext
 def teardown_broker_factory(exception):
@@ -643,82 +1186,186 @@ def charts_view():
     """Render charts view template"""
     return render_template('charts_components/charts_container.html')
 
+def build_chart_body(server, pair, since, columnar, timeframe, last_timestamp):
+    """Serialized chart payload for points after since, for get_chart_data"""
+    types = TIMEFRAMES[timeframe]
+    formatted_data = [chart_row(entry) for entry in server.get_data(pair, since=since) if entry['type'] in types]
+    formatted_data.sort(key=lambda x: x['timestamp'])
+    count = len(formatted_data)
+    if columnar:
+        formatted_data = to_columnar(formatted_data, CHART_COLUMNS)
+
+    return app.json.dumps_bytes({
+        'data': formatted_data,
+        'metadata': {
+            'format': 'columnar' if columnar else 'records',
+            'pair': pair,
+            'timeframe': timeframe,
+            'last_update': int(time.time() * 1000),
+            'last_timestamp': last_timestamp,
+            'since': since,
+            'count': count,
+            'type': 'real-time'
+        }
+    })
+
 @app.route('/api/chart_data/<pair>', methods=['GET'])
 @login_required
 def get_chart_data(pair):
-    """Get chart data for the specified pair"""
+    """Get chart data for the specified pair.
+
+    ``?format=columnar`` returns one array per field (timestamp, price,
+    open, high, low, close) instead of a list of objects. ``?timeframe=``
+    selects 1m or 1s bars (default: both, "live"). ``?since=<ms>`` only
+    returns points newer than that timestamp. Responses carry an
+    ETag/Last-Modified from the pair's latest bar, so polling clients get
+    a 304 when nothing changed.
+
+    Full reads are served from the server's pre-serialized snapshot.
+    """
     try:
         # Get market data server
         server = get_market_data_server()
         if server is None:
             return jsonify({"error": "Market data server not available"}), 500
-            
-        # Get data from market data server
-        data = server.get_data(pair)
-        if not data:
-            return jsonify({"error": "No data available for pair"}), 404
-            
-        # Convert data to chart format
-        formatted_data = []
-        for entry in data:
-            if entry['type'] in ['per-minute', 'per-second']:
-                formatted_data.append({
-                    'timestamp': entry['timestamp'],
-                    'price': (entry['HH'] + entry['LL']) / 2,  # Use mid-price
-                    'high': entry['HH'],
-                    'low': entry['LL'],
-                    'open': entry['LH'],
-                    'close': entry['HL']
-                })
-                
-        if not formatted_data:
-            return jsonify({"error": "No formatted data available"}), 404
-            
-        # Sort by timestamp
-        formatted_data.sort(key=lambda x: x['timestamp'])
-        
-        # Add metadata
-        response = {
-            'data': formatted_data,
+
+        since = request.args.get('since', type=int)
+        timeframe = request.args.get('timeframe', DEFAULT_TIMEFRAME)
+        if timeframe not in TIMEFRAMES:
+            return jsonify({"error": f"timeframe must be one of {', '.join(TIMEFRAMES)}"}), 400
+        columnar = wants_columnar(request.args)
+
+        if since is None:
+            snapshot = server.get_chart_snapshot(pair, timeframe)
+            if snapshot is None:
+                return jsonify({"error": "No data available for pair"}), 404
+            version, last_timestamp, count, body = snapshot.render(columnar)
+            if not count:
+                return jsonify({"error": "No data available for pair"}), 404
+            etag = make_etag('snapshot', pair, timeframe, version, columnar)
+            not_modified = check_not_modified(etag, last_timestamp)
+            if not_modified is not None:
+                return not_modified
+            return send_encoded(body, etag, last_timestamp)
+
+        last_timestamp = server.get_last_timestamp(pair)
+        etag = make_etag(pair, server.get_version(pair), last_timestamp, timeframe, columnar, since)
+        not_modified = check_not_modified(etag, last_timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        # Identical concurrent polls (same pair, version, format, since) share one body
+        body = coalescer.do(('chart_data', etag),
+                            lambda: build_chart_body(server, pair, since, columnar, timeframe, last_timestamp))
+        return finalize(app.response_class(body, mimetype='application/json'), etag, last_timestamp)
+
+    except Exception as e:
+        logger.error(f"Error getting chart data: {str(e)}")
+        return jsonify({"error": "Failed to process chart data"}), 500
+
+@app.route('/api/chart_indicators/<pair>', methods=['GET'])
+@login_required
+def get_chart_indicators(pair):
+    """Indicator series for a live chart.
+
+    ``?indicators=ema:20,rsi:14,macd:12:26:9`` selects built-ins with
+    positional parameters; ``?indicator_ids=3,7`` selects stored Indicator
+    rows. The first request attaches each indicator to the market data
+    server (primed from buffered history); after that it advances one bar
+    at a time and requests only read the stored series. A pair holds at most
+    [INDICATORS] MAX_LIVE_PER_PAIR indicators; ones nobody reads for
+    LIVE_IDLE_TTL seconds are detached. Stored rows are attached per
+    revision, so editing a row attaches a fresh indicator and the old one
+    idles out.
+    """
+    try:
+        # NumPy/pandas load on first use rather than at start-up
+        from indicators import parse_indicator_spec, from_model
+
+        server = get_market_data_server()
+        if server is None:
+            return jsonify({"error": "Market data server not available"}), 500
+
+        # Response key -> (key on the server, indicator)
+        requested = {}
+        for spec in filter(None, request.args.get('indicators', '').split(',')):
+            key, indicator = parse_indicator_spec(spec)
+            requested[key] = (key, indicator)
+        for indicator_id in filter(None, request.args.get('indicator_ids', '').split(',')):
+            row = db.session.get(Indicator, int(indicator_id))
+            indicator = from_model(row) if row else None
+            if indicator is None:
+                return jsonify({"error": f"Indicator {indicator_id} has no built-in implementation"}), 400
+            # Editing the row changes its revision, so the edited version gets attached
+            revision = hashlib.blake2b(
+                f"{row.updated_at}|{json.dumps(row.parameters, sort_keys=True, default=str)}".encode(), digest_size=6
+            ).hexdigest()
+            requested[f"indicator:{row.id}"] = (f"indicator:{row.id}@{revision}", indicator)
+        if not requested:
+            return jsonify({"error": "No indicators requested"}), 400
+        if len(requested) > server.max_indicators:
+            return jsonify({"error": f"At most {server.max_indicators} indicators per request"}), 400
+
+        for server_key, indicator in requested.values():
+            if server.get_indicator_version(pair, server_key) is None:
+                server.attach_indicator(pair, server_key, indicator)
+
+        since = request.args.get('since', type=int)
+        etag = make_etag(pair, since, request.args.get('format', ''),
+                         *sorted((key, server.get_indicator_version(pair, key)) for key, _ in requested.values()))
+        last_timestamp = server.get_last_timestamp(pair)
+        not_modified = check_not_modified(etag, last_timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        indicators = {}
+        for key, (server_key, indicator) in requested.items():
+            series = server.get_indicator_series(pair, server_key, since=since) or []
+            rows = [{'timestamp': timestamp, **(values or {})} for timestamp, values in series]
+            columns = ['timestamp', *indicator.outputs]
+            indicators[key] = to_columnar(rows, columns) if wants_columnar(request.args) else rows
+
+        return finalize(jsonify({
+            'indicators': indicators,
             'metadata': {
                 'pair': pair,
-                'last_update': int(time.time() * 1000),
-                'count': len(formatted_data),
-                'type': 'real-time'
+                'since': since,
+                'format': 'columnar' if wants_columnar(request.args) else 'records',
+                'last_timestamp': last_timestamp
             }
-        }
-        
-        return jsonify(response)
-        
+        }), etag, last_timestamp)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error getting chart data: {str(e)}")
-        return jsonify({"error": "Failed to process chart data"}), 500
+        logger.error(f"Error getting chart indicators: {str(e)}")
+        return jsonify({"error": "Failed to process chart indicators"}), 500
 
-@app.teardown_appcontext
-def teardown_market_data(exception):
-    """Clean up market data server at end of app context"""
+def shutdown_market_data():
+    """Stop the market data server when the process exits.
+
+    This used to run on every app-context teardown, which dropped the feed
+    after each request; alerts and indicators need it to stay connected.
+    """
     global market_data_server
     if market_data_server:
         market_data_server.stop()
         market_data_server = None
+
+atexit.register(shutdown_market_data)
         
 def save_conversation_to_db(user_message, assistant_response, broker_name=None):
-    """Save conversation to database with error logging"""
-    logger.info("[save_conversation_to_db] Saving new conversation")
+    """Queue conversation for write-behind persistence with error logging"""
+    logger.info("[save_conversation_to_db] Queueing new conversation")
     try:
-        conversation = Conversation(
-            user_id=current_user.id if current_user.is_authenticated else 1,
-            message=user_message,
-            response=assistant_response,
-            broker_context=broker_name,
-            timestamp=datetime.now()
-        )
-        db.session.add(conversation)
-        db.session.commit()
-        logger.info(f"[save_conversation_to_db] Successfully saved conversation ID: {conversation.id}")
-        return conversation
+        conversation_writer.insert(Conversation, {
+            'user_id': current_user.id if current_user.is_authenticated else 1,
+            'message': user_message,
+            'response': assistant_response,
+            'broker_context': broker_name,
+            'timestamp': datetime.now()
+        })
     except Exception as e:
-        db.session.rollback()
         logger.error(f"[save_conversation_to_db] ERROR: Failed to save conversation: {str(e)}")
         logger.error(f"[save_conversation_to_db] Traceback: {traceback.format_exc()}")
         raise
@@ -737,9 +1384,12 @@ def internal_server_error(error):
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(user_config_bp)
+app.register_blueprint(trading_bp)
 
 # Main entry point
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        if conversation_history.build_index_on_demand:
+            conversation_history.ensure_search_index()
     app.run(port=5000, debug=True)
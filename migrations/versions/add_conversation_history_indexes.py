@@ -0,0 +1,38 @@
+"""Add conversation history indexes
+
+Revision ID: 2b7c9e41d0f3
+Revises: 1234abcd5678
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '2b7c9e41d0f3'
+down_revision = '1234abcd5678'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        'ix_conversation_user_timestamp',
+        'conversation',
+        ['user_id', 'timestamp', 'id']
+    )
+
+    # Full-text search is SQLite-only (FTS5); other engines fall back to LIKE
+    if op.get_bind().dialect.name == 'sqlite':
+        from conversation_history import FTS_STATEMENTS, FTS_TABLE
+        for statement in FTS_STATEMENTS:
+            op.execute(statement)
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS conversation_fts_ai")
+        op.execute("DROP TRIGGER IF EXISTS conversation_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS conversation_fts_au")
+        op.execute("DROP TABLE IF EXISTS conversation_fts")
+
+    op.drop_index('ix_conversation_user_timestamp', table_name='conversation')
@@ -0,0 +1,34 @@
+"""Add price alerts
+
+Revision ID: 5e1a8c93f27b
+Revises: 2b7c9e41d0f3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e1a8c93f27b'
+down_revision = '2b7c9e41d0f3'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'price_alert',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('instrument', sa.String(length=20), nullable=False),
+        sa.Column('condition', sa.String(length=10), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('message', sa.String(length=200), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('triggered_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index('ix_price_alert_active_instrument', 'price_alert', ['active', 'instrument'])
+
+def downgrade():
+    op.drop_index('ix_price_alert_active_instrument', table_name='price_alert')
+    op.drop_table('price_alert')
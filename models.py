@@ -1,6 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-import pandas as pd
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import json
@@ -140,6 +139,22 @@ class Notification(db.Model):
     read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class PriceAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    instrument = db.Column(db.String(20), nullable=False)
+    condition = db.Column(db.String(10), nullable=False)  # 'above', 'below'
+    price = db.Column(db.Float, nullable=False)
+    message = db.Column(db.String(200))
+    active = db.Column(db.Boolean, default=True)
+    triggered_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves loading every armed alert into the in-memory index at startup
+        db.Index('ix_price_alert_active_instrument', 'active', 'instrument'),
+    )
+
 class Conversation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -148,6 +163,11 @@ class Conversation(db.Model):
     broker_context = db.Column(db.String(20))  # Track which broker was active
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves per-user history listing ordered by time (keyset pagination)
+        db.Index('ix_conversation_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
+
 class Indicator(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -0,0 +1,166 @@
+"""
+Notification delivery
+---
+One place to create, count and push user notifications:
+
+    notifications.notify(user_id, 'trade', 'Bought 1000 EUR_USD on oanda')
+
+- Rows are queued on a bounded WriteBehindQueue and inserted in batches.
+- Unread counts are cached per user (LRU-bounded): the first read runs a
+  COUNT, after that notify() and mark_read() keep the number current, so
+  badges never query the database.
+- Every notification is pushed to the user's SSE subscribers as soon as
+  it is created, before the row is written.
+
+Counters and subscribers live in this process, so the app must run as a
+single process. Each open stream also holds a server thread, which is why
+the Procfile runs one gunicorn worker with the gthread worker class: the
+default sync worker would be taken over by the first open tab. Streams are
+therefore bounded: at most MAX_SUBSCRIBERS at once (further clients get a
+503 and poll the unread count instead), and each one ends after a fixed
+lifetime so the browser reconnects and the thread is recycled.
+"""
+
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import queue
+import threading
+
+from sqlalchemy import func
+from models import db, Notification
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUBSCRIBER_QUEUE = 100
+DEFAULT_MAX_SUBSCRIBERS = 24
+DEFAULT_COUNTER_CACHE = 10000
+FLUSH_TIMEOUT = 2.0
+
+class NotificationCenter:
+    def __init__(self, writer, subscriber_queue_size: int = DEFAULT_SUBSCRIBER_QUEUE,
+                 counter_cache_size: int = DEFAULT_COUNTER_CACHE,
+                 max_subscribers: int = DEFAULT_MAX_SUBSCRIBERS):
+        self.writer = writer
+        self.max_subscribers = max_subscribers
+        self.subscriber_queue_size = subscriber_queue_size
+        self.counter_cache_size = counter_cache_size
+        self.subscribers: Dict[int, List[queue.Queue]] = {}
+        self.stats = {'created': 0, 'pushed': 0, 'dropped_pushes': 0, 'count_queries': 0}
+        self._unread: "OrderedDict[int, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def notify(self, user_id: int, type: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Queue a notification row, bump the unread badge and push it to connected clients"""
+        now = datetime.utcnow()
+        message = str(message)[:500]
+        self.writer.insert(Notification, {
+            'user_id': user_id,
+            'type': type,
+            'message': message,
+            'read': False,
+            'created_at': now
+        })
+        with self._lock:
+            self.stats['created'] += 1
+            unread = self._unread.get(user_id)
+            if unread is not None:
+                unread = self._unread[user_id] = unread + 1
+        self.publish(user_id, {
+            'type': type,
+            'message': message,
+            'created_at': now.isoformat(),
+            'unread': unread,
+            **(data or {})
+        })
+
+    def unread_count(self, user_id: int) -> int:
+        """Cached unread count; queries the database only the first time per user"""
+        with self._lock:
+            unread = self._unread.get(user_id)
+            if unread is not None:
+                self._unread.move_to_end(user_id)
+                return unread
+
+        # Rows still in the write-behind queue wouldn't be counted yet
+        self.writer.flush(FLUSH_TIMEOUT)
+        unread = db.session.query(func.count(Notification.id)).filter(
+            Notification.user_id == user_id, Notification.read.is_(False)
+        ).scalar() or 0
+        with self._lock:
+            self.stats['count_queries'] += 1
+            self._unread[user_id] = unread
+            while len(self._unread) > self.counter_cache_size:
+                self._unread.popitem(last=False)
+        return unread
+
+    def mark_read(self, user_id: int, ids: Optional[List[int]] = None) -> int:
+        """Mark some or all of a user's notifications read; returns the new unread count"""
+        self.writer.flush(FLUSH_TIMEOUT)
+        query = Notification.query.filter(Notification.user_id == user_id, Notification.read.is_(False))
+        if ids is not None:
+            query = query.filter(Notification.id.in_(ids))
+        updated = query.update({'read': True}, synchronize_session=False)
+        db.session.commit()
+
+        with self._lock:
+            if ids is None:
+                self._unread[user_id] = 0
+            elif user_id in self._unread:
+                self._unread[user_id] = max(self._unread[user_id] - updated, 0)
+        unread = self.unread_count(user_id)
+        # Keeps badges in the user's other tabs in step
+        self.publish(user_id, {'type': 'read', 'unread': unread})
+        return unread
+
+    def recent(self, user_id: int, limit: int = 50, unread_only: bool = False,
+               before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest notifications first, keyset-paginated by id"""
+        self.writer.flush(FLUSH_TIMEOUT)
+        query = Notification.query.filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.read.is_(False))
+        if before_id is not None:
+            query = query.filter(Notification.id < before_id)
+        return [{
+            'id': row.id,
+            'type': row.type,
+            'message': row.message,
+            'read': row.read,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        } for row in query.order_by(Notification.id.desc()).limit(limit)]
+
+    def subscribe(self, user_id: int) -> Optional[queue.Queue]:
+        """Queue that receives this user's notifications until unsubscribed,
+        or None when max_subscribers streams are already open"""
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if sum(len(queues) for queues in self.subscribers.values()) >= self.max_subscribers:
+                return None
+            self.subscribers.setdefault(user_id, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id: int, subscriber: queue.Queue) -> None:
+        with self._lock:
+            queues = self.subscribers.get(user_id, [])
+            if subscriber in queues:
+                queues.remove(subscriber)
+            if not queues:
+                self.subscribers.pop(user_id, None)
+
+    def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        for subscriber in list(self.subscribers.get(user_id, ())):
+            try:
+                subscriber.put_nowait(event)
+                self.stats['pushed'] += 1
+            except queue.Full:
+                # A stalled client must not hold up the caller (often the feed thread)
+                self.stats['dropped_pushes'] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'cached_counters': len(self._unread),
+            'subscribers': sum(len(queues) for queues in self.subscribers.values())
+        }
@@ -1,28 +1,50 @@
 import requests
-from oandapyV20 import API
-from oandapyV20.exceptions import V20Error
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-import pandas as pd
 import json
-
+from instrumentation import instrument_broker
+from concurrency import fan_out
+from rate_limit import rate_limiter, RateLimitedSession, RateLimitTimeout, ORDER, ACCOUNT, MARKET_DATA
+
+def classify_request(method, url):
+    """Rate limit priority of an OANDA REST call"""
+    if method in ('POST', 'PUT'):
+        return ORDER
+    if url.endswith(('/candles', '/orderBook')):
+        return MARKET_DATA
+    return ACCOUNT
+
+@instrument_broker('oanda')
 class OandaBroker:
-    def __init__(self, api_key, account_id, base_url="https://api-fxpractice.oanda.com"):
+    name = 'oanda'
+
+    def __init__(self, api_key, account_id, base_url="https://api-fxpractice.oanda.com", timeout=10.0):
         self.api_key = api_key
         self.account_id = account_id
         self.base_url = base_url
-        self.api = API(access_token=api_key)
+        self._api = None
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}",
             "Accept-Datetime-Format": "RFC3339"
         }
+        # Keep-alive session so repeat calls skip the TCP/TLS handshake; every
+        # request waits its turn in the token's shared rate limit
+        self.limiter = rate_limiter.for_credential('oanda', api_key)
+        self.session = RateLimitedSession(self.limiter, classify_request, timeout=timeout)
+        self.session.headers.update(self.headers)
+
+    @property
+    def api(self):
+        """oandapyV20 client, created on first use"""
+        if self._api is None:
+            from oandapyV20 import API
+            self._api = API(access_token=self.api_key)
+        return self._api
 
     def test_connection(self):
         """Test connection to OANDA API"""
         try:
-            response = requests.get(
-                f"{self.base_url}/v3/accounts/{self.account_id}/summary",
-                headers=self.headers
+            response = self.session.get(
+                f"{self.base_url}/v3/accounts/{self.account_id}/summary"
             )
             if response.status_code == 200:
                 return True
@@ -36,13 +58,15 @@ class OandaBroker:
         """Get account details with enhanced error handling"""
         try:
             url = f"{self.base_url}/v3/accounts/{self.account_id}/summary"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url)
             
             if response.status_code != 200:
                 return {"error": f"Failed to get account details. Status: {response.status_code}, Response: {response.text}"}
                 
             return response.json()
             
+        except RateLimitTimeout:
+            raise  # local queueing, not a broker failure
         except requests.exceptions.RequestException as err:
             return {"error": f"Network error getting account details: {str(err)}"}
         except Exception as err:
@@ -50,9 +74,16 @@ class OandaBroker:
 
     def create_order(self, order_data):
         """Create a new trading order"""
+        return self._post_order(order_data)
+
+    def submit_order(self, payload):
+        """Submit a payload already built by process_order_request"""
+        return self._post_order(payload)
+
+    def _post_order(self, payload):
         try:
             url = f"{self.base_url}/v3/accounts/{self.account_id}/orders"
-            response = requests.post(url, headers=self.headers, json=order_data)
+            response = self.session.post(url, json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as err:
@@ -61,23 +92,43 @@ class OandaBroker:
     def get_positions(self):
         """Get current positions"""
         url = f"{self.base_url}/v3/accounts/{self.account_id}/positions"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         return response.json()
 
     def close_position(self, instrument):
         """Close a position for given instrument"""
         url = f"{self.base_url}/v3/accounts/{self.account_id}/positions/{instrument}/close"
-        response = requests.put(url, headers=self.headers)
+        response = self.session.put(url)
         return response.json()
 
+    def submit_orders(self, payloads, max_workers=4):
+        """Submit several prebuilt payloads concurrently over the shared session"""
+        return fan_out(self._post_order, payloads, max_workers)
+
+    def close_positions(self, instruments, max_workers=4):
+        """Close several positions concurrently; per-instrument results in input order"""
+        return fan_out(self._close_position, instruments, max_workers)
+
+    def _close_position(self, instrument):
+        url = f"{self.base_url}/v3/accounts/{self.account_id}/positions/{instrument}/close"
+        response = self.session.put(url)
+        body = response.json()
+        if response.status_code != 200:
+            raise ValueError(body.get('errorMessage') or f"Failed to close {instrument}: {response.status_code}")
+        return body
+
     def get_candlestick_data(self, instrument, granularity="M1", count=100):
         """Get candlestick data for an instrument"""
+        from oandapyV20.exceptions import V20Error
+        from oandapyV20.endpoints.instruments import InstrumentsCandles
+
         try:
             params = {
                 "count": count,
                 "granularity": granularity
             }
             request = InstrumentsCandles(instrument=instrument, params=params)
+            self.limiter.acquire(MARKET_DATA)
             self.api.request(request)
             return request.response
         except V20Error as e:
@@ -86,19 +137,19 @@ class OandaBroker:
     def get_order_book(self, instrument):
         """Get order book for an instrument"""
         url = f"{self.base_url}/v3/instruments/{instrument}/orderBook"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         return response.json()
 
     def get_trades(self):
         """Get open trades"""
         url = f"{self.base_url}/v3/accounts/{self.account_id}/trades"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         return response.json()
 
     def process_order_request(self, order_request):
         """Process and validate order request"""
         required_fields = ['units', 'instrument', 'type']
-        order_data = order_request.get('order', {})
+        order_data = dict(order_request.get('order', {}))
         
         if not all(field in order_data for field in required_fields):
             raise ValueError("Required fields are missing in order request")
@@ -0,0 +1,261 @@
+"""
+Strategy optimizer
+---
+Parallel parameter sweeps and walk-forward optimization on top of the
+vectorized backtesting engine.
+
+    with Optimizer(max_workers=8) as optimizer:
+        for pair in ['EUR_USD', 'GBP_USD', 'AUD_USD', 'USD_JPY']:
+            for granularity in ['H1', 'H4', 'D']:
+                optimizer.add_dataset((pair, granularity), load_historical_data(pair, granularity, 5000))
+        results = optimizer.walk_forward_many(optimizer.datasets, 'sma_crossover',
+                                              {'fast': [5, 10, 20], 'slow': [50, 100, 200]})
+
+Price arrays are copied once into shared memory; worker processes attach
+to them by name, so tasks only pickle a dataset spec and parameter dicts.
+Every dataset/fold is optimized at the same time, so the pool stays busy
+across all pairs and timeframes.
+
+Unpromising parameter sets are pruned by successive halving: each rung
+evaluates the survivors on a longer prefix of the training window and
+keeps the best 1/eta of them, so most combinations never run on the full
+history.
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Hashable, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import itertools
+import logging
+import math
+import os
+
+import numpy as np
+
+from backtesting import run_backtest, PERIODS_PER_YEAR
+
+logger = logging.getLogger(__name__)
+
+OHLC_FIELDS = ('open', 'high', 'low', 'close')
+
+def _sma(values: np.ndarray, window: int) -> np.ndarray:
+    result = np.full(len(values), np.nan)
+    if window <= len(values):
+        cumsum = np.cumsum(np.r_[0.0, values])
+        result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+def sma_crossover(open_, high, low, close, fast: int = 20, slow: int = 50):
+    """Enter when the fast SMA crosses above the slow SMA, exit when it falls below"""
+    fast_ma, slow_ma = _sma(close, int(fast)), _sma(close, int(slow))
+    above = fast_ma > slow_ma
+    return above & ~np.r_[False, above[:-1]], fast_ma < slow_ma
+
+# Strategies referenced by name; callables must be importable module-level functions
+STRATEGIES: Dict[str, Callable] = {
+    'sma_crossover': sma_crossover,
+}
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of a {param: [values]} grid"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+# -- worker side -----------------------------------------------------------------
+
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+def _attach(spec: Dict[str, Any]) -> np.ndarray:
+    """Map a dataset's shared memory block in this worker, once per process"""
+    entry = _attached.get(spec['shm'])
+    if entry is None:
+        shm = shared_memory.SharedMemory(name=spec['shm'])
+        array = np.ndarray(spec['shape'], dtype=np.float64, buffer=shm.buf)
+        entry = _attached[spec['shm']] = (shm, array)
+    return entry[1]
+
+def _score(metrics: Dict[str, Any], objective: str) -> float:
+    value = metrics.get(objective)
+    if value is None or not math.isfinite(value):
+        return -math.inf
+    return float(value)
+
+def _evaluate_chunk(spec: Dict[str, Any], strategy: Union[str, Callable], param_sets: List[Dict[str, Any]],
+                    start: int, end: int, objective: str, backtest_kwargs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Backtest several parameter sets on bars [start, end) of one dataset"""
+    prices = _attach(spec)
+    strategy_fn = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+    # Indicators see history before start for warm-up, but nothing after end
+    history = [prices[i, :end] for i in range(len(OHLC_FIELDS))]
+    window = [column[start:] for column in history]
+
+    results = []
+    for params in param_sets:
+        try:
+            entries, exits = strategy_fn(*history, **params)
+            metrics = run_backtest(*window, entries[start:], exits[start:],
+                                   **{**spec['backtest'], **backtest_kwargs}).metrics
+            results.append({'params': params, 'score': _score(metrics, objective), 'metrics': metrics})
+        except Exception as e:
+            results.append({'params': params, 'score': -math.inf, 'error': str(e)})
+    return results
+
+# -- coordinator -----------------------------------------------------------------
+
+class Optimizer:
+    def __init__(self, max_workers: Optional[int] = None, objective: str = 'sharpeRatio',
+                 rungs: int = 3, eta: int = 3, min_bars: int = 100):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.objective = objective
+        self.rungs = max(1, rungs)
+        self.eta = max(2, eta)
+        self.min_bars = min_bars
+        self.datasets: Dict[Hashable, Dict[str, Any]] = {}
+        self._shared: List[shared_memory.SharedMemory] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_dataset(self, key: Hashable, df=None, granularity: Optional[str] = None, **arrays) -> None:
+        """Copy a candle DataFrame (or open/high/low/close arrays) into shared memory"""
+        if df is not None:
+            arrays = {field: df[field].to_numpy() for field in OHLC_FIELDS}
+            if granularity is None and 'granularity' in df and len(df):
+                granularity = df['granularity'].iat[0]
+        if set(arrays) != set(OHLC_FIELDS):
+            raise ValueError("Datasets need open, high, low and close")
+
+        bars = len(arrays['close'])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(OHLC_FIELDS) * bars * 8))
+        prices = np.ndarray((len(OHLC_FIELDS), bars), dtype=np.float64, buffer=shm.buf)
+        for i, field in enumerate(OHLC_FIELDS):
+            prices[i] = arrays[field]
+        self._shared.append(shm)
+        self.datasets[key] = {
+            'shm': shm.name,
+            'shape': prices.shape,
+            'bars': bars,
+            'backtest': {'periods_per_year': PERIODS_PER_YEAR.get(granularity, PERIODS_PER_YEAR['M1'])},
+        }
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _run(self, batches: List[Tuple[Hashable, List[Dict[str, Any]], int, int]], strategy,
+             backtest_kwargs: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """Evaluate (job, param_sets, start, end) batches across the pool, preserving order"""
+        total = sum(len(param_sets) for _, param_sets, _, _ in batches)
+        chunk_size = max(1, math.ceil(total / (self.max_workers * 4)))
+        futures = []
+        for job, param_sets, start, end in batches:
+            spec = self.datasets[job[0]]
+            futures.append([
+                self._pool().submit(_evaluate_chunk, spec, strategy, param_sets[i:i + chunk_size],
+                                    start, end, self.objective, backtest_kwargs)
+                for i in range(0, len(param_sets), chunk_size)
+            ])
+        return [[result for future in chunks for result in future.result()] for chunks in futures]
+
+    def _halving(self, jobs: Dict[Hashable, Tuple[int, int]], strategy, grid: Dict[str, List[Any]],
+                 backtest_kwargs: Dict[str, Any]) -> Dict[Hashable, List[Dict[str, Any]]]:
+        """Successive-halving sweep for several (dataset, window) jobs at once"""
+        candidates = expand_grid(grid)
+        survivors = {job: candidates for job in jobs}
+        pruned: Dict[Hashable, List[Dict[str, Any]]] = {job: [] for job in jobs}
+        rankings: Dict[Hashable, List[Dict[str, Any]]] = {}
+
+        for rung in range(self.rungs):
+            batches = []
+            for job, (start, end) in jobs.items():
+                length = max(self.min_bars, (end - start) * (rung + 1) // self.rungs)
+                batches.append((job, survivors[job], start, min(end, start + length)))
+            outcomes = self._run(batches, strategy, backtest_kwargs)
+
+            for (job, _, _, _), results in zip(batches, outcomes):
+                results.sort(key=lambda result: result['score'], reverse=True)
+                if rung == self.rungs - 1:
+                    rankings[job] = results + pruned[job]
+                    continue
+                keep = max(1, math.ceil(len(results) / self.eta))
+                for result in results[keep:]:
+                    result['pruned_at_rung'] = rung
+                pruned[job] = results[keep:] + pruned[job]
+                survivors[job] = [result['params'] for result in results[:keep]]
+            logger.info(f"Rung {rung}: {sum(len(s) for s in survivors.values())} parameter sets remain")
+        return rankings
+
+    def sweep_many(self, keys: List[Hashable], strategy, grid: Dict[str, List[Any]],
+                   start: int = 0, end: Optional[int] = None, **backtest_kwargs) -> Dict[Hashable, List[Dict[str, Any]]]:
+        """Rank a parameter grid on each dataset, best first; pruned sets are listed last"""
+        jobs = {(key,): (start, end or self.datasets[key]['bars']) for key in keys}
+        return {job[0]: ranking for job, ranking in self._halving(jobs, strategy, grid, backtest_kwargs).items()}
+
+    def sweep(self, key: Hashable, strategy, grid: Dict[str, List[Any]], **kwargs) -> List[Dict[str, Any]]:
+        return self.sweep_many([key], strategy, grid, **kwargs)[key]
+
+    def walk_forward_many(self, keys, strategy, grid: Dict[str, List[Any]], folds: int = 4,
+                          train_ratio: float = 0.7, **backtest_kwargs) -> Dict[Hashable, Dict[str, Any]]:
+        """Rolling walk-forward: optimize on each train window, score the winner on the next test window"""
+        jobs = {}
+        for key in keys:
+            bars = self.datasets[key]['bars']
+            test_size = int(bars * (1 - train_ratio) / folds)
+            train_size = bars - folds * test_size
+            if test_size < 2:
+                raise ValueError(f"Dataset {key!r} is too short for {folds} walk-forward folds")
+            for fold in range(folds):
+                train_start = fold * test_size
+                jobs[(key, fold)] = (train_start, train_start + train_size)
+
+        rankings = self._halving(jobs, strategy, grid, backtest_kwargs)
+        best = {job: ranking[0] for job, ranking in rankings.items()}
+
+        test_batches = []
+        for job, (_, train_end) in jobs.items():
+            test_end = train_end + int(self.datasets[job[0]]['bars'] * (1 - train_ratio) / folds)
+            test_batches.append((job, [best[job]['params']], train_end, test_end))
+        tests = self._run(test_batches, strategy, backtest_kwargs)
+
+        results: Dict[Hashable, Dict[str, Any]] = {key: {'folds': []} for key in keys}
+        for (job, _, test_start, test_end), (test,) in zip(test_batches, tests):
+            key, fold = job
+            train_start, train_end = jobs[job]
+            results[key]['folds'].append({
+                'fold': fold,
+                'train': (train_start, train_end),
+                'test': (test_start, test_end),
+                'params': best[job]['params'],
+                'train_score': best[job]['score'],
+                'test_score': test['score'],
+                'test_metrics': test.get('metrics'),
+            })
+
+        for key, result in results.items():
+            test_returns = [f['test_metrics']['totalReturn'] for f in result['folds'] if f['test_metrics']]
+            scores = [f['test_score'] for f in result['folds'] if math.isfinite(f['test_score'])]
+            result['out_of_sample'] = {
+                'totalReturn': float(np.prod([1 + r for r in test_returns]) - 1) if test_returns else None,
+                'meanScore': float(np.mean(scores)) if scores else None,
+                'objective': self.objective,
+            }
+        return results
+
+    def walk_forward(self, key: Hashable, strategy, grid: Dict[str, List[Any]], **kwargs) -> Dict[str, Any]:
+        return self.walk_forward_many([key], strategy, grid, **kwargs)[key]
+
+    def close(self) -> None:
+        """Stop the worker pool and release shared memory"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shm in self._shared:
+            shm.close()
+            shm.unlink()
+        self._shared = []
+        self.datasets = {}
@@ -0,0 +1,140 @@
+"""
+Order submission pipeline
+---
+Fast path for placing orders without the chat/LLM round trip.
+
+    prepared = order_pipeline.prepare(broker, order_request)   # validate + build once
+    response = order_pipeline.submit(broker, prepared)         # POST, timed to ack
+
+prepare() runs the broker's process_order_request once and caches the
+built payload (an OANDA order body or an Alpaca order request) under the
+canonical form of the request, so repeated orders such as "buy 1000
+EUR_USD at market" skip validation and payload construction. Payloads
+hold no account data, so the cache is shared across users.
+
+submit() records submit-to-ack latency per broker in a rolling window
+and in the tradingpal_order_ack_seconds histogram on /metrics.
+"""
+
+from typing import Dict, Any, List, Tuple
+from collections import OrderedDict, deque
+import json
+import threading
+import time
+
+from instrumentation import metrics
+
+ACK_METRIC = 'tradingpal_order_ack_seconds'
+metrics.describe(ACK_METRIC, 'Order submit-to-acknowledgement latency by broker')
+
+class PreparedOrder:
+    """A validated, broker-specific order payload ready to submit"""
+
+    __slots__ = ('broker_type', 'payload', 'instrument', 'units')
+
+    def __init__(self, broker_type: str, payload: Any, instrument: str, units: float):
+        self.broker_type = broker_type
+        self.payload = payload
+        self.instrument = instrument
+        self.units = units
+
+class OrderPipeline:
+    def __init__(self, template_cache_size: int = 512, latency_window: int = 500):
+        self.template_cache_size = template_cache_size
+        self.latency_window = latency_window
+        self._templates: "OrderedDict[Tuple[str, str], PreparedOrder]" = OrderedDict()
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.template_hits = 0
+        self.template_misses = 0
+
+    @staticmethod
+    def normalize(order_request: Dict[str, Any]) -> Dict[str, Any]:
+        """Accept either {"order": {...}, ...} or a bare order body"""
+        if 'order' in order_request:
+            return order_request
+        extras = {key: order_request[key] for key in ('price', 'take_profit', 'stop_loss',
+                                                       'trailing_stop_loss_distance') if key in order_request}
+        order = {key: value for key, value in order_request.items() if key not in extras and key != 'broker'}
+        order.setdefault('type', 'MARKET')
+        return {'order': order, **extras}
+
+    def prepare(self, broker, order_request: Dict[str, Any]) -> PreparedOrder:
+        """Validate and build a broker payload, reusing a cached template when possible"""
+        order_request = self.normalize(order_request)
+        key = (broker.name, json.dumps(order_request, sort_keys=True, default=str))
+        with self._lock:
+            prepared = self._templates.get(key)
+            if prepared is not None:
+                self._templates.move_to_end(key)
+                self.template_hits += 1
+                return prepared
+            self.template_misses += 1
+
+        order = order_request.get('order', {})
+        try:
+            units = float(order.get('units'))
+        except (TypeError, ValueError):
+            raise ValueError("units must be a number")
+        if units == 0:
+            raise ValueError("units must be non-zero")
+        if not order.get('instrument'):
+            raise ValueError("instrument is required")
+
+        prepared = PreparedOrder(broker.name, broker.process_order_request(order_request),
+                                 order['instrument'], units)
+        with self._lock:
+            self._templates[key] = prepared
+            while len(self._templates) > self.template_cache_size:
+                self._templates.popitem(last=False)
+        return prepared
+
+    def submit(self, broker, prepared: PreparedOrder) -> Dict[str, Any]:
+        """Send a prepared order and record how long the broker took to acknowledge it"""
+        if prepared.broker_type != broker.name:
+            raise ValueError(f"Order was prepared for {prepared.broker_type}, not {broker.name}")
+        started = time.perf_counter()
+        try:
+            return broker.submit_order(prepared.payload)
+        finally:
+            self._record(broker.name, time.perf_counter() - started)
+
+    def submit_many(self, broker, prepared: List[PreparedOrder], max_workers: int = 4) -> List[Dict[str, Any]]:
+        """Send several prepared orders through the broker's batch API, recording each ack"""
+        for order in prepared:
+            if order.broker_type != broker.name:
+                raise ValueError(f"Order was prepared for {order.broker_type}, not {broker.name}")
+        outcomes = broker.submit_orders([order.payload for order in prepared], max_workers=max_workers)
+        for outcome in outcomes:
+            self._record(broker.name, outcome['elapsed_ms'] / 1000)
+        return outcomes
+
+    def _record(self, broker_name: str, elapsed: float) -> None:
+        metrics.observe(ACK_METRIC, elapsed, broker=broker_name)
+        with self._lock:
+            window = self._latencies.get(broker_name)
+            if window is None:
+                window = self._latencies[broker_name] = deque(maxlen=self.latency_window)
+            window.append(elapsed)
+
+    def latency_stats(self) -> Dict[str, Any]:
+        """Recent submit-to-ack latency percentiles (ms) per broker"""
+        with self._lock:
+            windows = {name: sorted(window) for name, window in self._latencies.items()}
+            hits, misses = self.template_hits, self.template_misses
+
+        def percentile(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+        return {
+            'brokers': {
+                name: {
+                    'count': len(values),
+                    'p50_ms': percentile(values, 0.5),
+                    'p90_ms': percentile(values, 0.9),
+                    'p99_ms': percentile(values, 0.99),
+                    'max_ms': round(values[-1] * 1000, 2)
+                } for name, values in windows.items() if values
+            },
+            'templates': {'hits': hits, 'misses': misses, 'cached': len(self._templates)}
+        }
@@ -0,0 +1,185 @@
+"""
+Write-behind persistence
+---
+Batches row inserts and updates onto a background worker so request
+handlers don't pay for a SQLite commit on every call.
+
+Durability modes:
+    sync  - write and commit in the caller, as before
+    async - enqueue and return; the worker commits batches every
+            FLUSH_INTERVAL seconds or BATCH_SIZE rows, whichever comes first
+
+The queue is bounded by MAX_QUEUE. When it is full the caller writes
+synchronously instead of dropping data. Pending rows are flushed at
+interpreter shutdown.
+
+Writes always run in their own transaction on a dedicated connection,
+never in the caller's db.session, so a synchronous write can't commit
+(or roll back) whatever the request has pending.
+"""
+
+from typing import Dict, Any, List, Optional
+from sqlalchemy import bindparam
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODE_SYNC = 'sync'
+MODE_ASYNC = 'async'
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_QUEUE = 10000
+MAX_RETRIES = 3
+
+class WriteBehindQueue:
+    def __init__(self, db, app=None, mode: str = MODE_ASYNC, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_queue: int = DEFAULT_MAX_QUEUE):
+        if mode not in (MODE_SYNC, MODE_ASYNC):
+            raise ValueError(f"Unsupported persistence mode: {mode}")
+        self.db = db
+        self.app = None
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'overflow_sync': 0, 'failed': 0}
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Bind to a Flask app; the worker runs inside its app context"""
+        self.app = app
+        app.extensions.setdefault('write_behind', []).append(self)
+        atexit.register(self.shutdown)
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+
+    def insert(self, model, values: Dict[str, Any]) -> None:
+        """Queue a row insert for the given model"""
+        self._submit(('insert', model, values))
+
+    def update(self, model, values: Dict[str, Any]) -> None:
+        """Queue an update by primary key; ``values`` must include ``id``"""
+        if 'id' not in values:
+            raise ValueError("Queued updates require an id")
+        self._submit(('update', model, values))
+
+    def _submit(self, item) -> None:
+        if self.mode == MODE_SYNC:
+            self._write_now([item])
+            return
+
+        try:
+            self.queue.put_nowait(item)
+            self._count('enqueued')
+            self._ensure_worker()
+        except queue.Full:
+            # Bounded memory: apply backpressure by writing in the caller
+            self._count('overflow_sync')
+            logger.warning("Write-behind queue full, writing synchronously")
+            self._write_now([item])
+
+    def _write_now(self, items: List) -> None:
+        """Write and commit a batch in its own transaction, outside any request session"""
+        with self.app.app_context():
+            with self.db.engine.begin() as connection:
+                self._write_batch(connection, items)
+
+    @staticmethod
+    def _write_batch(connection, items: List) -> None:
+        """Group items by operation/table/columns and run each group as one executemany"""
+        groups: Dict[Any, List[Dict[str, Any]]] = {}
+        for op, model, values in items:
+            key = (op, model, tuple(sorted(values)))
+            groups.setdefault(key, []).append(values)
+
+        for (op, model, columns), rows in groups.items():
+            table = model.__table__
+            if op == 'insert':
+                connection.execute(table.insert(), rows)
+            else:
+                statement = table.update().where(table.c.id == bindparam('_pk')).values(
+                    {col: bindparam(col) for col in columns if col != 'id'}
+                )
+                connection.execute(
+                    statement,
+                    [{**{k: v for k, v in row.items() if k != 'id'}, '_pk': row['id']} for row in rows]
+                )
+
+    def _drain(self, limit: int) -> List:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _flush_items(self, items: List) -> None:
+        """Commit a batch in one transaction, retrying before giving up"""
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                self._write_now(items)
+                self._count('written', len(items))
+                self._count('batches')
+                return
+            except Exception as e:
+                logger.error(f"Write-behind batch failed (attempt {attempt}/{MAX_RETRIES}): {str(e)}")
+                time.sleep(min(0.1 * attempt, 1.0))
+        self._count('failed', len(items))
+        logger.error(f"Dropping {len(items)} queued rows after {MAX_RETRIES} failed attempts")
+
+    def _run(self) -> None:
+        """Worker loop: wait for the first item, then gather a batch"""
+        while not self._stop.is_set() or not self.queue.empty():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            items = [first]
+            while len(items) < self.batch_size and time.monotonic() < deadline:
+                items.extend(self._drain(self.batch_size - len(items)))
+                if len(items) < self.batch_size:
+                    time.sleep(0.01)
+            self._flush_items(items)
+            for _ in items:
+                self.queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written"""
+        if self.mode == MODE_SYNC or self._worker is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Flush pending writes and stop the worker"""
+        if self._worker is None:
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._worker.join(timeout)
+        self._worker = None
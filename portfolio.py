@@ -0,0 +1,231 @@
+"""
+Portfolio aggregation
+---
+One position table per user across every configured broker.
+
+OANDA returns raw v3 JSON (long/short legs, string numbers) and Alpaca
+returns flattened string fields; both are normalized into Position rows
+with float fields and the same meaning:
+
+    units           net signed units (negative = short)
+    avg_price       average entry price
+    current_price   latest mark
+    unrealized_pl   (current_price - avg_price) * units once marked from
+                    the feed, in the instrument's quote currency; the
+                    broker's own figure until then
+
+Brokers are fetched concurrently and the result is kept for TTL seconds,
+so refreshing the view doesn't go back to the brokers. In between, live
+ticks from MarketDataServer re-mark the positions in that instrument and
+bump the portfolio version, which the endpoint uses as its ETag. Orders
+and closes invalidate the user's portfolio so the next read refetches.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from concurrency import fan_out
+
+logger = logging.getLogger(__name__)
+
+POSITION_COLUMNS = ['broker', 'instrument', 'units', 'side', 'avg_price', 'current_price',
+                    'unrealized_pl', 'market_value', 'marked_at']
+
+def instrument_key(instrument: str) -> str:
+    return ''.join(ch for ch in str(instrument).upper() if ch.isalnum())
+
+def _float(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+class Position:
+    __slots__ = ('broker', 'instrument', 'key', 'units', 'avg_price', 'current_price',
+                 'unrealized_pl', 'marked_at')
+
+    def __init__(self, broker: str, instrument: str, units: float, avg_price: float,
+                 current_price: Optional[float], unrealized_pl: float):
+        self.broker = broker
+        self.instrument = instrument
+        self.key = instrument_key(instrument)
+        self.units = units
+        self.avg_price = avg_price
+        self.current_price = current_price
+        self.unrealized_pl = unrealized_pl
+        self.marked_at: Optional[int] = None
+
+    def mark(self, price: float, timestamp: Optional[int]) -> None:
+        self.current_price = price
+        self.unrealized_pl = (price - self.avg_price) * self.units
+        self.marked_at = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'broker': self.broker,
+            'instrument': self.instrument,
+            'units': self.units,
+            'side': 'long' if self.units > 0 else 'short',
+            'avg_price': self.avg_price,
+            'current_price': self.current_price,
+            'unrealized_pl': round(self.unrealized_pl, 2),
+            'market_value': round(self.current_price * self.units, 2) if self.current_price is not None else None,
+            'marked_at': self.marked_at
+        }
+
+def normalize_oanda_positions(payload: Dict[str, Any]) -> List[Position]:
+    positions = []
+    for raw in payload.get('positions', []):
+        long_leg, short_leg = raw.get('long', {}), raw.get('short', {})
+        long_units, short_units = _float(long_leg.get('units')), _float(short_leg.get('units'))
+        units = long_units + short_units
+        if not units:
+            continue
+        leg = long_leg if long_units else short_leg
+        avg_price = _float(leg.get('averagePrice'))
+        pl = _float(raw.get('unrealizedPL', leg.get('unrealizedPL')))
+        # The positions endpoint carries no price; back it out of the P/L
+        current = avg_price + pl / units if avg_price else None
+        positions.append(Position('oanda', raw['instrument'], units, avg_price, current, pl))
+    return positions
+
+def normalize_alpaca_positions(payload: Dict[str, Any]) -> List[Position]:
+    positions = []
+    for raw in payload.get('positions', []):
+        units = _float(raw.get('units'))
+        if not units:
+            continue
+        current = raw.get('current_price')
+        positions.append(Position('alpaca', raw['instrument'], units, _float(raw.get('avg_entry_price')),
+                                  _float(current) if current is not None else None,
+                                  _float(raw.get('unrealized_pl'))))
+    return positions
+
+NORMALIZERS = {
+    'oanda': normalize_oanda_positions,
+    'alpaca': normalize_alpaca_positions
+}
+
+def normalize_account(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Both brokers' get_account_details share OANDA's summary field names"""
+    account = payload.get('account', {})
+    return {
+        'currency': account.get('currency', 'USD'),
+        'balance': _float(account.get('balance')),
+        'equity': _float(account.get('NAV', account.get('balance'))),
+        'unrealized_pl': _float(account.get('unrealizedPL', account.get('pl'))),
+        'margin_available': _float(account.get('marginAvailable')),
+        'margin_used': _float(account.get('marginUsed'))
+    }
+
+class UserPortfolio:
+    __slots__ = ('positions', 'accounts', 'errors', 'fetched_at', 'fetched_ms', 'version')
+
+    def __init__(self):
+        self.positions: List[Position] = []
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.errors: Dict[str, str] = {}
+        self.fetched_at = 0.0
+        self.fetched_ms = 0
+        self.version = 0
+
+class PortfolioService:
+    def __init__(self, ttl: float = 30.0, max_workers: int = 4):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.portfolios: Dict[int, UserPortfolio] = {}
+        self._by_instrument: Dict[str, List[Tuple[int, Position]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, brokers: Dict[str, Any], refresh: bool = False) -> UserPortfolio:
+        """The user's portfolio, refetched from brokers only when stale or forced"""
+        portfolio = self.portfolios.get(user_id)
+        if portfolio is not None and not refresh and time.monotonic() - portfolio.fetched_at < self.ttl:
+            return portfolio
+        return self._fetch(user_id, brokers, portfolio)
+
+    def _fetch(self, user_id: int, brokers: Dict[str, Any], previous: Optional[UserPortfolio]) -> UserPortfolio:
+        # Positions and account summaries for every broker, all in parallel
+        calls = [(name, 'positions', broker.get_positions) for name, broker in brokers.items()] + \
+                [(name, 'account', broker.get_account_details) for name, broker in brokers.items()]
+        outcomes = fan_out(lambda call: call[2](), calls, max_workers=self.max_workers)
+
+        portfolio = UserPortfolio()
+        portfolio.version = previous.version + 1 if previous else 1
+        for (name, kind, _), outcome in zip(calls, outcomes):
+            result = outcome.get('result')
+            error = outcome.get('error') or (result.get('error') if isinstance(result, dict) else None)
+            if error:
+                portfolio.errors[name] = str(error)
+                continue
+            if kind == 'positions':
+                normalize = NORMALIZERS.get(name)
+                if normalize is None:
+                    portfolio.errors[name] = f"No position normalizer for {name}"
+                    continue
+                portfolio.positions.extend(normalize(result))
+            else:
+                portfolio.accounts[name] = normalize_account(result)
+        portfolio.positions.sort(key=lambda p: (p.broker, p.instrument))
+        portfolio.fetched_at = time.monotonic()
+        portfolio.fetched_ms = int(time.time() * 1000)
+
+        with self._lock:
+            self._unindex(user_id)
+            self.portfolios[user_id] = portfolio
+            for position in portfolio.positions:
+                self._by_instrument.setdefault(position.key, []).append((user_id, position))
+        if portfolio.errors:
+            logger.warning(f"Portfolio fetch for user {user_id} had errors: {portfolio.errors}")
+        return portfolio
+
+    def _unindex(self, user_id: int) -> None:
+        for key in list(self._by_instrument):
+            kept = [entry for entry in self._by_instrument[key] if entry[0] != user_id]
+            if kept:
+                self._by_instrument[key] = kept
+            else:
+                del self._by_instrument[key]
+
+    def invalidate(self, user_id: int) -> None:
+        """Force the next read to refetch, e.g. after an order or close"""
+        portfolio = self.portfolios.get(user_id)
+        if portfolio is not None:
+            portfolio.fetched_at = 0.0
+
+    def on_tick(self, pair: str, entry: Dict[str, Any]) -> None:
+        """MarketDataServer tick listener; re-marks only positions in that instrument"""
+        holders = self._by_instrument.get(instrument_key(pair))
+        if not holders:
+            return
+        if entry.get('type') == 'quote':
+            price = (float(entry['bid']) + float(entry['ask'])) / 2
+        elif 'close' in entry:
+            price = float(entry['close'])
+        else:
+            return
+        with self._lock:
+            for user_id, position in holders:
+                position.mark(price, entry.get('timestamp'))
+                self.portfolios[user_id].version += 1
+
+    def view(self, portfolio: UserPortfolio) -> Dict[str, Any]:
+        """Positions plus per-broker and per-currency totals"""
+        with self._lock:
+            positions = [position.to_dict() for position in portfolio.positions]
+        totals: Dict[str, Dict[str, float]] = {}
+        for account in portfolio.accounts.values():
+            bucket = totals.setdefault(account['currency'], {'balance': 0.0, 'equity': 0.0,
+                                                             'unrealized_pl': 0.0, 'margin_available': 0.0})
+            for field in bucket:
+                bucket[field] = round(bucket[field] + account[field], 2)
+        return {
+            'positions': positions,
+            'accounts': portfolio.accounts,
+            'totals': totals,
+            'errors': portfolio.errors,
+            'version': portfolio.version,
+            'fetched_at': portfolio.fetched_ms
+        }
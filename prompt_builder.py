@@ -0,0 +1,164 @@
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for English/JSON text; avoids a tokenizer round trip
+CHARS_PER_TOKEN = 4
+
+DEFAULT_MAX_PROMPT_TOKENS = 6000
+DEFAULT_RECENT_TURNS = 6
+DEFAULT_MAX_MESSAGE_TOKENS = 800
+DEFAULT_MAX_CANDLES = 30
+
+# Fields worth sending to the model for each tool; everything else is dropped
+TOOL_FIELDS = {
+    "get_account_details": [
+        "currency", "balance", "NAV", "unrealizedPL", "pl", "marginUsed",
+        "marginAvailable", "openPositionCount", "openTradeCount", "error"
+    ],
+}
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate for budget decisions"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def compact_json(data: Any) -> str:
+    """Serialize without indentation or spaces"""
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " ...[truncated]"
+
+def _compact_account(data: Dict[str, Any]) -> Dict[str, Any]:
+    account = data.get("account", data)
+    fields = TOOL_FIELDS["get_account_details"]
+    return {k: account[k] for k in fields if k in account}
+
+def _compact_candles(data: Dict[str, Any], max_candles: int) -> Dict[str, Any]:
+    candles = data.get("candles", [])[-max_candles:]
+    rows = []
+    for candle in candles:
+        mid = candle.get("mid", {})
+        rows.append([candle.get("time"), mid.get("o"), mid.get("h"), mid.get("l"), mid.get("c")])
+    return {
+        "instrument": data.get("instrument"),
+        "granularity": data.get("granularity"),
+        "columns": ["time", "o", "h", "l", "c"],
+        "candles": rows
+    }
+
+def compact_tool_result(tool_name: str, data: Any, max_candles: int = DEFAULT_MAX_CANDLES) -> Any:
+    """Reduce a tool result to the fields relevant for the intent"""
+    if not isinstance(data, dict) or "error" in data and len(data) == 1:
+        return data
+    if tool_name == "get_account_details":
+        return _compact_account(data)
+    if tool_name == "get_candlestick_data":
+        return _compact_candles(data, max_candles)
+    return data
+
+class PromptBuilder:
+    """Assemble chat prompts under a fixed token budget.
+
+    The system prompt and the new user message are always kept. The most
+    recent history turns are kept verbatim (each capped in size); older turns
+    are folded into a one-line-per-turn summary, and dropped entirely when
+    even the summary would not fit.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_MAX_PROMPT_TOKENS, recent_turns: int = DEFAULT_RECENT_TURNS,
+                 max_message_tokens: int = DEFAULT_MAX_MESSAGE_TOKENS, max_candles: int = DEFAULT_MAX_CANDLES):
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.max_message_tokens = max_message_tokens
+        self.max_candles = max_candles
+
+    @staticmethod
+    def count(messages: List[Dict[str, str]]) -> int:
+        """Estimated token count of a message list"""
+        return sum(estimate_tokens(msg.get("content")) for msg in messages)
+
+    def _summarize(self, turns: List[Dict[str, str]], budget: int) -> Optional[Dict[str, str]]:
+        """Fold older turns into a single summary message that fits the budget"""
+        if not turns or budget <= 0:
+            return None
+        per_turn = max(8, budget // len(turns) - 2)
+        lines = [
+            f"{msg.get('role', 'user')}: {truncate_text(msg.get('content') or '', per_turn)}"
+            for msg in turns
+        ]
+        header = "Earlier conversation (summarized):\n"
+        # Drop the oldest lines until the summary fits, tracking its length
+        # instead of re-joining and re-measuring it after every drop
+        length = len(header) + sum(len(line) for line in lines) + len(lines) - 1
+        start = 0
+        while start < len(lines) and (length + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN > budget:
+            length -= len(lines[start]) + (1 if start < len(lines) - 1 else 0)
+            start += 1
+        if start == len(lines):
+            return None
+        return {"role": "user", "content": header + "\n".join(lines[start:])}
+
+    def build(self, system_prompt: str, history: List[Dict[str, str]], user_message: str) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """Build the message list for a turn and return it with token statistics"""
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": truncate_text(user_message, self.max_message_tokens)}
+        remaining = self.max_tokens - self.count([system, user])
+
+        history = [msg for msg in (history or []) if isinstance(msg, dict) and msg.get("content")]
+        first_recent = max(0, len(history) - self.recent_turns)
+
+        # Keep recent turns newest-first until the budget runs out
+        kept = []
+        cut = len(history)
+        for index in range(len(history) - 1, first_recent - 1, -1):
+            msg = history[index]
+            compacted = {"role": msg.get("role", "user"),
+                         "content": truncate_text(msg["content"], self.max_message_tokens)}
+            cost = estimate_tokens(compacted["content"])
+            if cost > remaining:
+                break
+            kept.insert(0, compacted)
+            remaining -= cost
+            cut = index
+        older = history[:cut]
+
+        summary = self._summarize(older, remaining)
+        messages = [system] + ([summary] if summary else []) + kept + [user]
+
+        stats = {
+            "history_turns": len(history),
+            "kept_turns": len(kept),
+            "summarized_turns": len(older) if summary else 0,
+            "dropped_turns": 0 if summary else len(older),
+            "prompt_tokens": self.count(messages),
+        }
+        return messages, stats
+
+    def tool_data_message(self, results: List[Dict[str, Any]], used_tokens: int) -> Tuple[Dict[str, str], int]:
+        """Render tool results as compact JSON within what is left of the budget"""
+        tool_data = {}
+        for result in results:
+            label = result["tool"]
+            if result.get("params"):
+                label += "(" + ",".join(f"{k}={v}" for k, v in result["params"].items()) + ")"
+            if "error" in result:
+                tool_data[label] = {"error": result["error"]}
+            else:
+                tool_data[label] = compact_tool_result(result["tool"], result.get("result"), self.max_candles)
+
+        budget = max(self.max_message_tokens, self.max_tokens - used_tokens)
+        content = (
+            "The following tools returned this data (compact JSON):\n"
+            f"{truncate_text(compact_json(tool_data), budget)}\n"
+            "Please provide a natural language summary of this information."
+        )
+        return {"role": "assistant", "content": content}, estimate_tokens(content)
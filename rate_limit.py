@@ -0,0 +1,195 @@
+"""
+Upstream rate limiting
+---
+One token bucket per upstream API and credential, shared by every user
+and thread in the process. Callers that find the bucket empty queue in
+priority order instead of failing:
+
+    ORDER        order placement and position closes
+    ACCOUNT      account, position and trade reads
+    MARKET_DATA  candles and order books
+    BACKFILL     historical data refreshes
+
+    limiter = rate_limiter.for_credential('oanda', account_id)
+    limiter.acquire(ACCOUNT)          # blocks until a token is free
+
+Only the highest-priority waiter may take tokens, so a burst of chart
+traffic queues behind orders rather than ahead of them. A caller that has
+waited MAX_WAIT seconds gets RateLimitTimeout. Wait times are recorded in
+tradingpal_rate_limit_wait_seconds on /metrics.
+
+RateLimitedSession is a requests.Session that acquires before each
+request and, if the upstream answers 429 anyway, drains the bucket for
+Retry-After seconds and retries.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+import requests
+
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+ORDER, ACCOUNT, MARKET_DATA, BACKFILL = 0, 1, 2, 3
+PRIORITY_NAMES = {ORDER: 'order', ACCOUNT: 'account', MARKET_DATA: 'market_data', BACKFILL: 'backfill'}
+
+WAIT_METRIC = 'tradingpal_rate_limit_wait_seconds'
+metrics.describe(WAIT_METRIC, 'Time spent queued for an upstream API rate limit token')
+
+# (requests per second, burst) per upstream. Alpaca allows 200 requests a
+# minute and Polygon's free tier 5; the bursts keep any 60s window within that.
+DEFAULT_LIMITS = {
+    'oanda': (100.0, 20),
+    'alpaca': (3.0, 20),
+    'polygon': (5 / 60, 5)
+}
+DEFAULT_MAX_WAIT = 30.0
+MAX_429_RETRIES = 2
+
+class RateLimitTimeout(Exception):
+    """Waited longer than the limiter's max_wait for an upstream token"""
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waiters = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority: int = ACCOUNT, tokens: int = 1, max_wait: Optional[float] = None) -> float:
+        """Take tokens, queueing behind higher-priority callers; returns seconds waited"""
+        tokens = min(tokens, self.burst)
+        started = time.monotonic()
+        with self._condition:
+            self._refill()
+            if not self.waiters and self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self.waiters[0] == entry:
+                        if self.tokens >= tokens:
+                            heapq.heappop(self.waiters)
+                            self.tokens -= tokens
+                            return time.monotonic() - started
+                        timeout = (tokens - self.tokens) / self.rate
+                    else:
+                        timeout = None  # woken when the head is served or leaves
+                    if max_wait is not None:
+                        remaining = started + max_wait - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitTimeout(f"No rate limit token after {max_wait:g}s")
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    self._condition.wait(timeout)
+            finally:
+                if entry in self.waiters:
+                    self.waiters.remove(entry)
+                    heapq.heapify(self.waiters)
+                self._condition.notify_all()
+
+    def penalize(self, seconds: float) -> None:
+        """Hold every caller off for the given time, e.g. after a 429 with Retry-After"""
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class UpstreamLimiter:
+    """The bucket for one (upstream, credential), with wait metrics"""
+
+    def __init__(self, upstream: str, bucket: TokenBucket, max_wait: float):
+        self.upstream = upstream
+        self.bucket = bucket
+        self.max_wait = max_wait
+
+    def acquire(self, priority: int = ACCOUNT, tokens: int = 1) -> float:
+        waited = self.bucket.acquire(priority, tokens, self.max_wait)
+        metrics.observe(WAIT_METRIC, waited, upstream=self.upstream, priority=PRIORITY_NAMES.get(priority, priority))
+        if waited > 1.0:
+            logger.info(f"Waited {waited:.2f}s for {self.upstream} rate limit ({PRIORITY_NAMES.get(priority)})")
+        return waited
+
+    def penalize(self, seconds: float) -> None:
+        self.bucket.penalize(seconds)
+
+class RateLimiter:
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None, max_wait: float = DEFAULT_MAX_WAIT):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_wait = max_wait
+        self._limiters: Dict[Tuple[str, str], UpstreamLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, upstream: str, rate: float, burst: int) -> None:
+        """Set the limit for buckets created from now on"""
+        self.limits[upstream] = (rate, burst)
+
+    def for_credential(self, upstream: str, credential) -> UpstreamLimiter:
+        """Shared limiter for an upstream account; credentials are only kept hashed"""
+        digest = hashlib.blake2b(str(credential).encode(), digest_size=8).hexdigest()
+        key = (upstream, digest)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    rate, burst = self.limits.get(upstream, DEFAULT_LIMITS['oanda'])
+                    limiter = self._limiters[key] = UpstreamLimiter(upstream, TokenBucket(rate, burst), self.max_wait)
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            f"{upstream}:{digest}": {
+                'tokens': round(limiter.bucket.tokens, 2),
+                'queued': len(limiter.bucket.waiters)
+            } for (upstream, digest), limiter in self._limiters.items()
+        }
+
+rate_limiter = RateLimiter()
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that takes a token per request; classify(method, url) picks the priority.
+
+    timeout, if set, applies to requests that don't pass their own.
+    """
+
+    def __init__(self, limiter: UpstreamLimiter, classify: Callable[[str, str], int],
+                 timeout: Optional[float] = None):
+        super().__init__()
+        self.limiter = limiter
+        self.classify = classify
+        self.timeout = timeout
+
+    def request(self, method, url, *args, **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        priority = self.classify(method.upper(), url)
+        for attempt in range(MAX_429_RETRIES + 1):
+            self.limiter.acquire(priority)
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != 429 or attempt == MAX_429_RETRIES:
+                return response
+            try:
+                retry_after = float(response.headers.get('Retry-After', 1))
+            except ValueError:
+                retry_after = 1.0
+            logger.warning(f"{self.limiter.upstream} returned 429, backing off {retry_after:g}s")
+            self.limiter.penalize(retry_after)
+        return response
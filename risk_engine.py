@@ -0,0 +1,323 @@
+"""
+Pre-trade risk engine
+---
+Checks orders against a user's TradingPreferences before anything is sent
+to a broker:
+
+- excluded_symbols: reject
+- trading_hours_start/end and trading_days: reject outside the window
+- max_position_size: clip the order so the resulting position stays within
+  the limit, reject if the position is already at it. If the account
+  could not be loaded, only the order itself is clipped and the rule is
+  listed under "unchecked"
+- risk_percentage: with a stop-loss and a reference price, clip units so
+  the loss at the stop is at most that share of equity. Market orders
+  carry no price, so the reference comes from price_source(user_id,
+  instrument) (live feed, then the marked portfolio); if none is known
+  the order passes and the rule is listed under "unchecked" in the result
+- stop_loss_percentage: derive that stop when the order doesn't carry one
+
+Limits are compiled once per configuration snapshot version; equity and
+positions are kept in memory per (user, broker), loaded on first use,
+refreshed by a background poller every REFRESH_INTERVAL seconds and
+updated locally after each fill. Accounts with no checks for IDLE_TTL
+seconds stop being polled and are reloaded on their next order. A check is a handful of dict lookups and
+never touches the database or the network.
+"""
+
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from datetime import datetime
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+def normalize_symbol(symbol: str) -> str:
+    return ''.join(ch for ch in str(symbol).upper() if ch.isalnum())
+
+def _weekday_index(day) -> Optional[int]:
+    """Map 0-6 or a day name ('Mon', 'monday') to datetime.weekday()"""
+    if isinstance(day, int):
+        return day if 0 <= day <= 6 else None
+    prefix = str(day).strip().lower()[:3]
+    return next((i for i, name in enumerate(WEEKDAYS) if name.startswith(prefix)), None) if prefix else None
+
+def _json_list(value) -> List[Any]:
+    """JSON-column lists may arrive as a JSON string (TradingPreferences.set_trading_days stores one)"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return list(value) if isinstance(value, (list, tuple, set)) else []
+
+class RiskRejected(ValueError):
+    """The order breaks one of the user's risk limits"""
+
+    def __init__(self, reasons: List[str]):
+        super().__init__('; '.join(reasons))
+        self.reasons = reasons
+
+class RiskLimits:
+    """TradingPreferences compiled into constant-time checks"""
+
+    def __init__(self, prefs):
+        self.excluded = frozenset(normalize_symbol(s) for s in _json_list(getattr(prefs, 'excluded_symbols', None)))
+        self.max_position_size = getattr(prefs, 'max_position_size', None)
+        self.risk_percentage = getattr(prefs, 'risk_percentage', None)
+        self.stop_loss_percentage = getattr(prefs, 'stop_loss_percentage', None)
+        self.hours_start = getattr(prefs, 'trading_hours_start', None)
+        self.hours_end = getattr(prefs, 'trading_hours_end', None)
+
+        days = (_weekday_index(day) for day in _json_list(getattr(prefs, 'trading_days', None)))
+        self.trading_days = frozenset(day for day in days if day is not None)
+
+    def in_trading_window(self, now: datetime) -> bool:
+        if self.trading_days and now.weekday() not in self.trading_days:
+            return False
+        if self.hours_start is None or self.hours_end is None:
+            return True
+        current = now.time()
+        if self.hours_start <= self.hours_end:
+            return self.hours_start <= current <= self.hours_end
+        # Window wraps past midnight, e.g. 22:00-06:00
+        return current >= self.hours_start or current <= self.hours_end
+
+def _checked(payload) -> Dict[str, Any]:
+    """A broker read's payload, or ConnectionError for OANDA/Alpaca error bodies"""
+    if not isinstance(payload, dict):
+        raise ConnectionError(f"Unexpected broker response: {payload!r}")
+    error = payload.get('error') or payload.get('errorMessage')
+    if error:
+        raise ConnectionError(str(error))
+    return payload
+
+class AccountState:
+    """In-memory equity and net positions for one user's broker account"""
+
+    __slots__ = ('equity', 'positions', 'refreshed_at', 'used_at', 'broker')
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.equity: Optional[float] = None
+        self.positions: Dict[str, float] = {}
+        self.refreshed_at = 0.0
+        self.used_at = time.monotonic()
+
+    def refresh(self) -> None:
+        """Reload equity and positions from the broker.
+
+        Raises ConnectionError, keeping the last known state, if either call
+        returns an error body instead of data.
+        """
+        details = _checked(self.broker.get_account_details())
+        payload = _checked(self.broker.get_positions())
+
+        account = details.get('account', {})
+        nav = account.get('NAV') or account.get('balance')
+        if nav is not None:
+            self.equity = float(nav)
+
+        positions = {}
+        for position in payload.get('positions', []):
+            if 'units' in position:
+                units = float(position['units'])
+            else:
+                units = float(position.get('long', {}).get('units', 0)) + float(position.get('short', {}).get('units', 0))
+            if units:
+                positions[normalize_symbol(position['instrument'])] = units
+        self.positions = positions
+        self.refreshed_at = time.monotonic()
+
+class RiskEngine:
+    def __init__(self, refresh_interval: float = 15.0, enabled: bool = True,
+                 price_source: Optional[Callable[[int, str], Optional[float]]] = None,
+                 idle_ttl: float = 900.0):
+        self.refresh_interval = refresh_interval
+        self.idle_ttl = idle_ttl
+        self.enabled = enabled
+        self.price_source = price_source
+        self._limits: Dict[Tuple[int, int], RiskLimits] = {}
+        self._accounts: Dict[Tuple[int, str], AccountState] = {}
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def limits_for(self, snapshot) -> Optional[RiskLimits]:
+        """Compiled limits for a user snapshot, cached by its version"""
+        if snapshot is None or snapshot.trading_preferences is None:
+            return None
+        key = (snapshot.user_id, snapshot.version)
+        limits = self._limits.get(key)
+        if limits is None:
+            limits = RiskLimits(snapshot.trading_preferences)
+            with self._lock:
+                # Drop limits compiled from older versions of this user's settings
+                for stale in [k for k in self._limits if k[0] == snapshot.user_id]:
+                    del self._limits[stale]
+                self._limits[key] = limits
+        return limits
+
+    def account(self, user_id: int, broker) -> AccountState:
+        """Tracked account state, loaded synchronously until a load has succeeded"""
+        key = (user_id, broker.name)
+        state = self._accounts.get(key)
+        if state is None or state.broker is not broker or not state.refreshed_at:
+            state = AccountState(broker)
+            try:
+                state.refresh()
+            except Exception as e:
+                logger.warning(f"Could not load account state for risk checks: {str(e)}")
+            with self._lock:
+                self._accounts[key] = state
+            self._ensure_poller()
+        state.used_at = time.monotonic()
+        return state
+
+    def check(self, snapshot, broker, order_request: Dict[str, Any],
+              now: Optional[datetime] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Check a normalized order request before it is prepared.
+
+        Returns (order_request, None) when the order passes unchanged, or a copy
+        with clipped units and a description of the adjustments. A rule that
+        couldn't be evaluated is listed under "unchecked" even when the order
+        is otherwise unchanged. Raises RiskRejected when the order can't be
+        placed at all.
+        """
+        limits = self.limits_for(snapshot) if self.enabled else None
+        if limits is None:
+            return order_request, None
+
+        order = order_request.get('order', {})
+        instrument = normalize_symbol(order.get('instrument', ''))
+        try:
+            units = float(order.get('units'))
+        except (TypeError, ValueError):
+            units = 0.0
+        if not units or not instrument:
+            return order_request, None  # malformed; prepare() reports it
+        reasons, adjustments = [], []
+
+        if instrument in limits.excluded:
+            reasons.append(f"{order.get('instrument')} is in your excluded symbols")
+        if not limits.in_trading_window(now or datetime.now()):
+            reasons.append("Outside your configured trading hours")
+        if reasons:
+            raise RiskRejected(reasons)
+
+        state = self.account(snapshot.user_id, broker)
+        allowed = abs(units)
+        unchecked = []
+
+        if limits.max_position_size and not state.refreshed_at:
+            # Positions never loaded: the order alone can be bounded, the resulting position can't
+            unchecked.append("max_position_size: current position unknown, broker account could not be loaded")
+            if allowed > limits.max_position_size:
+                allowed = limits.max_position_size
+                adjustments.append(f"clipped to max position size {limits.max_position_size:g}")
+        elif limits.max_position_size:
+            current = state.positions.get(instrument, 0.0)
+            # Room left in the order's direction; reducing orders are never clipped by this rule
+            if units * current >= 0:
+                room = max(limits.max_position_size - abs(current), 0.0)
+            else:
+                room = abs(current) + limits.max_position_size
+            if room <= 0:
+                raise RiskRejected([f"Position in {order.get('instrument')} is already at the maximum of {limits.max_position_size:g}"])
+            if allowed > room:
+                allowed = room
+                adjustments.append(f"clipped to max position size {limits.max_position_size:g}")
+
+        price = order_request.get('price') or order.get('price')
+        if price is None and limits.risk_percentage and self.price_source is not None:
+            try:
+                price = self.price_source(snapshot.user_id, order.get('instrument', ''))
+            except Exception as e:
+                logger.warning(f"Reference price lookup failed for {order.get('instrument')}: {str(e)}")
+        stop = order_request.get('stop_loss')
+        if price is not None and stop is None and limits.stop_loss_percentage:
+            price = float(price)
+            stop = price * (1 - limits.stop_loss_percentage / 100) if units > 0 else \
+                price * (1 + limits.stop_loss_percentage / 100)
+        if limits.risk_percentage and state.equity and price is not None and stop is not None:
+            per_unit_risk = abs(float(price) - float(stop))
+            if per_unit_risk > 0:
+                max_units = state.equity * limits.risk_percentage / 100 / per_unit_risk
+                if allowed > max_units:
+                    allowed = max_units
+                    adjustments.append(f"clipped to {limits.risk_percentage:g}% risk of equity")
+        elif limits.risk_percentage:
+            missing = 'reference price' if price is None else 'stop loss' if stop is None else 'account equity'
+            unchecked.append(f"risk_percentage: no {missing} to size against")
+
+        allowed = float(int(allowed))  # brokers take whole units
+        if allowed <= 0:
+            raise RiskRejected(["Order size rounds to zero after applying risk limits"])
+        if allowed == abs(units):
+            if unchecked:
+                return order_request, {'requested_units': units, 'units': units, 'adjustments': [],
+                                       'unchecked': unchecked}
+            return order_request, None
+
+        checked = {**order_request, 'order': {**order, 'units': allowed if units > 0 else -allowed}}
+        risk = {'requested_units': units, 'units': checked['order']['units'], 'adjustments': adjustments}
+        if unchecked:
+            risk['unchecked'] = unchecked
+        return checked, risk
+
+    def apply_fill(self, user_id: int, broker_name: str, instrument: str, units: float) -> None:
+        """Reflect an accepted order in the tracked position until the next poll"""
+        state = self._accounts.get((user_id, broker_name))
+        if state is None:
+            return
+        symbol = normalize_symbol(instrument)
+        with self._lock:
+            updated = state.positions.get(symbol, 0.0) + units
+            if updated:
+                state.positions[symbol] = updated
+            else:
+                state.positions.pop(symbol, None)
+
+    def apply_close(self, user_id: int, broker_name: str, instrument: str) -> None:
+        state = self._accounts.get((user_id, broker_name))
+        if state is not None:
+            with self._lock:
+                state.positions.pop(normalize_symbol(instrument), None)
+
+    def _ensure_poller(self) -> None:
+        with self._lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll, name='risk-poller', daemon=True)
+                self._poller.start()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.evict_idle()
+            with self._lock:
+                states = list(self._accounts.values())
+            for state in states:
+                try:
+                    state.refresh()
+                except Exception as e:
+                    logger.warning(f"Risk state refresh failed for {state.broker.name}: {str(e)}")
+
+    def evict_idle(self) -> int:
+        """Stop tracking accounts with no order checked in idle_ttl seconds; they reload on next use"""
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            idle = [key for key, state in self._accounts.items() if state.used_at < cutoff]
+            for key in idle:
+                del self._accounts[key]
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'tracked_accounts': len(self._accounts),
+            'compiled_limits': len(self._limits),
+            'oldest_refresh_age_s': round(max((now - s.refreshed_at for s in self._accounts.values()), default=0.0), 1)
+        }
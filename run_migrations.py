@@ -1,22 +1,19 @@
 from flask import Flask
 from flask_migrate import Migrate
 from models import db, User, BrokerConfig
+from database import init_database, INSTANCE_PATH
 import os
-from flask_sqlalchemy import SQLAlchemy
 
 # Ensure instance directory exists
-INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
 if not os.path.exists(INSTANCE_PATH):
     os.makedirs(INSTANCE_PATH)
 
 # Initialize Flask app with explicit instance path
 app = Flask(__name__, instance_path=INSTANCE_PATH)
 app.config['SECRET_KEY'] = 'dev'
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(INSTANCE_PATH, "tradingpal.db")}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize extensions
-db.init_app(app)
+init_database(app, db)
 migrate = Migrate(app, db)
 
 def run_migrations():
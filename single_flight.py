@@ -0,0 +1,92 @@
+"""
+Request coalescing
+---
+Lets concurrent identical requests share one computation:
+
+    body = coalescer.do(('candles', instrument, granularity, count), build)
+
+The first caller for a key runs build(); callers arriving while it runs
+wait for it and get the same result object. The result is then kept for
+WINDOW seconds, so a burst of polls that just misses the leader still
+reuses it. Exceptions are handed to the waiters but never kept.
+
+Results are shared, not copied: return immutable values (serialized
+bytes, tuples) or values nobody mutates.
+"""
+
+from typing import Any, Callable, Dict, Hashable, Optional
+import threading
+import time
+
+DEFAULT_WINDOW = 1.0
+DEFAULT_MAX_ENTRIES = 512
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'finished_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+
+class SingleFlight:
+    def __init__(self, window: float = DEFAULT_WINDOW, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self.calls: Dict[Hashable, _Call] = {}
+        self.stats = {'computed': 0, 'coalesced': 0, 'reused': 0}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """compute()'s result, shared with every concurrent or recent caller for key"""
+        with self._lock:
+            call = self.calls.get(key)
+            if call is not None and call.finished_at is not None \
+                    and time.monotonic() - call.finished_at >= self.window:
+                call = None
+            if call is None:
+                call = self.calls[key] = _Call()
+                leader = True
+                self.stats['computed'] += 1
+            else:
+                leader = False
+                self.stats['reused' if call.finished_at is not None else 'coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            call.done.set()
+        self._expire(key, call)
+        return call.result
+
+    def _expire(self, key: Hashable, call: _Call) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.window <= 0:
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+                return
+            if len(self.calls) <= self.max_entries:
+                return
+            for stale in [k for k, c in self.calls.items()
+                          if c.finished_at is not None and now - c.finished_at >= self.window]:
+                del self.calls[stale]
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.stats, 'window_s': self.window, 'entries': len(self.calls)}
+
+coalescer = SingleFlight()
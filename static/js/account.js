@@ -67,8 +67,13 @@ class AccountManager {
             this.updateBrokerToggles();
             console.log('Broker toggles updated');
             
-            await this.loadAccountDetails();
-            console.log('Account details reloaded for new broker');
+            // The portfolio already holds every broker; only reload if it hasn't loaded yet
+            if (this.portfolio) {
+                this.updateAccountDisplay();
+            } else {
+                await this.loadAccountDetails();
+            }
+            console.log('Account display updated for new broker');
             
         } catch (error) {
             console.error('Broker switch failed:', {
@@ -76,7 +81,7 @@ class AccountManager {
                 targetBroker: broker,
                 currentState: {
                     currentBroker: this.currentBroker,
-                    accountDetails: this.accountDetails
+                    portfolio: this.portfolio
                 }
             });
             this.showError(`Failed to switch to ${broker}: ${error.message}`);
@@ -105,43 +110,37 @@ class AccountManager {
     }
 
     async loadAccountDetails() {
-        console.group(`Loading Account Details for ${this.currentBroker}`);
+        console.group('Loading portfolio');
         console.time('accountDetailsLoad');
         
         try {
-            console.log('Fetching account details...');
+            console.log('Fetching portfolio...');
             this.showLoading();
             
-            const response = await axios.get(`/api/v1/account_details?broker=${this.currentBroker}`);
+            // One normalized view of every configured broker, served from the
+            // server's portfolio cache and marked to market from the live feed
+            const response = await axios.get('/api/v1/portfolio');
             console.log('Server response:', response.data);
             
-            if (response.data.error) {
-                if (response.data.need_configuration) {
-                    console.log('Broker needs configuration');
-                    if (window.userConfigManager) {
-                        window.userConfigManager.showModal();
-                    }
-                }
-                throw new Error(response.data.error);
-            }
-            
-            this.accountDetails = response.data.account;
-            console.log('Account details received:', this.accountDetails);
-            
+            this.portfolio = response.data;
             this.updateAccountDisplay();
             console.log('Account display updated successfully');
             
         } catch (error) {
-            console.error('Failed to load account details:', {
+            const data = error.response?.data || {};
+            if (data.need_configuration && window.userConfigManager) {
+                console.log('Broker needs configuration');
+                window.userConfigManager.showModal();
+            }
+            console.error('Failed to load portfolio:', {
                 error: error,
                 message: error.message,
-                broker: this.currentBroker,
                 timestamp: new Date().toISOString()
             });
-            this.showError(error.response?.data?.error || error.message);
+            this.showError(data.error || error.message);
             
             // Clear account details if load failed
-            this.accountDetails = null;
+            this.portfolio = null;
             this.updateAccountDisplay();
         } finally {
             this.hideLoading();
@@ -152,56 +151,33 @@ class AccountManager {
 
     updateAccountDisplay() {
         console.group('Updating Account Display');
-        console.log('Current account details:', this.accountDetails);
         
-        if (!this.accountDetails) {
-            console.warn('No account details available');
+        const account = this.portfolio?.accounts?.[this.currentBroker];
+        if (!account) {
+            const error = this.portfolio?.errors?.[this.currentBroker];
+            console.warn('No account details available', error || '');
             console.groupEnd();
             return;
         }
 
         try {
-            // Update broker badge
+            // Fields are normalized server-side (portfolio.normalize_account), so
+            // every broker renders the same way
             if (this.accountStatusElement) {
-                const status = this.currentBroker.toUpperCase();
-                console.log('Updating broker badge:', status);
-                this.accountStatusElement.textContent = status;
+                this.accountStatusElement.textContent = this.currentBroker.toUpperCase();
             }
-
-            // Update balance
             if (this.accountBalanceElement) {
-                let balance = '';
-                if (this.currentBroker === 'oanda') {
-                    balance = `${this.accountDetails.account?.balance || 0} ${this.accountDetails.account?.currency || 'USD'}`;
-                } else if (this.currentBroker === 'alpaca') {
-                    balance = `$${parseFloat(this.accountDetails.balance || 0).toFixed(2)}`;
-                }
-                console.log('Updating balance:', balance);
-                this.accountBalanceElement.textContent = balance;
+                this.accountBalanceElement.textContent = `${account.balance.toFixed(2)} ${account.currency}`;
             }
-
-            // Update P/L
             if (this.plElement) {
-                const pl = this.currentBroker === 'oanda' 
-                    ? this.accountDetails.account?.pl || '0.00'
-                    : this.accountDetails.pl || '0.00';
-                this.plElement.textContent = `$${parseFloat(pl).toFixed(2)}`;
+                this.plElement.textContent = `$${account.unrealized_pl.toFixed(2)}`;
             }
-
-            // Update positions count
             if (this.positionsElement) {
-                const positions = this.currentBroker === 'oanda'
-                    ? this.accountDetails.account?.openPositionCount || 0
-                    : this.accountDetails.openPositionCount || 0;
-                this.positionsElement.textContent = positions;
+                this.positionsElement.textContent = this.portfolio.positions
+                    .filter(position => position.broker === this.currentBroker).length;
             }
-
-            // Update margin
             if (this.marginElement) {
-                const margin = this.currentBroker === 'oanda'
-                    ? this.accountDetails.account?.marginAvailable || 0
-                    : this.accountDetails.marginAvailable || 0;
-                this.marginElement.textContent = `$${parseFloat(margin).toFixed(2)}`;
+                this.marginElement.textContent = `$${account.margin_available.toFixed(2)}`;
             }
         } catch (error) {
             console.error('Error updating account display:', error);
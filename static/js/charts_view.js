@@ -9,6 +9,8 @@ class ChartManager {
         this.loadingEl = null;
         this.errorEl = null;
         this.pairInfoEl = null;
+        this.lastEtag = null;
+        this.lastEtagPair = null;
         
         // Wait for DOM to be ready
         if (document.readyState === 'loading') {
@@ -362,7 +364,19 @@ class ChartManager {
             this.showLoading();
             this.hideError();
             
-            const response = await fetch(`/api/chart_data/${this.activePair}`);
+            // Revalidate with the last ETag; a 304 means the chart is already current
+            const headers = {};
+            if (this.lastEtag && this.lastEtagPair === this.activePair) {
+                headers['If-None-Match'] = this.lastEtag;
+            }
+            const response = await fetch(`/api/chart_data/${this.activePair}`, {
+                headers,
+                cache: 'no-store'
+            });
+            if (response.status === 304) {
+                this.hideLoading();
+                return;
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -385,6 +399,8 @@ class ChartManager {
             }
             
             await this.updateChartWithData(result.data);
+            this.lastEtag = response.headers.get('ETag');
+            this.lastEtagPair = this.activePair;
             this.hideLoading();
             
             // Update pair info with data type
@@ -316,19 +316,41 @@ class ChatManager {
         });
     }
 
-    async loadConversationHistory() {
+    async loadConversationHistory(cursor = null) {
         try {
-            const response = await axios.get('/api/v1/conversation_history');
+            const params = cursor ? { cursor } : {};
+            const response = await axios.get('/api/v1/conversation_history', { params });
             const conversations = response.data.conversations || [];
             conversations.forEach(conv => {
                 // Create history buttons for each conversation
                 this.createHistoryButton(conv);
             });
+            this.updateLoadMoreButton(response.data.next_cursor);
         } catch (error) {
             console.error('[ChatManager] Failed to load conversation history:', error);
         }
     }
 
+    updateLoadMoreButton(nextCursor) {
+        // The history endpoint is paginated; keep one "load more" button after the last page loaded
+        if (this.loadMoreButton) {
+            this.loadMoreButton.remove();
+            this.loadMoreButton = null;
+        }
+        if (!nextCursor) return;
+
+        const button = document.createElement('button');
+        button.className = 'w-full p-2 mb-2 rounded-xl text-sm text-dark-300 ' +
+                          'bg-dark-800/20 hover:bg-dark-800/40 transition-all duration-300';
+        button.textContent = 'Load older conversations';
+        button.addEventListener('click', () => {
+            button.disabled = true;
+            this.loadConversationHistory(nextCursor);
+        });
+        this.loadMoreButton = button;
+        this.elements.conversationHistory.appendChild(button);
+    }
+
     createHistoryButton(conversation) {
         const button = document.createElement('button');
         button.className = 'w-full flex justify-between items-center p-3 mb-2 rounded-xl ' +
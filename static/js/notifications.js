@@ -0,0 +1,97 @@
+class NotificationManager {
+    constructor() {
+        this.badge = document.getElementById('notification-badge');
+        this.bell = document.getElementById('notification-bell');
+        this.source = null;
+        this.pollTimer = null;
+
+        if (this.bell) {
+            this.bell.addEventListener('click', () => this.markAllRead());
+        }
+        this.connect();
+    }
+
+    connect() {
+        if (!window.EventSource) {
+            this.startPolling();
+            return;
+        }
+        // EventSource reconnects on its own, using the server's retry hint
+        this.source = new EventSource('/api/v1/notifications/stream');
+        this.source.addEventListener('read', (e) => this.updateBadge(JSON.parse(e.data).unread));
+        ['trade', 'alert', 'system'].forEach(type => {
+            this.source.addEventListener(type, (e) => this.handleNotification(JSON.parse(e.data)));
+        });
+        this.source.onerror = () => {
+            if (this.source.readyState === EventSource.CLOSED) {
+                // The server refused the stream (e.g. too many open); poll instead
+                this.source = null;
+                this.startPolling();
+            } else {
+                console.warn('Notification stream interrupted, reconnecting');
+            }
+        };
+    }
+
+    startPolling(interval = 30000) {
+        if (this.pollTimer) return;
+        console.warn('Notification stream unavailable, polling for unread count');
+        this.refreshCount();
+        this.pollTimer = setInterval(() => this.refreshCount(), interval);
+    }
+
+    handleNotification(event) {
+        if (event.unread !== null && event.unread !== undefined) {
+            this.updateBadge(event.unread);
+        } else {
+            this.refreshCount();
+        }
+        this.showToast(event.message, event.type);
+    }
+
+    async refreshCount() {
+        try {
+            const response = await fetch('/api/v1/notifications/unread_count');
+            if (response.ok) {
+                this.updateBadge((await response.json()).unread);
+            }
+        } catch (error) {
+            console.error('Failed to refresh unread count:', error);
+        }
+    }
+
+    async markAllRead() {
+        try {
+            const response = await fetch('/api/v1/notifications/read', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: '{}'
+            });
+            if (response.ok) {
+                this.updateBadge((await response.json()).unread);
+            }
+        } catch (error) {
+            console.error('Failed to mark notifications read:', error);
+        }
+    }
+
+    updateBadge(count) {
+        if (!this.badge) return;
+        this.badge.textContent = count > 99 ? '99+' : String(count);
+        this.badge.classList.toggle('hidden', !count);
+    }
+
+    showToast(message, type) {
+        const colors = { trade: 'bg-green-500', alert: 'bg-yellow-500', system: 'bg-primary-500' };
+        const notification = document.createElement('div');
+        notification.className = `fixed bottom-4 right-4 ${colors[type] || 'bg-primary-500'} text-white px-4 py-2 rounded-lg shadow-lg z-50`;
+        notification.textContent = message;
+        document.body.appendChild(notification);
+        setTimeout(() => notification.remove(), 5000);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    console.log('Initializing NotificationManager');
+    window.notificationManager = new NotificationManager();
+});
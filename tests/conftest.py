@@ -0,0 +1,44 @@
+"""Shared fixtures; also makes the flat top-level modules importable from the tests"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Anything that imports main must never open instance/tradingpal.db
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tradingpal-tests-'), 'main.db')}"
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A Flask app bound to the shared db on a scratch SQLite file, tables created"""
+    from flask import Flask
+    from database import init_database
+    from models import db
+
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    app = Flask(__name__)
+    init_database(app, db)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """Test client for main.app with login disabled, acting as user 1 on the scratch database"""
+    # main logs to ./main.log and reads ./config.ini; keep both out of the checkout
+    monkeypatch.chdir(tmp_path)
+    main = pytest.importorskip('main')
+    with main.app.app_context():
+        main.db.create_all()
+        if main.db.session.get(main.User, 1) is None:
+            main.db.session.add(main.User(id=1, username='trader', email='trader@example.com', password_hash='x'))
+            main.db.session.commit()
+    monkeypatch.setitem(main.app.config, 'LOGIN_DISABLED', True)
+    monkeypatch.setattr(main, 'current_user', SimpleNamespace(id=1, is_authenticated=False))
+    return main.app.test_client()
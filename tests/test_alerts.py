@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+from alerts import AlertEngine, instrument_key
+
+class Recorder:
+    def __init__(self):
+        self.updates, self.sent = [], []
+
+    def update(self, model, values):
+        self.updates.append(values)
+
+    def notify(self, user_id, kind, message, data):
+        self.sent.append((user_id, data['alert_id'], data['price']))
+
+def alert(alert_id, condition, price, instrument='EUR_USD', user_id=1):
+    return SimpleNamespace(id=alert_id, user_id=user_id, instrument=instrument, condition=condition,
+                           price=price, message=None)
+
+def bar(high, low):
+    return {'type': 'per-minute', 'HH': high, 'LL': low, 'timestamp': 1}
+
+@pytest.fixture
+def engine():
+    recorder = Recorder()
+    engine = AlertEngine(recorder, recorder)
+    engine.load([alert(1, 'above', 1.10), alert(2, 'above', 1.12), alert(3, 'above', 1.15),
+                 alert(4, 'below', 1.05), alert(5, 'below', 1.02), alert(6, 'below', 1.08)])
+    return engine, recorder
+
+def fired(recorder):
+    return sorted(alert_id for _, alert_id, _ in recorder.sent)
+
+def test_tick_fires_exactly_the_crossed_thresholds(engine):
+    engine, recorder = engine
+    engine.on_tick('EUR-USD', bar(1.12, 1.07))  # touching a threshold counts
+    assert fired(recorder) == [1, 2, 6]
+    assert sorted(update['id'] for update in recorder.updates) == [1, 2, 6]
+    assert all(update['active'] is False for update in recorder.updates)
+
+    engine.on_tick('EUR-USD', bar(1.12, 1.07))  # fired alerts are disarmed
+    assert len(recorder.sent) == 3
+    assert engine.summary()['armed'] == 3
+
+def test_quotes_use_the_mid_and_report_the_price(engine):
+    engine, recorder = engine
+    engine.on_tick('EUR/USD', {'type': 'quote', 'bid': 1.149, 'ask': 1.151, 'timestamp': 1})
+    assert recorder.sent == [(1, 1, 1.15), (1, 2, 1.15), (1, 3, 1.15)]
+
+def test_ticks_for_other_instruments_or_without_prices_are_ignored(engine):
+    engine, recorder = engine
+    engine.on_tick('GBP-USD', bar(9, 0))
+    engine.on_tick('EUR-USD', {'type': 'status'})
+    assert recorder.sent == []
+
+def test_readding_and_removing_keep_the_book_consistent(engine):
+    engine, recorder = engine
+    engine.add(alert(1, 'below', 1.01))  # edited: moves from the above side to the below side
+    assert engine.remove(3) and not engine.remove(3)
+    engine.on_tick('EUR-USD', bar(1.20, 1.09))
+    assert fired(recorder) == [2]
+    engine.on_tick('EUR-USD', bar(1.09, 1.00))
+    assert fired(recorder) == [1, 2, 4, 5, 6]
+    assert engine.books == {}
+
+def test_validate():
+    assert AlertEngine.validate('EUR_USD', 'above', '1.1') == 1.1
+    for args in [('', 'above', 1), ('EUR_USD', 'near', 1), ('EUR_USD', 'above', 'x'), ('EUR_USD', 'below', 0)]:
+        with pytest.raises(ValueError):
+            AlertEngine.validate(*args)
+    assert instrument_key('eur/usd') == instrument_key('EUR_USD') == 'EURUSD'
+
+def test_alerts_are_only_accepted_for_streamed_instruments(client, monkeypatch):
+    import main
+    from user_snapshot import invalidate_user_snapshot
+    with main.app.app_context():
+        if main.TradingPreferences.query.filter_by(user_id=1).first() is None:
+            main.db.session.add(main.TradingPreferences(user_id=1, enable_price_alerts=True))
+            main.db.session.commit()
+    invalidate_user_snapshot(1)
+    monkeypatch.setattr(main, 'alert_engine', AlertEngine(Recorder(), Recorder()))
+    listeners = []
+    monkeypatch.setattr(main, 'market_data_server', SimpleNamespace(add_tick_listener=listeners.append))
+
+    response = client.post('/api/v1/alerts', json={'instrument': 'GBP_USD', 'condition': 'above', 'price': 1.3})
+    assert response.status_code == 400
+    assert 'EUR_USD' in response.get_json()['error']
+
+    response = client.post('/api/v1/alerts', json={'instrument': 'EUR/USD', 'condition': 'above', 'price': 1.3})
+    assert response.status_code == 201
+    assert main.alert_engine.summary()['armed'] == 1
+    assert listeners == [main.alert_engine.on_tick]
@@ -0,0 +1,97 @@
+"""The vectorized engine must match a plain per-bar simulation of the same execution model"""
+
+import numpy as np
+import pytest
+
+from backtesting import run_backtest, signals_to_target
+
+def synthetic(bars=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 5e-4, bars)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, 2e-4, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 3e-4, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 3e-4, bars)))
+    entries = rng.random(bars) < 0.03
+    exits = rng.random(bars) < 0.03
+    return open_, high, low, close, entries, exits
+
+def reference(open_, high, low, close, entries, exits, direction='long', size=1.0, spread=0.0,
+              slippage=0.0, commission=0.0, stop_loss=None, take_profit=None, initial_capital=10000.0):
+    """Bar-by-bar loop: fill at the next open, stops checked on high/low, stop wins ties"""
+    sign = 1.0 if direction == 'long' else -1.0
+    target = 0
+    equity = initial_capital
+    curve, entry_bars = [], []
+    held, prev_close, in_trade, stopped_out, entry = 0.0, open_[0], False, False, None
+    for t in range(len(close)):
+        in_market = target == 1
+        if in_market and not in_trade:
+            entry, stopped_out = open_[t], False
+            entry_bars.append(t)
+        in_trade = in_market
+        position = sign * size if in_market and not stopped_out else 0.0
+        open_cost = (spread / 2 + slippage) / open_[t] + commission
+
+        gap = held * (open_[t] / prev_close - 1) - (abs(held) * open_cost if position == 0 else 0.0)
+        bar_cost = abs(position) * open_cost if held == 0 else 0.0
+        exit_price, stopped = close[t], False
+        if position:
+            stop = entry * (1 - sign * stop_loss) if stop_loss is not None else None
+            take = entry * (1 + sign * take_profit) if take_profit is not None else None
+            if stop is not None and (low[t] <= stop if sign > 0 else high[t] >= stop):
+                exit_price = min(open_[t], stop) if sign > 0 else max(open_[t], stop)
+                stopped = True
+            elif take is not None and (high[t] >= take if sign > 0 else low[t] <= take):
+                exit_price = max(open_[t], take) if sign > 0 else min(open_[t], take)
+                stopped = True
+        if stopped:
+            bar_cost += abs(position) * ((spread / 2 + slippage) / exit_price + commission)
+            stopped_out = True
+        bar = position * (exit_price / open_[t] - 1) - bar_cost
+
+        equity *= (1 + gap) * (1 + bar)
+        curve.append(equity)
+        held = 0.0 if stopped else position
+        prev_close = close[t]
+        # Signals on this bar's close decide the next bar
+        if entries[t] and not exits[t]:
+            target = 1
+        elif exits[t] and not entries[t]:
+            target = 0
+    return np.array(curve), entry_bars
+
+@pytest.mark.parametrize('settings', [
+    {},
+    {'direction': 'short'},
+    {'spread': 1e-4, 'slippage': 2e-5, 'commission': 1e-5},
+    {'stop_loss': 0.001},
+    {'take_profit': 0.002},
+    {'stop_loss': 0.001, 'take_profit': 0.001, 'spread': 1e-4, 'size': 0.5},
+    {'direction': 'short', 'stop_loss': 0.002, 'take_profit': 0.003, 'spread': 2e-4},
+])
+def test_matches_per_bar_reference(settings):
+    data = synthetic()
+    result = run_backtest(*data, **settings)
+    equity, entry_bars = reference(*data, **settings)
+
+    np.testing.assert_allclose(result.equity, equity, rtol=1e-10)
+    assert result.trades['entry_index'].tolist() == entry_bars
+    assert result.metrics['tradeCount'] == len(entry_bars)
+    assert result.metrics['finalEquity'] == pytest.approx(equity[-1], rel=1e-10)
+
+def test_signals_to_target_keeps_state_on_conflicting_bars():
+    entries = np.array([0, 1, 0, 1, 0, 0, 1], dtype=bool)
+    exits = np.array([1, 0, 0, 1, 1, 0, 1], dtype=bool)
+    assert signals_to_target(entries, exits).tolist() == [0, 1, 1, 1, 0, 0, 0]
+
+def test_no_signals_keeps_capital():
+    open_, high, low, close, entries, exits = synthetic(bars=50)
+    result = run_backtest(open_, high, low, close, np.zeros(50, bool), np.zeros(50, bool))
+    np.testing.assert_allclose(result.equity, 10000.0)
+
+def test_rejects_misaligned_inputs():
+    open_, high, low, close, entries, exits = synthetic(bars=50)
+    with pytest.raises(ValueError):
+        run_backtest(open_, high, low, close[:-1], entries, exits)
+    with pytest.raises(ValueError):
+        run_backtest(open_, high, low, close, entries, exits, direction='sideways')
@@ -0,0 +1,63 @@
+import json
+
+from chart_snapshot import ChartSnapshot, CHART_COLUMNS, chart_row
+
+def bar(timestamp, close=1.1, kind='per-minute'):
+    return {'type': kind, 'timestamp': timestamp, 'HH': close + 0.002, 'HL': close - 0.002,
+            'LH': close + 0.002, 'LL': close - 0.002, 'open': close - 0.001, 'close': close}
+
+def rendered(snapshot, columnar=False):
+    return json.loads(bytes(snapshot.render(columnar)[3].body))
+
+def test_chart_row_uses_open_and_close():
+    row = chart_row(bar(1, close=1.2))
+    assert row['close'] == 1.2 and row['open'] == 1.2 - 0.001
+    legacy = {'timestamp': 1, 'HH': 3.0, 'HL': 1.0, 'LH': 2.5, 'LL': 1.0}
+    assert chart_row(legacy)['close'] == 1.0 and chart_row(legacy)['open'] == 2.5
+
+def test_duplicate_bars_are_ignored_and_changed_bars_replaced():
+    snapshot = ChartSnapshot('EUR-USD', '1m', max_rows=10)
+    assert snapshot.add(bar(1000))
+    assert not snapshot.add(bar(1000))
+    assert snapshot.version == 1
+
+    assert snapshot.add(bar(1000, close=1.3))
+    assert snapshot.add(bar(1000, kind='per-second'))  # same time, other type: separate row
+    data = rendered(snapshot)['data']
+    assert len(data) == 2
+    assert data[0]['close'] == 1.3
+
+def test_rows_stay_sorted_and_oldest_are_evicted():
+    snapshot = ChartSnapshot('EUR-USD', '1m', max_rows=3)
+    for timestamp in (3000, 1000, 4000, 2000):
+        snapshot.add(bar(timestamp))
+    assert [key[0] for key in snapshot.keys] == [2000, 3000, 4000]
+    assert set(snapshot.rows) == set(snapshot.keys)
+
+    # Full, and older than everything kept: dropped without a new version
+    version = snapshot.version
+    assert not snapshot.add(bar(500))
+    assert snapshot.version == version
+    assert snapshot.last_timestamp == 4000
+
+def test_render_is_cached_per_version_and_format():
+    snapshot = ChartSnapshot('EUR-USD', 'live', max_rows=10)
+    snapshot.add(bar(1000))
+    snapshot.add(bar(2000, close=1.2))
+    first = snapshot.render()
+    assert snapshot.render()[3] is first[3]
+
+    version, last_timestamp, count, body = snapshot.render(columnar=True)
+    assert (version, last_timestamp, count) == (2, 2000, 2)
+    columns = json.loads(bytes(body.body))['data']
+    assert list(columns) == CHART_COLUMNS
+    assert columns['close'] == [1.1, 1.2]
+
+    snapshot.add(bar(3000))
+    assert snapshot.render()[3] is not first[3]
+    assert rendered(snapshot)['metadata']['count'] == 3
+
+def test_empty_snapshot_renders():
+    snapshot = ChartSnapshot('EUR-USD', '1s', max_rows=10)
+    assert rendered(snapshot)['data'] == []
+    assert rendered(snapshot, columnar=True)['data'] == {column: [] for column in CHART_COLUMNS}
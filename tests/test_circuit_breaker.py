@@ -0,0 +1,127 @@
+import pytest
+
+from circuit_breaker import CircuitBreaker, GuardedBroker, BrokerUnavailable, CLOSED, OPEN, MAX_COOLDOWN
+from rate_limit import RateLimitTimeout, TokenBucket, UpstreamLimiter
+
+def breaker(**settings):
+    return CircuitBreaker('test', min_calls=4, error_rate=0.5, slow_call=1.0, slow_rate=0.75,
+                          cooldown=0.0, **settings)
+
+def test_opens_on_error_rate_only_after_min_calls():
+    cb = breaker()
+    cb.record(False, 0.1, 'boom')
+    cb.record(False, 0.1, 'boom')
+    cb.record(True, 0.1)
+    assert cb.state == CLOSED
+    cb.record(True, 0.1)
+    assert cb.state == OPEN
+    with pytest.raises(BrokerUnavailable):
+        cb.allow()
+
+def test_opens_on_slow_calls():
+    cb = breaker()
+    for _ in range(3):
+        cb.record(True, 2.0)
+    cb.record(True, 0.1)
+    assert cb.state == OPEN
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    cb = breaker(probe=lambda: False)
+    cb.base_cooldown = cb.cooldown = 10.0
+    for _ in range(4):
+        cb.record(False, 0.1, 'boom')
+    assert not cb.due_for_probe()  # cooling down
+    cb.opened_at -= 10.0
+    assert cb.due_for_probe()
+    assert cb.run_probe() is False
+    assert cb.state == OPEN and cb.cooldown == 20.0
+
+    cb.cooldown = MAX_COOLDOWN
+    cb.run_probe()
+    assert cb.cooldown == MAX_COOLDOWN
+
+def test_healthy_probe_closes_and_resets():
+    cb = breaker(probe=lambda: True)
+    cb.cooldown = 40.0
+    for _ in range(4):
+        cb.record(False, 0.1, 'boom')
+    assert cb.run_probe() is True
+    assert cb.state == CLOSED
+    assert cb.cooldown == cb.base_cooldown
+    assert len(cb.calls) == 0
+    cb.allow()
+
+def test_probe_exception_counts_as_unhealthy():
+    def probe():
+        raise ConnectionError('refused')
+    cb = breaker(probe=probe)
+    for _ in range(4):
+        cb.record(False, 0.1, 'boom')
+    assert cb.run_probe() is False
+    assert cb.state == OPEN and cb.last_error == 'refused'
+
+class FakeBroker:
+    name = 'fake'
+
+    def get_positions(self):
+        return {'error': 'upstream 503'}
+
+    def get_account_details(self):
+        return {'account': {}}
+
+    def place_order(self, kind):
+        raise kind('failed')
+
+def test_guarded_broker_records_upstream_failures_only():
+    cb = breaker()
+    broker = GuardedBroker(FakeBroker(), cb)
+
+    for kind in (ValueError, KeyError, TypeError, RateLimitTimeout):
+        with pytest.raises(kind):
+            broker.place_order(kind)
+    assert len(cb.calls) == 0
+
+    broker.get_account_details()
+    broker.get_positions()
+    with pytest.raises(ConnectionError):
+        broker.place_order(ConnectionError)
+    assert [ok for _, ok, _ in cb.calls] == [True, False, False]
+    assert cb.last_error == 'failed'
+
+    broker.get_positions()
+    assert cb.state == OPEN
+    with pytest.raises(BrokerUnavailable):
+        broker.get_account_details()
+
+def exhausted_limiter(upstream):
+    limiter = UpstreamLimiter(upstream, TokenBucket(rate=0.001, burst=1), max_wait=0.01)
+    limiter.acquire()
+    return limiter
+
+@pytest.mark.parametrize('method, args', [
+    ('get_account_details', ()), ('get_positions', ()), ('get_trades', ()), ('submit_order', ({'order': {}},)),
+])
+def test_oanda_rate_limit_timeouts_are_not_broker_failures(method, args):
+    from oanda_broker import OandaBroker
+    broker = OandaBroker('token', 'account')
+    broker.session.limiter = exhausted_limiter('oanda')
+    cb = breaker()
+    with pytest.raises(RateLimitTimeout):
+        getattr(GuardedBroker(broker, cb), method)(*args)
+    assert len(cb.calls) == 0
+
+@pytest.mark.parametrize('method, args', [
+    ('get_account_details', ()), ('get_positions', ()), ('get_trades', ()), ('close_position', ('AAPL',)),
+    ('submit_order', (object(),)),
+])
+def test_alpaca_rate_limit_timeouts_are_not_broker_failures(method, args, monkeypatch):
+    pytest.importorskip('alpaca')
+    import alpaca_broker
+    monkeypatch.setattr(alpaca_broker.AlpacaBroker, 'initialize_clients', lambda self: None)
+    broker = alpaca_broker.AlpacaBroker('key', 'secret')
+    broker.trading_client = broker.rest_api = object()
+    broker.limiter = exhausted_limiter('alpaca')
+    cb = breaker()
+    with pytest.raises(RateLimitTimeout):
+        getattr(GuardedBroker(broker, cb), method)(*args)
+    assert len(cb.calls) == 0
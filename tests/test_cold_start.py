@@ -0,0 +1,7 @@
+import pytest
+
+def test_importing_main_defers_sdk_imports():
+    pytest.importorskip('main')
+    from benchmarks.cold_start import run_probe, LAZY_MODULES
+    probe = run_probe()  # fresh interpreter, so nothing imported by other tests leaks in
+    assert probe['eager'] == [], f"imported at startup: {probe['eager']} (should be lazy: {LAZY_MODULES})"
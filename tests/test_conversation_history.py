@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import conversation_history
+from models import db, Conversation, User
+
+@pytest.fixture
+def history(app, monkeypatch):
+    monkeypatch.setattr(conversation_history, '_fts_available', None)
+    user = User(username='trader', email='trader@example.com', password_hash='x')
+    other = User(username='other', email='other@example.com', password_hash='x')
+    db.session.add_all([user, other])
+    db.session.flush()
+    start = datetime(2026, 1, 1)
+    for i in range(7):
+        # Pairs of rows share a timestamp, so the id tie-break matters
+        db.session.add(Conversation(user_id=user.id, message=f"question {i} about EURUSD" if i % 2 else f"question {i}",
+                                    response=f"answer {i}", timestamp=start + timedelta(minutes=i // 2)))
+    db.session.add(Conversation(user_id=other.id, message='not yours', response='-', timestamp=start))
+    db.session.commit()
+    return user.id
+
+def test_keyset_pages_cover_every_row_once_newest_first(history):
+    seen, cursor = [], None
+    while True:
+        page = conversation_history.fetch_page(history, cursor=cursor, limit=3)
+        seen.extend(item['id'] for item in page['conversations'])
+        cursor = page['next_cursor']
+        assert page['has_more'] is (cursor is not None)
+        if cursor is None:
+            break
+    rows = Conversation.query.filter_by(user_id=history).order_by(
+        Conversation.timestamp.desc(), Conversation.id.desc()).all()
+    assert seen == [row.id for row in rows]
+
+def test_listing_projection_and_full_view(history):
+    item = conversation_history.fetch_page(history, limit=1)['conversations'][0]
+    assert set(item) == {'id', 'broker_context', 'timestamp', 'preview'}
+    item = conversation_history.fetch_page(history, limit=1, full=True)['conversations'][0]
+    assert item['message'] == 'question 6' and item['response'] == 'answer 6'
+
+def test_cursor_round_trip_and_rejects_garbage():
+    when = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    assert conversation_history.decode_cursor(conversation_history.encode_cursor(when, 42)) == (when, 42)
+    with pytest.raises(ValueError):
+        conversation_history.decode_cursor('not-a-cursor')
+
+def test_search_builds_the_index_on_first_use(history):
+    assert not db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE name='conversation_fts'")).first()
+    page = conversation_history.fetch_page(history, search='EURUSD')
+    assert conversation_history._fts_available is True
+    assert sorted(int(item['preview'].split()[1]) for item in page['conversations']) == [1, 3, 5]
+
+def test_search_falls_back_to_like_when_building_is_disabled(history, monkeypatch):
+    monkeypatch.setattr(conversation_history, 'build_index_on_demand', False)
+    page = conversation_history.fetch_page(history, search='"EURUSD')
+    assert page['count'] == 0
+    page = conversation_history.fetch_page(history, search='about')
+    assert page['count'] == 3 and conversation_history._fts_available is False
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('websocket')
+
+from data_server import MarketDataServer
+from indicators import create_indicator
+
+def bar(timestamp, close=1.1):
+    return {'type': 'per-minute', 'timestamp': timestamp, 'HH': close + 0.001, 'HL': close - 0.001,
+            'LH': close + 0.001, 'LL': close - 0.001, 'open': close, 'close': close}
+
+class Broken:
+    outputs = ('value',)
+
+    def prime(self, high, low, close):
+        return {'value': close}
+
+    def update(self, high, low, close):
+        raise IndexError('deque index out of range')
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return MarketDataServer('test-key', pairs=['EUR-USD'])
+
+def test_broken_indicator_is_detached_and_the_feed_keeps_going(server):
+    server.attach_indicator('EUR-USD', 'sma:2', create_indicator('sma', period=2))
+    server.attach_indicator('EUR-USD', 'broken', Broken())
+
+    for timestamp in (60000, 120000, 180000):
+        server._append('EUR-USD', bar(timestamp))
+
+    assert set(server.indicators['EUR-USD']) == {'sma:2'}
+    assert server.get_chart_snapshot('EUR-USD', '1m').render()[2] == 3
+    assert server.get_indicator_series('EUR-USD', 'sma:2')[-1][1] == pytest.approx({'value': 1.1})
+
+def test_attach_primes_from_buffered_bars(server):
+    for timestamp in (60000, 120000, 180000):
+        server._append('EUR-USD', bar(timestamp, close=timestamp / 60000))
+    server.attach_indicator('EUR-USD', 'sma:2', create_indicator('sma', period=2))
+    series = server.get_indicator_series('EUR-USD', 'sma:2')
+    assert [point[0] for point in series] == [60000, 120000, 180000]
+    assert series[0][1] is None and series[-1][1] == pytest.approx({'value': 2.5})
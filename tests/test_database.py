@@ -0,0 +1,19 @@
+import configparser
+
+from sqlalchemy import create_engine, event, text
+
+from database import SQLITE_PRAGMAS, _apply_sqlite_pragmas, get_engine_options
+
+def test_sqlite_timeout_setting_decides_the_busy_timeout(tmp_path):
+    config = configparser.ConfigParser()
+    config['DATABASE'] = {'SQLITE_TIMEOUT': '7'}
+    uri = f"sqlite:///{tmp_path / 'busy.db'}"
+    engine = create_engine(uri, **get_engine_options(uri, config))
+    event.listen(engine, 'connect', _apply_sqlite_pragmas)
+    with engine.connect() as connection:
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 7000
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    engine.dispose()
+
+def test_foreign_keys_are_left_at_the_sqlite_default():
+    assert 'foreign_keys' not in SQLITE_PRAGMAS
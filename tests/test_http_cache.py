@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+import http_cache
+from http_cache import EncodedBody, make_etag, check_not_modified, finalize, send_encoded, compressed
+
+LAST_MODIFIED_MS = 1_700_000_000_123
+PAYLOAD = {"candles": [[i, 1.1, 1.2, 1.0, 1.15] for i in range(200)]}
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)  # exercise the gzip path either way
+    app = Flask(__name__)
+    etag = make_etag('EUR_USD', 'M1', LAST_MODIFIED_MS)
+    encoded = EncodedBody(json.dumps(PAYLOAD).encode())
+
+    @app.route('/candles')
+    def candles():
+        not_modified = check_not_modified(etag, LAST_MODIFIED_MS)
+        if not_modified is not None:
+            return not_modified
+        return finalize(jsonify(PAYLOAD), etag, LAST_MODIFIED_MS)
+
+    @app.route('/snapshot')
+    def snapshot():
+        return send_encoded(encoded, etag, LAST_MODIFIED_MS)
+
+    @app.route('/small')
+    @compressed
+    def small():
+        return jsonify(ok=True)
+
+    app.etag = etag
+    return app.test_client()
+
+def test_etag_is_weak_and_depends_on_every_part():
+    assert make_etag('a', 1).startswith('W/"')
+    assert make_etag('a', 1) == make_etag('a', 1)
+    assert make_etag('a', 1) != make_etag('a', 2)
+
+def test_large_bodies_are_gzipped_with_validators(client):
+    response = client.get('/candles', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+    assert response.headers['ETag'] == client.application.etag
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.last_modified.timestamp() == LAST_MODIFIED_MS // 1000
+
+def test_identity_when_compression_is_not_accepted_or_not_worth_it(client):
+    assert 'Content-Encoding' not in client.get('/candles').headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_matching_etag_returns_304(client):
+    etag = client.application.etag
+    response = client.get('/candles', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert client.get('/candles', headers={'If-None-Match': 'W/"stale"'}).status_code == 200
+
+def test_if_modified_since_is_used_only_without_if_none_match(client):
+    current = 'Tue, 14 Nov 2023 22:13:20 GMT'
+    older = 'Tue, 14 Nov 2023 22:13:19 GMT'
+    assert client.get('/candles', headers={'If-Modified-Since': current}).status_code == 304
+    assert client.get('/candles', headers={'If-Modified-Since': older}).status_code == 200
+    assert client.get('/candles', headers={'If-Modified-Since': current,
+                                           'If-None-Match': 'W/"stale"'}).status_code == 200
+
+def test_encoded_body_compresses_each_encoding_once(client, monkeypatch):
+    calls = []
+    real_encode = http_cache.encode
+    monkeypatch.setattr(http_cache, 'encode', lambda body, encoding: calls.append(encoding) or real_encode(body, encoding))
+    for _ in range(3):
+        response = client.get('/snapshot', headers={'Accept-Encoding': 'gzip'})
+        assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+    assert calls == ['gzip']
+    assert json.loads(client.get('/snapshot').data) == PAYLOAD
@@ -0,0 +1,52 @@
+import marshal
+
+import pytest
+
+from indicator_sandbox import IndicatorCodeError, compile_code, validate
+
+VALID = """
+n = params.get('n', 3)
+
+def smooth(values, n):
+    return np.convolve(values, np.ones(n) / n, mode='same')
+
+fast = smooth(close, n)
+result = {'value': close - fast, 'ratio': [v / 2 for v in fast]}
+"""
+
+def test_valid_code_compiles_to_a_loadable_code_object():
+    code = marshal.loads(compile_code(VALID, '<test>'))
+    assert code.co_filename == '<test>'
+
+@pytest.mark.parametrize('source, message', [
+    ("import os\nresult = 1", "Import is not allowed"),
+    ("from os import path\nresult = 1", "ImportFrom is not allowed"),
+    ("while True:\n    pass\nresult = 1", "While is not allowed"),
+    ("class A:\n    pass\nresult = 1", "ClassDef is not allowed"),
+    ("with open('x') as f:\n    pass\nresult = 1", "With is not allowed"),
+    ("try:\n    pass\nexcept Exception:\n    pass\nresult = 1", "Try is not allowed"),
+    ("result = close.__class__", "Attribute '__class__' is not allowed"),
+    ("result = ().__class__.__mro__", "is not allowed"),
+    ("result = __builtins__", "Name '__builtins__' is not allowed"),
+    ("_hidden = 1\nresult = _hidden", "Name '_hidden' is not allowed"),
+    ("close.tofile('/tmp/x')\nresult = 1", "Attribute 'tofile' is not allowed"),
+    ("result = np.load('/etc/passwd')", "Attribute 'load' is not allowed"),
+    ("result = close.ctypes", "Attribute 'ctypes' is not allowed"),
+    ("def f(_x):\n    return _x\nresult = 1", "Name '_x' is not allowed"),
+    ("@np.vectorize\ndef f(x):\n    return x\nresult = 1", "Decorators are not allowed"),
+    ("result = lambda: (yield)", "Yield is not allowed"),
+    ("global x\nresult = 1", "Global is not allowed"),
+    ("value = close", "must assign 'result'"),
+    ("result = (", "Syntax error on line 1"),
+])
+def test_rejected(source, message):
+    with pytest.raises(IndicatorCodeError, match=message.replace('(', r'\(')):
+        validate(source)
+
+def test_reading_result_does_not_count_as_assigning_it():
+    with pytest.raises(IndicatorCodeError, match="must assign 'result'"):
+        validate("value = result")
+
+def test_code_errors_are_value_errors():
+    # Routes catch ValueError to answer 400
+    assert issubclass(IndicatorCodeError, ValueError)
@@ -0,0 +1,72 @@
+"""Streaming updates must agree with the vectorized computation"""
+
+import numpy as np
+import pytest
+
+from indicators import INDICATORS, create_indicator, from_model, parse_indicator_spec
+
+def ohlc(bars=300, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 5e-4, bars)))
+    high = close * (1 + np.abs(rng.normal(0, 2e-4, bars)))
+    low = close * (1 - np.abs(rng.normal(0, 2e-4, bars)))
+    return high, low, close
+
+@pytest.mark.parametrize('name', sorted(INDICATORS))
+@pytest.mark.parametrize('primed', [0, 5, 120])
+def test_streaming_matches_vectorized(name, primed):
+    high, low, close = ohlc()
+    expected = create_indicator(name).compute(high, low, close)
+
+    streaming = create_indicator(name)
+    history = streaming.prime(high[:primed], low[:primed], close[:primed])
+    for output in streaming.outputs:
+        np.testing.assert_allclose(history[output], expected[output][:primed], rtol=1e-9, equal_nan=True)
+
+    for i in range(primed, len(close)):
+        value = streaming.update(high[i], low[i], close[i])
+        if value is None:
+            assert all(np.isnan(expected[output][i]) for output in streaming.outputs)
+            continue
+        for output in streaming.outputs:
+            np.testing.assert_allclose(value[output], expected[output][i], rtol=1e-9, atol=1e-12, equal_nan=True)
+
+def test_parse_indicator_spec():
+    key, indicator = parse_indicator_spec('MACD:5:13')
+    assert key == 'macd:5:13:9'
+    assert indicator.params == {'fast': 5, 'slow': 13, 'signal': 9}
+    with pytest.raises(ValueError):
+        parse_indicator_spec('sma:1:2')
+    with pytest.raises(ValueError):
+        parse_indicator_spec('nope')
+
+def test_from_model_rejects_bad_parameters():
+    class Row:
+        name = 'RSI'
+        parameters = {'window': 14}
+    with pytest.raises(ValueError):
+        from_model(Row())
+
+    Row.name = 'my custom'
+    assert from_model(Row()) is None
+
+@pytest.mark.parametrize('spec', ['sma:0', 'ema:-1', 'rsi:0', 'atr:0', 'bollinger:0', 'bollinger:20:-1',
+                                  'macd:0:26:9', 'macd:12:0:9', 'macd:12:26:0'])
+def test_invalid_periods_are_rejected_up_front(spec):
+    with pytest.raises(ValueError):
+        parse_indicator_spec(spec)
+
+def test_from_model_rejects_zero_period():
+    class Row:
+        name = 'ATR'
+        parameters = {'period': 0}
+    with pytest.raises(ValueError):
+        from_model(Row())
+
+@pytest.mark.parametrize('parameters', [{'period': -1}, {'period': 'fast'}, {'period': None}])
+def test_from_model_turns_constructor_errors_into_value_errors(parameters):
+    class Row:
+        name = 'EMA'
+    Row.parameters = parameters
+    with pytest.raises(ValueError, match='Invalid parameters for indicator EMA'):
+        from_model(Row())
@@ -0,0 +1,46 @@
+import configparser
+
+import pytest
+
+from models import db
+import instrumentation
+
+def _config(token=''):
+    config = configparser.ConfigParser()
+    config['METRICS'] = {'ALLOW': '10.0.0.1', 'TOKEN': token}
+    return config
+
+@pytest.fixture
+def instrumented(app):
+    instrumentation.init_app(app, db, _config(token='s3cret'))
+
+    @app.route('/ping')
+    def ping():
+        with instrumentation.span('broker', broker='test', method='ping'):
+            pass
+        return 'pong'
+
+    return app.test_client()
+
+def test_server_timing_hidden_from_other_clients(instrumented):
+    response = instrumented.get('/ping', environ_base={'REMOTE_ADDR': '203.0.113.9'})
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+def test_server_timing_sent_to_allowlisted_address(instrumented):
+    response = instrumented.get('/ping', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert 'broker;dur=' in response.headers['Server-Timing']
+    assert 'total;dur=' in response.headers['Server-Timing']
+
+def test_server_timing_sent_with_metrics_token(instrumented):
+    response = instrumented.get('/ping', environ_base={'REMOTE_ADDR': '203.0.113.9'},
+                                headers={'Authorization': 'Bearer s3cret'})
+    assert 'Server-Timing' in response.headers
+
+def test_metrics_endpoint_is_operator_only(instrumented):
+    assert instrumented.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 404
+    assert instrumented.get('/metrics', headers={'Authorization': 'Bearer wrong'},
+                            environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 404
+    response = instrumented.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.status_code == 200
+    assert b'broker' in response.data
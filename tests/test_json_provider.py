@@ -0,0 +1,45 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import json_provider
+from json_provider import FastJSONProvider, to_columnar, wants_columnar
+
+@pytest.fixture
+def provider():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        yield app.json
+
+def test_naive_datetime_is_not_labelled_utc(provider):
+    local = datetime(2024, 3, 1, 9, 30)
+    assert json.loads(provider.dumps({"at": local})) == {"at": "2024-03-01T09:30:00"}
+
+def test_aware_datetime_keeps_its_offset(provider):
+    aware = datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+    assert json.loads(provider.dumps({"at": aware})) == {"at": "2024-03-01T09:30:00+00:00"}
+
+def test_numpy_and_decimal_values(provider):
+    data = {"closes": np.array([1.5, 2.5]), "last": np.float64(2.5), "pl": Decimal("1.10")}
+    assert json.loads(provider.dumps(data)) == {"closes": [1.5, 2.5], "last": 2.5, "pl": "1.10"}
+
+def test_response_round_trips(provider):
+    response = provider.response({"ok": True, 1: "non-str key"})
+    assert response.mimetype == 'application/json'
+    assert provider.loads(response.get_data()) == {"ok": True, "1": "non-str key"}
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson not installed")
+def test_orjson_matches_stdlib_for_datetimes(provider):
+    data = {"at": datetime(2024, 3, 1, 9, 30, 15, 250000)}
+    assert provider.dumps(data) == json.dumps(data, default=json_provider._default, separators=(',', ':'))
+
+def test_columnar_layout():
+    rows = [{"time": 1, "c": 1.1}, {"time": 2, "c": 1.2, "extra": True}, {"time": 3}]
+    assert to_columnar(rows, ["time", "c"]) == {"time": [1, 2, 3], "c": [1.1, 1.2, None]}
+    assert wants_columnar({"format": "Columnar"})
+    assert not wants_columnar({})
@@ -0,0 +1,73 @@
+import pytest
+
+from models import db, Notification
+from notifications import NotificationCenter
+from persistence import WriteBehindQueue
+
+@pytest.fixture
+def center(app):
+    writer = WriteBehindQueue(db, app, flush_interval=0.05)
+    yield NotificationCenter(writer, subscriber_queue_size=2, max_subscribers=2)
+    writer.shutdown()
+
+def test_unread_count_queries_once_then_tracks_notify(center):
+    center.notify(1, 'trade', 'Bought 1000 EUR_USD')
+    assert center.unread_count(1) == 1
+    center.notify(1, 'alert', 'EUR_USD above 1.1')
+    center.notify(2, 'system', 'other user')
+    assert center.unread_count(1) == 2
+    assert center.stats['count_queries'] == 1
+
+    center.writer.flush(5)
+    assert Notification.query.filter_by(user_id=1, read=False).count() == 2
+
+def test_mark_read_keeps_the_counter_in_step(center):
+    for i in range(3):
+        center.notify(1, 'trade', f'fill {i}')
+    assert center.unread_count(1) == 3
+    first = center.recent(1)[-1]['id']
+    assert center.mark_read(1, [first]) == 2
+    assert center.mark_read(1) == 0
+    assert center.unread_count(1) == 0
+    assert all(item['read'] for item in center.recent(1))
+
+def test_recent_is_keyset_paginated_newest_first(center):
+    for i in range(5):
+        center.notify(1, 'trade', f'fill {i}')
+    page = center.recent(1, limit=2)
+    assert [item['message'] for item in page] == ['fill 4', 'fill 3']
+    page = center.recent(1, limit=2, before_id=page[-1]['id'])
+    assert [item['message'] for item in page] == ['fill 2', 'fill 1']
+
+def test_counter_cache_is_bounded(app):
+    writer = WriteBehindQueue(db, app, mode='sync')
+    center = NotificationCenter(writer, counter_cache_size=2)
+    for user_id in (1, 2, 3):
+        center.unread_count(user_id)
+    assert center.summary()['cached_counters'] == 2
+    center.unread_count(1)
+    assert center.stats['count_queries'] == 4
+
+def test_notifications_are_pushed_to_subscribers(center):
+    stream = center.subscribe(1)
+    center.unread_count(1)
+    center.notify(1, 'alert', 'EUR_USD above 1.1', {'instrument': 'EUR_USD'})
+    event = stream.get_nowait()
+    assert event['message'] == 'EUR_USD above 1.1'
+    assert event['unread'] == 1 and event['instrument'] == 'EUR_USD'
+
+    center.mark_read(1)
+    assert stream.get_nowait() == {'type': 'read', 'unread': 0}
+
+    center.unsubscribe(1, stream)
+    center.notify(1, 'alert', 'nobody listening')
+    assert stream.empty()
+
+def test_stalled_subscriber_drops_pushes_and_streams_are_capped(center):
+    stream = center.subscribe(1)
+    assert center.subscribe(2) is not None
+    assert center.subscribe(3) is None
+    for i in range(4):
+        center.notify(1, 'trade', f'fill {i}')
+    assert stream.qsize() == 2
+    assert center.stats['dropped_pushes'] == 2
@@ -0,0 +1,75 @@
+import math
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from backtesting import run_backtest, PERIODS_PER_YEAR
+from optimizer import Optimizer, expand_grid, sma_crossover
+
+GRID = {'fast': [3, 5, 8], 'slow': [20, 30, 40]}
+
+def prices(bars=1500, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 5e-4, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    return {'open': open_, 'high': np.maximum(open_, close) * 1.0002,
+            'low': np.minimum(open_, close) * 0.9998, 'close': close}
+
+@pytest.fixture
+def optimizer():
+    with Optimizer(max_workers=2, rungs=2, eta=3, min_bars=200) as optimizer:
+        optimizer.add_dataset('EUR_USD', granularity='H1', **prices())
+        yield optimizer
+
+def serial_score(data, params, start, end, objective='sharpeRatio'):
+    history = [data[field][:end] for field in ('open', 'high', 'low', 'close')]
+    entries, exits = sma_crossover(*history, **params)
+    metrics = run_backtest(*(column[start:] for column in history), entries[start:], exits[start:],
+                           periods_per_year=PERIODS_PER_YEAR['H1']).metrics
+    value = metrics[objective]
+    return value if math.isfinite(value) else -math.inf
+
+def test_expand_grid():
+    combos = expand_grid(GRID)
+    assert len(combos) == 9
+    assert combos[0] == {'fast': 3, 'slow': 20} and combos[-1] == {'fast': 8, 'slow': 40}
+
+def test_sweep_ranks_survivors_by_full_window_score(optimizer):
+    ranking = optimizer.sweep('EUR_USD', 'sma_crossover', GRID)
+    assert sorted(map(str, (r['params'] for r in ranking))) == sorted(map(str, expand_grid(GRID)))
+
+    finalists = [r for r in ranking if 'pruned_at_rung' not in r]
+    assert len(finalists) == 3
+    assert ranking[:3] == finalists
+    assert all(r['pruned_at_rung'] == 0 for r in ranking[3:])
+
+    data = prices()
+    expected = sorted((serial_score(data, r['params'], 0, 1500) for r in finalists), reverse=True)
+    assert [r['score'] for r in finalists] == pytest.approx(expected)
+
+def test_walk_forward_scores_each_winner_on_the_next_window(optimizer):
+    result = optimizer.walk_forward('EUR_USD', 'sma_crossover', GRID, folds=3, train_ratio=0.7)
+    folds = result['folds']
+    assert [f['fold'] for f in folds] == [0, 1, 2]
+    for fold in folds:
+        assert fold['test'][0] == fold['train'][1]
+        assert fold['test_score'] == pytest.approx(serial_score(prices(), fold['params'], *fold['test']))
+    assert folds[-1]['test'][1] <= 1500
+    assert result['out_of_sample']['objective'] == 'sharpeRatio'
+
+def test_walk_forward_rejects_short_datasets(optimizer):
+    optimizer.add_dataset('tiny', **{field: values[:10] for field, values in prices().items()})
+    with pytest.raises(ValueError, match='too short'):
+        optimizer.walk_forward('tiny', 'sma_crossover', GRID, folds=4)
+
+def test_datasets_need_ohlc_and_are_released_on_close():
+    optimizer = Optimizer(max_workers=1)
+    with pytest.raises(ValueError):
+        optimizer.add_dataset('bad', close=np.ones(10))
+    optimizer.add_dataset('EUR_USD', **prices(100))
+    shm = optimizer._shared[0]
+    optimizer.close()
+    assert optimizer.datasets == {} and optimizer._shared == []
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shm.name)
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from concurrency import fan_out
+
+def test_fan_out_keeps_input_order_and_isolates_failures():
+    def work(item):
+        time.sleep(0.01 * (5 - item))  # later items finish first
+        if item == 2:
+            raise ValueError('rejected')
+        return item * 10
+
+    outcomes = fan_out(work, range(5), max_workers=5)
+    assert [outcome.get('result') for outcome in outcomes] == [0, 10, None, 30, 40]
+    assert outcomes[2]['error'] == 'rejected'
+    assert all('elapsed_ms' in outcome for outcome in outcomes)
+
+def test_fan_out_runs_inline_for_one_item_or_worker():
+    assert fan_out(lambda item: item, []) == []
+    assert fan_out(lambda item: item + 1, [1]) == [{'result': 2, 'elapsed_ms': pytest.approx(0, abs=50)}]
+    assert [o['result'] for o in fan_out(lambda item: item, 'abc', max_workers=1)] == ['a', 'b', 'c']
+
+class BatchBroker:
+    name = 'oanda'
+
+    def submit_orders(self, payloads, max_workers=4):
+        return fan_out(lambda payload: {'id': payload['id']}, payloads, max_workers)
+
+def test_submit_many_maps_outcomes_back_to_orders():
+    from order_pipeline import OrderPipeline, PreparedOrder
+    pipeline = OrderPipeline()
+    prepared = [PreparedOrder('oanda', {'id': i}, 'EUR_USD', 1) for i in range(3)]
+    outcomes = pipeline.submit_many(BatchBroker(), prepared)
+    assert [outcome['result']['id'] for outcome in outcomes] == [0, 1, 2]
+    assert pipeline.latency_stats()
+
+    with pytest.raises(ValueError):
+        pipeline.submit_many(BatchBroker(), [PreparedOrder('alpaca', {}, 'AAPL', 1)])
+
+@pytest.mark.parametrize('body', [['EUR_USD'], {'orders': 'EUR_USD'}, {'orders': {'instrument': 'EUR_USD'}},
+                                  {'close': 'EUR_USD'}])
+def test_batch_rejects_malformed_bodies(client, body):
+    response = client.post('/api/v1/orders/batch', json=body)
+    assert response.status_code == 400
+
+def test_batch_reports_malformed_items_individually(client):
+    response = client.post('/api/v1/orders/batch', json={'orders': ['EUR_USD', 3], 'close': [7, None]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [item['error'] for item in body['orders']] == ['Each order must be an object'] * 2
+    assert all('error' in item for item in body['close'])
+    assert body['failed'] == 4 and body['succeeded'] == 0
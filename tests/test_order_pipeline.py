@@ -0,0 +1,76 @@
+import pytest
+
+from order_pipeline import OrderPipeline
+
+class FakeBroker:
+    def __init__(self, name='oanda'):
+        self.name = name
+        self.built = []
+        self.submitted = []
+
+    def process_order_request(self, order_request):
+        self.built.append(order_request)
+        return {'order': dict(order_request['order'])}
+
+    def submit_order(self, payload):
+        self.submitted.append(payload)
+        return {'orderFillTransaction': {'id': str(len(self.submitted))}}
+
+def market(units=1000, instrument='EUR_USD'):
+    return {'instrument': instrument, 'units': units}
+
+def test_repeated_order_reuses_the_built_template():
+    pipeline, broker = OrderPipeline(), FakeBroker()
+    first = pipeline.prepare(broker, market())
+    second = pipeline.prepare(broker, {'order': {'instrument': 'EUR_USD', 'units': 1000, 'type': 'MARKET'}})
+    assert second is first
+    assert len(broker.built) == 1
+    assert (first.instrument, first.units) == ('EUR_USD', 1000.0)
+    assert pipeline.latency_stats()['templates'] == {'hits': 1, 'misses': 1, 'cached': 1}
+
+def test_templates_are_keyed_by_broker_and_order():
+    pipeline = OrderPipeline()
+    oanda, alpaca = FakeBroker('oanda'), FakeBroker('alpaca')
+    pipeline.prepare(oanda, market())
+    pipeline.prepare(alpaca, market())
+    pipeline.prepare(oanda, market(units=-1000))
+    pipeline.prepare(oanda, {**market(), 'stop_loss': 1.05})
+    assert len(oanda.built) == 3 and len(alpaca.built) == 1
+
+def test_normalize_moves_order_extras_out_of_the_order_body():
+    normalized = OrderPipeline.normalize({**market(), 'broker': 'oanda', 'take_profit': 1.2})
+    assert normalized == {'order': {'instrument': 'EUR_USD', 'units': 1000, 'type': 'MARKET'}, 'take_profit': 1.2}
+
+def test_template_cache_evicts_least_recently_used():
+    pipeline, broker = OrderPipeline(template_cache_size=2), FakeBroker()
+    pipeline.prepare(broker, market(1))
+    pipeline.prepare(broker, market(2))
+    pipeline.prepare(broker, market(1))
+    pipeline.prepare(broker, market(3))
+    pipeline.prepare(broker, market(1))
+    assert len(broker.built) == 3
+    pipeline.prepare(broker, market(2))
+    assert len(broker.built) == 4
+
+@pytest.mark.parametrize('order, message', [
+    (market(units='lots'), 'units must be a number'),
+    (market(units=0), 'units must be non-zero'),
+    ({'units': 10}, 'instrument is required'),
+])
+def test_invalid_orders_are_rejected_and_not_cached(order, message):
+    pipeline, broker = OrderPipeline(), FakeBroker()
+    for _ in range(2):
+        with pytest.raises(ValueError, match=message):
+            pipeline.prepare(broker, order)
+    assert broker.built == []
+    assert pipeline.latency_stats()['templates']['cached'] == 0
+
+def test_submit_records_ack_latency_and_checks_broker():
+    pipeline, broker = OrderPipeline(), FakeBroker()
+    prepared = pipeline.prepare(broker, market())
+    assert pipeline.submit(broker, prepared) == {'orderFillTransaction': {'id': '1'}}
+    assert broker.submitted == [prepared.payload]
+    assert pipeline.latency_stats()['brokers']['oanda']['count'] == 1
+
+    with pytest.raises(ValueError, match='prepared for oanda'):
+        pipeline.submit(FakeBroker('alpaca'), prepared)
@@ -0,0 +1,75 @@
+import pytest
+
+from models import db, Notification
+from persistence import WriteBehindQueue, MODE_SYNC
+
+def row(message, user_id=1):
+    return {'user_id': user_id, 'type': 'system', 'message': message, 'read': False}
+
+def stored_messages():
+    return [n.message for n in Notification.query.order_by(Notification.id)]
+
+@pytest.fixture
+def writer(app):
+    writer = WriteBehindQueue(db, app, batch_size=50, flush_interval=0.05)
+    yield writer
+    writer.shutdown()
+
+def test_queued_rows_are_written_in_batches(writer):
+    for i in range(120):
+        writer.insert(Notification, row(f'n{i}'))
+    assert writer.flush(5)
+    assert stored_messages() == [f'n{i}' for i in range(120)]
+    assert writer.stats['written'] == 120
+    assert 3 <= writer.stats['batches'] < 120
+
+def test_updates_apply_by_primary_key(writer):
+    writer.insert(Notification, row('first'))
+    writer.flush(5)
+    notification_id = Notification.query.one().id
+    writer.update(Notification, {'id': notification_id, 'read': True})
+    writer.flush(5)
+    db.session.expire_all()
+    assert db.session.get(Notification, notification_id).read is True
+
+    with pytest.raises(ValueError):
+        writer.update(Notification, {'read': True})
+
+def test_sync_mode_writes_in_the_caller(app):
+    writer = WriteBehindQueue(db, app, mode=MODE_SYNC)
+    writer.insert(Notification, row('now'))
+    assert stored_messages() == ['now']
+    assert writer._worker is None and writer.flush() is True
+
+def test_full_queue_falls_back_to_a_synchronous_write(app, monkeypatch):
+    writer = WriteBehindQueue(db, app, max_queue=1)
+    monkeypatch.setattr(writer, '_ensure_worker', lambda: None)  # keep the first row queued
+    writer.insert(Notification, row('queued'))
+    writer.insert(Notification, row('overflow'))
+    assert stored_messages() == ['overflow']
+    assert writer.stats['overflow_sync'] == 1
+
+def test_writes_never_commit_the_callers_session(app):
+    writer = WriteBehindQueue(db, app, mode=MODE_SYNC)
+    db.session.add(Notification(**row('pending in request')))
+    writer.insert(Notification, row('written'))
+    db.session.rollback()
+    assert stored_messages() == ['written']
+
+def test_failing_batch_is_retried_then_counted(app, monkeypatch):
+    writer = WriteBehindQueue(db, app)
+    attempts = []
+
+    def fail(items):
+        attempts.append(len(items))
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(writer, '_write_now', fail)
+    monkeypatch.setattr('persistence.time.sleep', lambda seconds: None)
+    writer._flush_items([('insert', Notification, row('lost'))])
+    assert attempts == [1, 1, 1]
+    assert writer.stats['failed'] == 1 and writer.stats['written'] == 0
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        WriteBehindQueue(db, mode='eventually')
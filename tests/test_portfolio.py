@@ -0,0 +1,94 @@
+import pytest
+
+from portfolio import PortfolioService, normalize_oanda_positions, normalize_alpaca_positions, instrument_key
+
+OANDA_POSITIONS = {'positions': [
+    {'instrument': 'EUR_USD', 'unrealizedPL': '20.0',
+     'long': {'units': '1000', 'averagePrice': '1.1000'}, 'short': {'units': '0'}},
+    {'instrument': 'USD_JPY', 'unrealizedPL': '0', 'long': {'units': '0'}, 'short': {'units': '0'}},
+    {'instrument': 'GBP_USD', 'unrealizedPL': '-5.0',
+     'long': {'units': '0'}, 'short': {'units': '-500', 'averagePrice': '1.2500'}},
+]}
+ALPACA_POSITIONS = {'positions': [
+    {'instrument': 'AAPL', 'units': '10', 'avg_entry_price': '150', 'current_price': '155', 'unrealized_pl': '50'},
+]}
+
+class FakeBroker:
+    def __init__(self, positions, account, fail=None):
+        self.positions, self.account, self.fail = positions, account, fail
+        self.fetches = 0
+
+    def get_positions(self):
+        self.fetches += 1
+        if self.fail:
+            raise RuntimeError(self.fail)
+        return self.positions
+
+    def get_account_details(self):
+        return {'account': self.account}
+
+def brokers(**overrides):
+    return {
+        'oanda': FakeBroker(OANDA_POSITIONS, {'currency': 'USD', 'balance': '1000', 'NAV': '1015',
+                                              'unrealizedPL': '15', 'marginAvailable': '900'}),
+        'alpaca': FakeBroker(ALPACA_POSITIONS, {'currency': 'USD', 'balance': '5000', 'pl': '50'}),
+        **overrides
+    }
+
+def test_normalizers_produce_signed_units_and_marks():
+    eur, gbp = normalize_oanda_positions(OANDA_POSITIONS)
+    assert (eur.units, eur.avg_price, eur.current_price) == (1000, 1.1, pytest.approx(1.12))
+    assert (gbp.units, gbp.to_dict()['side']) == (-500, 'short')
+    assert gbp.current_price == pytest.approx(1.26)
+    (aapl,) = normalize_alpaca_positions(ALPACA_POSITIONS)
+    assert (aapl.units, aapl.current_price, aapl.unrealized_pl) == (10, 155, 50)
+    assert instrument_key('eur_usd') == instrument_key('EUR/USD') == 'EURUSD'
+
+def test_portfolio_merges_brokers_and_totals_by_currency():
+    service = PortfolioService()
+    view = service.view(service.get(1, brokers()))
+    assert [(p['broker'], p['instrument']) for p in view['positions']] == \
+        [('alpaca', 'AAPL'), ('oanda', 'EUR_USD'), ('oanda', 'GBP_USD')]
+    assert view['totals']['USD'] == {'balance': 6000.0, 'equity': 6015.0, 'unrealized_pl': 65.0,
+                                     'margin_available': 900.0}
+    assert view['errors'] == {} and view['version'] == 1
+
+def test_one_failing_broker_does_not_hide_the_other():
+    service = PortfolioService()
+    view = service.view(service.get(1, brokers(alpaca=FakeBroker({}, {}, fail='alpaca down'))))
+    assert view['errors'] == {'alpaca': 'alpaca down'}
+    assert {p['broker'] for p in view['positions']} == {'oanda'}
+
+def test_cached_until_ttl_or_invalidated():
+    service, accounts = PortfolioService(ttl=60), brokers()
+    first = service.get(1, accounts)
+    assert service.get(1, accounts) is first
+    service.invalidate(1)
+    second = service.get(1, accounts)
+    assert second is not first and second.version == 2
+    assert accounts['oanda'].fetches == 2
+
+def test_ticks_remark_only_positions_in_that_instrument():
+    service = PortfolioService()
+    portfolio = service.get(1, brokers())
+    service.get(2, {'oanda': brokers()['oanda']})
+
+    service.on_tick('EUR-USD', {'type': 'quote', 'bid': 1.1195, 'ask': 1.1205, 'timestamp': 123})
+    positions = {p['instrument']: p for p in service.view(portfolio)['positions']}
+    assert positions['EUR_USD']['current_price'] == pytest.approx(1.12)
+    assert positions['EUR_USD']['unrealized_pl'] == pytest.approx(20.0)
+    assert positions['EUR_USD']['marked_at'] == 123
+    assert positions['GBP_USD']['marked_at'] is None
+    assert portfolio.version == 2 and service.portfolios[2].version == 2
+
+    service.on_tick('GBP-USD', {'close': 1.24, 'timestamp': 456})
+    assert service.view(portfolio)['positions'][2]['unrealized_pl'] == pytest.approx(5.0)
+    service.on_tick('AUD-USD', {'close': 0.66})
+    assert portfolio.version == 3
+
+def test_refetch_replaces_the_tick_index():
+    service, accounts = PortfolioService(), brokers()
+    service.get(1, accounts)
+    accounts['oanda'].positions = {'positions': []}
+    service.get(1, accounts, refresh=True)
+    assert 'EURUSD' not in service._by_instrument
@@ -0,0 +1,56 @@
+import random
+
+from prompt_builder import PromptBuilder, estimate_tokens, truncate_text, compact_tool_result
+
+HEADER = "Earlier conversation (summarized):\n"
+
+def _history(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": "x" * rng.randint(1, 400)}
+        for i in range(count)
+    ]
+
+def _reference_summary(turns, budget):
+    """The straightforward re-join-and-measure version the builder must agree with"""
+    per_turn = max(8, budget // len(turns) - 2)
+    lines = [f"{msg['role']}: {truncate_text(msg['content'], per_turn)}" for msg in turns]
+    while lines and estimate_tokens(HEADER + "\n".join(lines)) > budget:
+        lines.pop(0)
+    return HEADER + "\n".join(lines) if lines else None
+
+def test_summary_matches_reference_for_any_budget():
+    builder = PromptBuilder()
+    for seed in range(20):
+        turns = _history(1 + seed * 3, seed)
+        for budget in (1, 5, 20, 60, 200, 1000, 5000):
+            summary = builder._summarize(turns, budget)
+            expected = _reference_summary(turns, budget)
+            assert (summary and summary["content"]) == expected
+            if summary:
+                assert estimate_tokens(summary["content"]) <= budget
+
+def test_summary_keeps_newest_lines():
+    turns = [{"role": "user", "content": f"turn {i}"} for i in range(50)]
+    summary = PromptBuilder()._summarize(turns, 40)
+    assert summary["content"].endswith("user: turn 49")
+    assert "user: turn 0\n" not in summary["content"]
+
+def test_summary_empty_inputs():
+    builder = PromptBuilder()
+    assert builder._summarize([], 100) is None
+    assert builder._summarize(_history(3), 0) is None
+
+def test_build_stays_within_budget():
+    builder = PromptBuilder(max_tokens=500, recent_turns=4, max_message_tokens=50)
+    messages, stats = builder.build("system", _history(40), "hello")
+    assert messages[0]["role"] == "system"
+    assert messages[-1]["content"] == "hello"
+    assert stats["prompt_tokens"] <= 500
+    assert stats["history_turns"] == 40
+    assert stats["kept_turns"] + stats["summarized_turns"] + stats["dropped_turns"] == 40
+
+def test_compact_account_keeps_relevant_fields():
+    data = {"account": {"balance": "100", "NAV": "101", "id": "abc", "alias": "primary"}}
+    assert compact_tool_result("get_account_details", data) == {"balance": "100", "NAV": "101"}
+    assert compact_tool_result("get_account_details", {"error": "down"}) == {"error": "down"}
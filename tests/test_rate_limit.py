@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import TokenBucket, RateLimitTimeout, ORDER, ACCOUNT, BACKFILL
+
+def wait_for_waiters(bucket, count):
+    deadline = time.monotonic() + 5
+    while len(bucket.waiters) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_burst_is_served_without_waiting():
+    bucket = TokenBucket(rate=1.0, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.tokens < 1
+
+def test_higher_priority_waiter_is_served_first():
+    bucket = TokenBucket(rate=10.0, burst=1)
+    bucket.acquire()
+    bucket.penalize(0.3)  # nothing free for ~0.4s, so every caller below queues
+    served = []
+
+    def take(priority, label):
+        bucket.acquire(priority)
+        served.append(label)
+
+    threads = []
+    for priority, label in [(BACKFILL, 'backfill'), (ACCOUNT, 'account'), (ORDER, 'order')]:
+        thread = threading.Thread(target=take, args=(priority, label))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(bucket, len(threads))
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ['order', 'account', 'backfill']
+
+def test_same_priority_is_first_come_first_served():
+    bucket = TokenBucket(rate=20.0, burst=1)
+    bucket.acquire()
+    bucket.penalize(0.1)
+    served = []
+    threads = []
+    for label in range(3):
+        thread = threading.Thread(target=lambda label=label: (bucket.acquire(ACCOUNT), served.append(label)))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(bucket, len(threads))
+    for thread in threads:
+        thread.join(5)
+    assert served == [0, 1, 2]
+
+def test_max_wait_raises_and_leaves_the_queue():
+    bucket = TokenBucket(rate=0.1, burst=1)
+    bucket.acquire()
+    started = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(ORDER, max_wait=0.05)
+    assert time.monotonic() - started < 1
+    assert bucket.waiters == []
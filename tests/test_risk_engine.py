@@ -0,0 +1,155 @@
+from datetime import datetime, time
+from types import SimpleNamespace
+
+import pytest
+
+from risk_engine import RiskEngine, RiskLimits, RiskRejected, AccountState
+
+MONDAY_NOON = datetime(2026, 10, 19, 12, 0)
+
+class FakeBroker:
+    name = 'oanda'
+
+    def __init__(self, equity=10000.0, positions=None):
+        self.details = {'account': {'NAV': str(equity)}}
+        self.positions = {'positions': [{'instrument': instrument, 'units': str(units)}
+                                        for instrument, units in (positions or {}).items()]}
+
+    def get_account_details(self):
+        return self.details
+
+    def get_positions(self):
+        return self.positions
+
+def snapshot(**prefs):
+    return SimpleNamespace(user_id=1, version=1, trading_preferences=SimpleNamespace(**prefs))
+
+def order(units, instrument='EUR_USD', **extra):
+    return {'order': {'instrument': instrument, 'units': units}, **extra}
+
+@pytest.fixture
+def engine():
+    engine = RiskEngine(refresh_interval=3600)
+    yield engine
+    engine._stop.set()
+
+def test_no_preferences_pass_unchanged(engine):
+    request = order(1000)
+    assert engine.check(SimpleNamespace(user_id=1, version=1, trading_preferences=None),
+                        FakeBroker(), request) == (request, None)
+
+def test_excluded_symbols_are_rejected_in_any_spelling(engine):
+    with pytest.raises(RiskRejected) as e:
+        engine.check(snapshot(excluded_symbols='["eur/usd"]'), FakeBroker(), order(1000), now=MONDAY_NOON)
+    assert 'excluded' in e.value.reasons[0]
+
+@pytest.mark.parametrize('hour, allowed', [(23, True), (2, True), (6, True), (7, False), (12, False), (21, False)])
+def test_trading_window_wraps_past_midnight(hour, allowed):
+    limits = RiskLimits(SimpleNamespace(trading_hours_start=time(22, 0), trading_hours_end=time(6, 0)))
+    assert limits.in_trading_window(datetime(2026, 10, 20, hour, 0)) is allowed
+
+def test_trading_window_without_wrap():
+    limits = RiskLimits(SimpleNamespace(trading_hours_start=time(9, 0), trading_hours_end=time(17, 0)))
+    assert limits.in_trading_window(MONDAY_NOON)
+    assert not limits.in_trading_window(datetime(2026, 10, 19, 18, 0))
+
+@pytest.mark.parametrize('days', ['["Monday", "Tue"]', ['monday', 'tuesday'], [0, 1]])
+def test_trading_days_accept_json_strings_names_and_indexes(days):
+    limits = RiskLimits(SimpleNamespace(trading_days=days))
+    assert limits.trading_days == {0, 1}
+    assert limits.in_trading_window(MONDAY_NOON)
+    assert not limits.in_trading_window(datetime(2026, 10, 24, 12, 0))  # Saturday
+
+def test_outside_trading_days_is_rejected(engine):
+    with pytest.raises(RiskRejected, match='trading hours'):
+        engine.check(snapshot(trading_days='["Sat"]'), FakeBroker(), order(1000), now=MONDAY_NOON)
+
+def test_max_position_clips_adding_orders(engine):
+    broker = FakeBroker(positions={'EUR_USD': 800})
+    checked, risk = engine.check(snapshot(max_position_size=1000), broker, order(500), now=MONDAY_NOON)
+    assert checked['order']['units'] == 200
+    assert risk['requested_units'] == 500 and risk['units'] == 200
+
+def test_max_position_never_clips_reducing_orders(engine):
+    broker = FakeBroker(positions={'EUR_USD': 800})
+    request = order(-1500)
+    assert engine.check(snapshot(max_position_size=1000), broker, request, now=MONDAY_NOON) == (request, None)
+
+def test_max_position_rejects_when_already_full(engine):
+    broker = FakeBroker(positions={'EUR_USD': -1000})
+    with pytest.raises(RiskRejected, match='already at the maximum'):
+        engine.check(snapshot(max_position_size=1000), broker, order(-1), now=MONDAY_NOON)
+
+def test_fills_update_tracked_positions(engine):
+    broker = FakeBroker()
+    prefs = snapshot(max_position_size=1000)
+    engine.check(prefs, broker, order(600), now=MONDAY_NOON)
+    engine.apply_fill(1, 'oanda', 'EUR_USD', 600)
+    checked, _ = engine.check(prefs, broker, order(600), now=MONDAY_NOON)
+    assert checked['order']['units'] == 400
+    engine.apply_close(1, 'oanda', 'EUR/USD')
+    assert engine.check(prefs, broker, order(600), now=MONDAY_NOON)[1] is None
+
+def test_risk_percentage_clips_to_loss_at_stop(engine):
+    # 1% of 10000 equity = 100 at risk; 0.25 per unit to the stop -> 400 units
+    checked, risk = engine.check(snapshot(risk_percentage=1.0), FakeBroker(),
+                                 order(50000, price=1.0, stop_loss=0.75), now=MONDAY_NOON)
+    assert checked['order']['units'] == 400
+    assert risk['adjustments'] == ['clipped to 1% risk of equity']
+
+def test_market_orders_are_sized_from_the_price_source(engine):
+    engine.price_source = lambda user_id, instrument: 1.0
+    # Short: derived stop 25% above the 1.0 reference
+    checked, _ = engine.check(snapshot(risk_percentage=1.0, stop_loss_percentage=25.0), FakeBroker(),
+                              order(-50000), now=MONDAY_NOON)
+    assert checked['order']['units'] == -400
+
+def test_risk_percentage_without_a_price_is_reported_unchecked(engine):
+    request = order(50000)
+    checked, risk = engine.check(snapshot(risk_percentage=1.0, stop_loss_percentage=2.0), FakeBroker(),
+                                 request, now=MONDAY_NOON)
+    assert checked is request
+    assert risk['unchecked'] == ['risk_percentage: no reference price to size against']
+
+def test_order_rounding_to_zero_is_rejected(engine):
+    with pytest.raises(RiskRejected, match='rounds to zero'):
+        engine.check(snapshot(risk_percentage=0.0001), FakeBroker(equity=100),
+                     order(10, price=1.0, stop_loss=0.5), now=MONDAY_NOON)
+
+def test_error_body_keeps_last_known_state():
+    broker = FakeBroker(equity=5000, positions={'EUR_USD': 100})
+    state = AccountState(broker)
+    state.refresh()
+    broker.positions = {'errorMessage': 'Insufficient authorization'}
+    with pytest.raises(ConnectionError):
+        state.refresh()
+    assert state.equity == 5000.0
+    assert state.positions == {'EURUSD': 100.0}
+
+def test_idle_accounts_are_evicted(engine):
+    engine.account(1, FakeBroker())
+    engine.idle_ttl = 0
+    assert engine.evict_idle() == 1
+    assert engine.stats()['tracked_accounts'] == 0
+
+def test_unknown_position_bounds_the_order_and_reports_the_rule_unchecked(engine):
+    broker = FakeBroker()
+    broker.details = broker.positions = {'error': 'timeout'}
+    checked, risk = engine.check(snapshot(max_position_size=1000), broker, order(1000000), now=MONDAY_NOON)
+    assert checked['order']['units'] == 1000
+    assert risk['unchecked'] == ['max_position_size: current position unknown, broker account could not be loaded']
+
+    request = order(500)
+    checked, risk = engine.check(snapshot(max_position_size=1000), broker, request, now=MONDAY_NOON)
+    assert checked is request and risk['unchecked']
+
+def test_failed_first_load_is_retried_on_the_next_order(engine):
+    broker = FakeBroker(positions={'EUR_USD': 900})
+    good = broker.positions
+    broker.positions = {'error': 'timeout'}
+    engine.check(snapshot(max_position_size=1000), broker, order(10), now=MONDAY_NOON)
+
+    broker.positions = good
+    checked, risk = engine.check(snapshot(max_position_size=1000), broker, order(500), now=MONDAY_NOON)
+    assert checked['order']['units'] == 100
+    assert 'unchecked' not in risk
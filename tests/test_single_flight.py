@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight(window=0)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.stats['coalesced'] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    assert flight.calls == {}  # window=0 keeps nothing
+
+def test_result_is_reused_within_window_only():
+    flight = SingleFlight(window=0.05)
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 1
+    assert flight.stats['reused'] == 1
+    time.sleep(0.06)
+    assert flight.do('key', lambda: 3) == 3
+    assert flight.do('other', lambda: 4) == 4
+
+def test_errors_reach_waiters_but_are_not_kept():
+    flight = SingleFlight(window=10)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.stats['coalesced'] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.do('key', lambda: 'recovered') == 'recovered'
+
+def test_stale_entries_are_expired_past_max_entries():
+    flight = SingleFlight(window=0.01, max_entries=2)
+    for key in range(3):
+        flight.do(key, lambda: key)
+    time.sleep(0.02)
+    flight.do('fresh', lambda: None)
+    assert list(flight.calls) == ['fresh']
+
+def test_leader_exception_propagates():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do('key', lambda: {}['missing'])
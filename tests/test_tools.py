@@ -0,0 +1,162 @@
+import threading
+
+import pytest
+
+from tools import ToolRegistry, ToolResultCache, parse_tool_calls
+
+@pytest.fixture
+def registry():
+    registry = ToolRegistry(max_workers=2)
+    yield registry
+    registry.shutdown()
+
+def _counting_tool(registry, name='get_account_details', ttl=30, **kwargs):
+    calls = []
+
+    def fetch(broker_type=None, instrument=None):
+        calls.append(instrument)
+        return {"instrument": instrument, "n": len(calls)}
+
+    registry.register(name, "test tool", fetch, optional_params=['instrument'], ttl=ttl, **kwargs)
+    return calls
+
+def test_cached_result_is_served_per_user(registry):
+    calls = _counting_tool(registry)
+    call = [{"tool": "get_account_details", "params": {"instrument": "EUR_USD"}}]
+
+    first = registry.execute_many(call, {"broker_type": "oanda"}, user_id=1)
+    second = registry.execute_many(call, {"broker_type": "oanda"}, user_id=1)
+    other_user = registry.execute_many(call, {"broker_type": "oanda"}, user_id=2)
+
+    assert len(calls) == 2
+    assert second[0]["cached"] is True
+    assert second[0]["result"] == first[0]["result"]
+    assert "cached" not in other_user[0]
+    stats = registry.get_cache_stats()["tools"]["get_account_details"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+def test_different_params_are_cached_separately(registry):
+    calls = _counting_tool(registry)
+    registry.execute_many([{"tool": "get_account_details", "params": {"instrument": "EUR_USD"}}], user_id=1)
+    registry.execute_many([{"tool": "get_account_details", "params": {"instrument": "GBP_USD"}}], user_id=1)
+    assert calls == ["EUR_USD", "GBP_USD"]
+
+def test_no_caching_without_ttl_or_user(registry):
+    calls = _counting_tool(registry, ttl=0)
+    call = [{"tool": "get_account_details"}]
+    registry.execute_many(call, user_id=1)
+    registry.execute_many(call, user_id=1)
+    assert len(calls) == 2
+
+    cached_calls = _counting_tool(registry, name='get_positions')
+    registry.execute_many([{"tool": "get_positions"}])
+    registry.execute_many([{"tool": "get_positions"}])
+    assert len(cached_calls) == 2
+
+def test_error_payloads_are_not_cached(registry):
+    calls = []
+
+    def failing():
+        calls.append(1)
+        return {"error": "broker down"}
+
+    registry.register("get_positions", "test tool", failing, ttl=30)
+    registry.execute_many([{"tool": "get_positions"}], user_id=1)
+    registry.execute_many([{"tool": "get_positions"}], user_id=1)
+    assert len(calls) == 2
+
+def test_mutation_invalidates_only_dependent_tools_for_that_user(registry):
+    account_calls = _counting_tool(registry, invalidated_by=['create_order'])
+    candle_calls = _counting_tool(registry, name='get_candlestick_data')
+    calls = [{"tool": "get_account_details"}, {"tool": "get_candlestick_data"}]
+    registry.execute_many(calls, user_id=1)
+    registry.execute_many(calls, user_id=2)
+
+    assert registry.notify_mutation('create_order', user_id=1) == 1
+    assert registry.notify_mutation('unrelated_event', user_id=1) == 0
+
+    registry.execute_many(calls, user_id=1)
+    registry.execute_many(calls, user_id=2)
+    assert len(account_calls) == 3
+    assert len(candle_calls) == 2
+
+def test_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('tools.time.monotonic', lambda: now[0])
+    cache = ToolResultCache(max_entries=2)
+    a, b, c = (cache.make_key(1, 'tool', {"i": i}) for i in range(3))
+
+    cache.set(a, 'a', ttl=10)
+    cache.set(b, 'b', ttl=10)
+    assert cache.get(a) == (True, 'a')
+    cache.set(c, 'c', ttl=10)
+    assert cache.get(b) == (False, None)
+    assert cache.get(a) == (True, 'a')
+
+    now[0] += 11
+    assert cache.get(a) == (False, None)
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["tools"]["tool"]["evictions"] == 1
+
+def test_cache_stats_route_is_operator_only(client):
+    assert client.get('/api/v1/tools/cache_stats', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 404
+    response = client.get('/api/v1/tools/cache_stats', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+    assert response.status_code == 200
+    assert "entries" in response.get_json()
+
+def test_execute_many_runs_calls_concurrently_in_call_order(registry):
+    barrier = threading.Barrier(2, timeout=2)
+
+    def slow(instrument=None):
+        barrier.wait()  # only returns if both calls run at the same time
+        return instrument
+
+    registry.register("get_candlestick_data", "test tool", slow, optional_params=['instrument'])
+    results = registry.execute_many([
+        {"tool": "get_candlestick_data", "params": {"instrument": "EUR_USD"}},
+        {"tool": "get_candlestick_data", "params": {"instrument": "GBP_USD"}},
+    ])
+    assert [r["result"] for r in results] == ["EUR_USD", "GBP_USD"]
+    assert [r["params"] for r in results] == [{"instrument": "EUR_USD"}, {"instrument": "GBP_USD"}]
+
+def test_execute_many_isolates_errors_and_timeouts(registry):
+    release = threading.Event()
+
+    def boom():
+        raise RuntimeError("broker down")
+
+    registry.register("get_positions", "test tool", boom)
+    registry.register("get_trades", "test tool", lambda: release.wait(2), timeout=0.05)
+    registry.register("get_account_details", "test tool", lambda: {"balance": "100"})
+    results = registry.execute_many([
+        {"tool": "get_positions"}, {"tool": "get_trades"}, {"tool": "get_account_details"}, {"tool": "missing"}
+    ])
+    release.set()
+    assert results[0]["error"] == "broker down"
+    assert "timed out" in results[1]["error"]
+    assert results[2]["result"] == {"balance": "100"}
+    assert results[3]["error"] == "Tool missing not available"
+
+def test_context_overrides_model_params_and_undeclared_params_are_dropped(registry):
+    seen = {}
+
+    def fetch(broker_type=None, instrument=None):
+        seen.update(broker_type=broker_type, instrument=instrument)
+        return seen
+
+    registry.register("get_candlestick_data", "test tool", fetch, optional_params=['instrument'])
+    registry.execute_many([{"tool": "get_candlestick_data",
+                            "params": {"instrument": "EUR_USD", "broker_type": "evil", "account_id": "x"}}],
+                          {"broker_type": "oanda"})
+    assert seen == {"broker_type": "oanda", "instrument": "EUR_USD"}
+
+def test_parse_tool_calls():
+    text = ("EXECUTE_TOOL:get_account_details\n"
+            "EXECUTE_TOOL:get_candlestick_data(instrument='EUR_USD', count=10)\n"
+            "EXECUTE_TOOL:get_account_details")
+    assert parse_tool_calls(text) == [
+        {"tool": "get_account_details", "params": {}},
+        {"tool": "get_candlestick_data", "params": {"instrument": "EUR_USD", "count": "10"}},
+    ]
+    assert parse_tool_calls(None) == []
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event
+
+import user_snapshot
+from models import db, User, BrokerConfig, TradingPreferences
+from user_snapshot import load_user_snapshot, invalidate_user_snapshot
+
+@pytest.fixture
+def user(app, monkeypatch):
+    monkeypatch.setattr(user_snapshot, '_cache', {})
+    monkeypatch.setattr(user_snapshot, '_versions', {})
+    user = User(id=1, username='trader', email='trader@example.com', password_hash='x')
+    db.session.add_all([
+        user,
+        BrokerConfig(user_id=1, broker_type='oanda', oanda_api_key='key', oanda_account_id='001-1'),
+        BrokerConfig(user_id=1, broker_type='alpaca', alpaca_api_key='a', is_active=False),
+        TradingPreferences(user_id=1, default_units=500),
+    ])
+    db.session.commit()
+    db.session.remove()
+    return user
+
+@pytest.fixture
+def queries(app):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+def test_snapshot_loads_everything_in_two_queries(user, queries):
+    snapshot = load_user_snapshot(1)
+    assert len(queries) == 2  # user + preferences joined, then configs
+    assert snapshot.get_active_brokers() == ['oanda']
+    oanda = snapshot.get_broker_config('oanda')
+    assert (oanda.api_key, oanda.account_id) == ('key', '001-1')
+    assert oanda.credentials['environment'] == 'practice'
+    assert snapshot.trading_preferences.default_units == 500
+    assert not snapshot.has_broker_config('alpaca')
+
+def test_snapshot_is_cached_and_session_free(user, queries):
+    first = load_user_snapshot(1)
+    db.session.remove()
+    assert load_user_snapshot(1) is first
+    assert len(queries) == 2
+    assert first.get_broker_config('oanda').broker_type == 'oanda'
+
+def test_invalidation_reloads_on_next_read(user):
+    first = load_user_snapshot(1)
+    prefs = TradingPreferences.query.filter_by(user_id=1).one()
+    prefs.default_units = 750
+    db.session.commit()
+    assert load_user_snapshot(1) is first
+
+    invalidate_user_snapshot(1)
+    second = load_user_snapshot(1)
+    assert second is not first
+    assert second.trading_preferences.default_units == 750
+
+def test_snapshot_expires_after_ttl(user, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('user_snapshot.time.monotonic', lambda: now[0])
+    first = load_user_snapshot(1)
+    now[0] += user_snapshot.SNAPSHOT_TTL + 1
+    assert load_user_snapshot(1) is not first
+
+def test_load_racing_a_write_is_not_published(user, monkeypatch):
+    real_init = user_snapshot.UserSnapshot.__init__
+
+    def init_then_write(self, *args):
+        real_init(self, *args)
+        invalidate_user_snapshot(1)  # a write lands while the snapshot is being built
+
+    monkeypatch.setattr(user_snapshot.UserSnapshot, '__init__', init_then_write)
+    load_user_snapshot(1)
+    assert 1 not in user_snapshot._cache
+
+def test_unknown_user(app, monkeypatch):
+    monkeypatch.setattr(user_snapshot, '_cache', {})
+    assert load_user_snapshot(404) is None
@@ -1,28 +1,174 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextvars
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Matches "EXECUTE_TOOL:name" optionally followed by "(key=value, ...)"
+TOOL_CALL_PATTERN = re.compile(r"EXECUTE_TOOL:\s*([A-Za-z_]\w*)(?:\s*\(([^)]*)\))?")
+
+DEFAULT_TOOL_TIMEOUT = 15.0
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CACHE_ENTRIES = 2048
 
 class Tool:
-    def __init__(self, name: str, description: str, function: callable, required_params: Optional[List[str]] = None):
+    def __init__(self, name: str, description: str, function: callable, required_params: Optional[List[str]] = None,
+                 optional_params: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 ttl: Optional[float] = None, invalidated_by: Optional[List[str]] = None):
         self.name = name
         self.description = description
         self.function = function
         self.required_params = required_params or []
+        self.optional_params = optional_params or []
+        self.timeout = timeout or DEFAULT_TOOL_TIMEOUT
+        self.ttl = ttl or 0
+        self.invalidated_by = set(invalidated_by or [])
+        self._accepts_var_kwargs, self._accepted_params = self._inspect_signature(function)
+
+    @staticmethod
+    def _inspect_signature(function):
+        """Return whether the function takes **kwargs and the names it accepts"""
+        try:
+            params = inspect.signature(function).parameters.values()
+        except (TypeError, ValueError):
+            return True, set()
+        accepts_var_kwargs = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params)
+        accepted = {
+            p.name for p in params
+            if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+        }
+        return accepts_var_kwargs, accepted
+
+    def filter_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the keyword arguments the tool function can accept"""
+        if self._accepts_var_kwargs:
+            return dict(kwargs)
+        return {k: v for k, v in kwargs.items() if k in self._accepted_params}
+
+    def declared_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the parameters the tool declares; used for model-supplied params"""
+        declared = set(self.required_params) | set(self.optional_params)
+        return {k: v for k, v in params.items() if k in declared}
 
     def execute(self, **kwargs):
         """Execute tool function with parameter validation"""
         try:
-            filtered_kwargs = {k: v for k, v in kwargs.items() if k in self.required_params}
+            missing = [p for p in self.required_params if kwargs.get(p) is None]
+            if missing:
+                raise ValueError(f"Missing required parameters for {self.name}: {', '.join(missing)}")
+            filtered_kwargs = self.filter_kwargs(kwargs)
             return self.function(**filtered_kwargs)
         except Exception as e:
-            print(f"Tool execution error: {str(e)}")
+            logger.error(f"Tool execution error ({self.name}): {str(e)}")
             raise
 
+class ToolResultCache:
+    """Per-user TTL cache of tool results keyed by tool name and arguments"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(user_id: Any, tool_name: str, params: Dict[str, Any]) -> Tuple:
+        """Build a stable cache key; non-JSON values are keyed by their type name"""
+        frozen = json.dumps(params, sort_keys=True, default=lambda o: type(o).__name__)
+        return (user_id, tool_name, frozen)
+
+    def _stat(self, tool_name: str, field: str) -> None:
+        stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0})
+        stats[field] += 1
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """Return (found, value) for a key, dropping it if expired"""
+        tool_name = key[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stat(tool_name, "hits")
+                    return True, value
+                del self._entries[key]
+            self._stat(tool_name, "misses")
+            return False, None
+
+    def set(self, key: Tuple, value: Any, ttl: float) -> None:
+        """Store a value for ttl seconds, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._stat(evicted_key[1], "evictions")
+
+    def invalidate(self, user_id: Any = None, tool_names: Optional[List[str]] = None) -> int:
+        """Drop cached results for a user and/or set of tools; returns the number removed"""
+        with self._lock:
+            doomed = [
+                key for key in self._entries
+                if (user_id is None or key[0] == user_id)
+                and (tool_names is None or key[1] in tool_names)
+            ]
+            for key in doomed:
+                del self._entries[key]
+                self._stat(key[1], "invalidations")
+            return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics per tool plus current entry count"""
+        with self._lock:
+            per_tool = {}
+            for tool_name, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                per_tool[tool_name] = {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0
+                }
+            return {"entries": len(self._entries), "tools": per_tool}
+
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, cache_entries: int = DEFAULT_CACHE_ENTRIES):
         self.tools: Dict[str, Tool] = {}
+        self.max_workers = max_workers
+        self.cache = ToolResultCache(cache_entries)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def register(self, name: str, description: str, function: callable, required_params: Optional[List[str]] = None,
+                 optional_params: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 ttl: Optional[float] = None, invalidated_by: Optional[List[str]] = None):
+        """Register a new tool with required parameters.
+
+        ``ttl`` enables per-user result caching for that many seconds.
+        ``invalidated_by`` lists mutation events (e.g. ``create_order``) that
+        drop the tool's cached results for the affected user.
+        """
+        self.tools[name] = Tool(name, description, function, required_params, optional_params, timeout,
+                                ttl, invalidated_by)
 
-    def register(self, name: str, description: str, function: callable, required_params: Optional[List[str]] = None):
-        """Register a new tool with required parameters"""
-        self.tools[name] = Tool(name, description, function, required_params)
+    def notify_mutation(self, event: str, user_id: Any = None) -> int:
+        """Invalidate cached results of every tool that depends on the given mutation"""
+        affected = [tool.name for tool in self.tools.values() if event in tool.invalidated_by]
+        if not affected:
+            return 0
+        removed = self.cache.invalidate(user_id, affected)
+        logger.info(f"Mutation {event} invalidated {removed} cached results for {affected}")
+        return removed
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get tool result cache statistics"""
+        return self.cache.stats()
 
     def get_tool(self, name: str) -> Optional[Tool]:
         """Get a tool by name"""
@@ -33,9 +179,131 @@ class ToolRegistry:
         descriptions = []
         for tool in self.tools.values():
             params = ", ".join(tool.required_params) if tool.required_params else "none"
-            descriptions.append(
+            description = (
                 f"Tool: {tool.name}\n"
                 f"Description: {tool.description}\n"
                 f"Required Parameters: {params}\n"
             )
+            if tool.optional_params:
+                description += f"Optional Parameters: {', '.join(tool.optional_params)}\n"
+            descriptions.append(description)
         return "\n".join(descriptions)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Lazily create the shared bounded pool used for parallel tool calls"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='tool'
+                )
+            return self._executor
+
+    def _run_call(self, tool: Tool, params: Dict[str, Any], cache_key: Optional[Tuple] = None) -> Dict[str, Any]:
+        """Run a single tool call and wrap its outcome"""
+        started = time.perf_counter()
+        try:
+            result = tool.execute(**params)
+        except Exception as e:
+            return {"error": str(e), "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+        # Brokers report some failures as {"error": ...} payloads; never cache those
+        if cache_key is not None and not (isinstance(result, dict) and "error" in result):
+            self.cache.set(cache_key, result, tool.ttl)
+        return {"result": result, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def execute_many(self, calls: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None,
+                     user_id: Any = None) -> List[Dict[str, Any]]:
+        """Execute several tool calls concurrently and return all results in call order.
+
+        Each call is a dict with a "tool" name and optional "params". Call
+        params usually come from model output, so only the tool's declared
+        required/optional params are kept. Values in ``context`` (e.g.
+        ``broker_type``) are supplied by the server, override call params of
+        the same name and are passed only to tools whose function accepts
+        them. Each call is bounded by its tool's timeout; a call that errors
+        or times out is reported in its own result entry without affecting
+        the others. A timed-out call that already started keeps its worker
+        thread until it returns: threads can't be interrupted, so tools must
+        rely on their HTTP client's own timeout ([BROKERS] REQUEST_TIMEOUT
+        for broker calls) to give the thread back. When ``user_id`` is given,
+        tools registered with a ttl are served from that user's cache while
+        fresh. Cached results are shared and must be treated as read-only.
+        """
+        context = context or {}
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+        pending = []
+
+        for index, call in enumerate(calls):
+            name = call.get("tool")
+            tool = self.get_tool(name)
+            if not tool:
+                results[index] = {"tool": name, "params": call.get("params") or {},
+                                  "error": f"Tool {name} not available"}
+                continue
+            params = {**tool.declared_params(call.get("params") or {}), **context}
+
+            cache_key = None
+            if user_id is not None and tool.ttl > 0:
+                cache_key = self.cache.make_key(user_id, name, tool.filter_kwargs(params))
+                found, value = self.cache.get(cache_key)
+                if found:
+                    results[index] = {"result": value, "elapsed_ms": 0.0, "cached": True}
+                    continue
+            pending.append((index, tool, params, cache_key))
+
+        if pending:
+            executor = self._get_executor()
+            started = time.monotonic()
+            futures = []
+            for index, tool, params, cache_key in pending:
+                # Each worker gets its own copy so request/app context stays visible
+                ctx = contextvars.copy_context()
+                futures.append((index, tool, executor.submit(ctx.run, self._run_call, tool, params, cache_key)))
+
+            for index, tool, future in futures:
+                remaining = max(0.0, started + tool.timeout - time.monotonic())
+                try:
+                    results[index] = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    # Only stops a call that hasn't started; a running one finishes in the background
+                    future.cancel()
+                    logger.warning(f"Tool {tool.name} timed out after {tool.timeout}s")
+                    results[index] = {"error": f"Tool {tool.name} timed out after {tool.timeout}s",
+                                      "elapsed_ms": round(tool.timeout * 1000, 2)}
+
+        for index, call in enumerate(calls):
+            if "tool" not in results[index]:
+                results[index] = {"tool": call.get("tool"), "params": call.get("params") or {}, **results[index]}
+        return results
+
+    def shutdown(self) -> None:
+        """Release the worker pool"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """Extract every EXECUTE_TOOL directive from a model response.
+
+    Supports ``EXECUTE_TOOL:name`` and ``EXECUTE_TOOL:name(key=value, ...)``,
+    one or more per response. Duplicate calls are collapsed.
+    """
+    calls = []
+    seen = set()
+    for match in TOOL_CALL_PATTERN.finditer(text or ""):
+        name, raw_params = match.group(1), match.group(2)
+        params = {}
+        if raw_params:
+            for pair in raw_params.split(","):
+                if "=" not in pair:
+                    continue
+                key, value = pair.split("=", 1)
+                params[key.strip()] = value.strip().strip("'\"")
+        key = (name, tuple(sorted(params.items())))
+        if key in seen:
+            continue
+        seen.add(key)
+        calls.append({"tool": name, "params": params})
+    return calls
@@ -1,17 +1,51 @@
-from flask import Blueprint, request, jsonify
-from oandapyV20.exceptions import V20Error
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-from oandapyV20 import API
+from flask import Blueprint, request, jsonify, current_app
 import configparser
-import pandas as pd
+import threading
 from flask_login import login_required
+from json_provider import wants_columnar
+from http_cache import make_etag, check_not_modified, finalize
+from single_flight import coalescer
+from rate_limit import rate_limiter, MARKET_DATA
 
 trading_bp = Blueprint('trading', __name__)
 
-# Initialize OANDA API
 config = configparser.ConfigParser()
 config.read('config.ini')
-api = API(access_token=config.get('API_KEYS', 'OANDA_API_KEY'))
+
+# OANDA client is created on first use so importing this module stays cheap
+_api = None
+_api_lock = threading.Lock()
+
+def get_api():
+    """Get the shared OANDA API client, creating it on first use"""
+    global _api
+    with _api_lock:
+        if _api is None:
+            from oandapyV20 import API
+            _api = API(access_token=config.get('API_KEYS', 'OANDA_API_KEY'),
+                       request_params={'timeout': config.getfloat('BROKERS', 'REQUEST_TIMEOUT', fallback=10.0)})
+    return _api
+
+def get_limiter():
+    """Rate limit shared with every other client of the server's OANDA key"""
+    return rate_limiter.for_credential('oanda', config.get('API_KEYS', 'OANDA_API_KEY'))
+
+# Custom indicator executor (worker processes) is created on first use
+_indicator_executor = None
+_indicator_executor_lock = threading.Lock()
+
+def get_indicator_executor():
+    """Get the shared sandboxed executor for Indicator.calculation_code"""
+    global _indicator_executor
+    with _indicator_executor_lock:
+        if _indicator_executor is None:
+            from indicator_sandbox import IndicatorExecutor
+            _indicator_executor = IndicatorExecutor(
+                max_workers=config.getint('INDICATORS', 'MAX_WORKERS', fallback=2),
+                cpu_seconds=config.getfloat('INDICATORS', 'CPU_SECONDS', fallback=2.0),
+                memory_mb=config.getint('INDICATORS', 'MEMORY_MB', fallback=512)
+            )
+    return _indicator_executor
 
 # Keep only these utility functions:
 def standardize_currency_pair(pair):
@@ -38,6 +72,10 @@ def validate_timeframe(timeframe):
     return timeframe_map.get(timeframe)
 
 def load_historical_data(instrument, granularity, count):
+    import pandas as pd
+    from oandapyV20.exceptions import V20Error
+    from oandapyV20.endpoints.instruments import InstrumentsCandles
+
     std_instrument = standardize_currency_pair(instrument)
     if not std_instrument:
         raise ValueError(f"Invalid currency pair format: {instrument}")
@@ -51,7 +89,8 @@ def load_historical_data(instrument, granularity, count):
     r = InstrumentsCandles(instrument=std_instrument, params=params)
     
     try:
-        api.request(r)
+        get_limiter().acquire(MARKET_DATA)
+        get_api().request(r)
     except V20Error as e:
         raise ValueError(f"Failed to fetch data: {str(e)}")
 
@@ -73,14 +112,138 @@ def load_historical_data(instrument, granularity, count):
     df["time"] = pd.to_datetime(df["time"])
     return df
 
+CANDLE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+# OANDA returns at most 5000 candles per request
+MAX_CANDLES = config.getint('TRADING', 'MAX_CANDLES', fallback=5000)
+
+def candle_count(value, default=100):
+    """Requested candle count clamped to 1..MAX_CANDLES; ValueError if not a number"""
+    if value is None:
+        return default
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("count must be an integer")
+    return max(1, min(count, MAX_CANDLES))
+
+def candles_to_columnar(df):
+    """Columnar candle payload: epoch-millisecond times plus one NumPy array per field"""
+    columns = {'time': df['time'].astype('int64').to_numpy() // 1_000_000}
+    for column in CANDLE_COLUMNS[1:]:
+        columns[column] = df[column].to_numpy()
+    return {
+        'instrument': df['instrument'].iat[0] if len(df) else None,
+        'granularity': df['granularity'].iat[0] if len(df) else None,
+        'format': 'columnar',
+        'count': len(df),
+        **columns
+    }
+
+def serialize_candles(df, since, columnar):
+    if since is not None:
+        df = df[df['time'].astype('int64') // 1_000_000 > since]
+    payload = candles_to_columnar(df) if columnar else df.to_dict('records')
+    return current_app.json.dumps_bytes(payload)
+
 @trading_bp.route('/api/v1/candlestick_data', methods=['GET'])
+@login_required
 def get_candlestick_data():
+    """Candles as a list of records, or with ?format=columnar as parallel arrays.
+
+    ``?since=<ms>`` drops candles at or before that time. The ETag covers the
+    newest candle (including an in-progress one), so unchanged polls get 304.
+    """
     try:
         instrument = request.args.get('instrument')
         granularity = request.args.get('granularity')
-        count = request.args.get('count', 100)
+        try:
+            count = candle_count(request.args.get('count'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        since = request.args.get('since', type=int)
         
-        df = load_historical_data(instrument, granularity, count)
-        return jsonify(df.to_dict('records'))
+        # Concurrent identical requests make one OANDA call; the frame is never mutated
+        df = coalescer.do(('candles', instrument, granularity, count),
+                          lambda: load_historical_data(instrument, granularity, count))
+
+        last_time = None
+        last_candle = None
+        if len(df):
+            last_time = int(df['time'].iat[-1].value // 1_000_000)
+            last_candle = df.iloc[-1][CANDLE_COLUMNS[1:]].tolist()
+        etag = make_etag(instrument, granularity, count, request.args.get('format', ''), since,
+                         len(df), last_time, last_candle)
+        # No Last-Modified: the newest candle can change without its time moving
+        not_modified = check_not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+        columnar = wants_columnar(request.args)
+        body = coalescer.do(('candlestick_data', etag), lambda: serialize_candles(df, since, columnar))
+        return finalize(current_app.response_class(body, mimetype='application/json'), etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@trading_bp.route('/api/v1/indicators/<int:indicator_id>/evaluate', methods=['POST'])
+@login_required
+def evaluate_indicator(indicator_id):
+    """Evaluate a stored Indicator over candles for several instruments.
+
+    Body: {"instruments": [...], "granularity": "H1", "count": 500, "params": {...}}.
+    At most [INDICATORS] MAX_INSTRUMENTS instruments; their candles are
+    loaded concurrently. Built-in indicators use the vectorized engine;
+    custom calculation_code runs in the sandboxed worker pool, one task per
+    instrument.
+    """
+    from models import db, Indicator
+    from indicators import from_model
+    from indicator_sandbox import IndicatorCodeError
+    from concurrency import fan_out
+
+    indicator = db.session.get(Indicator, indicator_id)
+    if indicator is None:
+        return jsonify({"error": "Indicator not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    instruments = list(dict.fromkeys(data.get('instruments') or []))
+    if not instruments:
+        return jsonify({"error": "instruments is required"}), 400
+    max_instruments = config.getint('INDICATORS', 'MAX_INSTRUMENTS', fallback=20)
+    if len(instruments) > max_instruments:
+        return jsonify({"error": f"At most {max_instruments} instruments per request"}), 400
+    params = data.get('params') or {}
+    try:
+        count = candle_count(data.get('count'), default=500)
+        builtin = from_model(indicator, **params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def load(instrument):
+        df = load_historical_data(instrument, data.get('granularity', 'H1'), count)
+        return {
+            'time': df['time'].astype('int64').to_numpy() // 1_000_000,
+            **{column: df[column].to_numpy(dtype='float64') for column in CANDLE_COLUMNS[1:]}
+        }
+
+    candles, results = {}, {}
+    outcomes = fan_out(load, instruments, max_workers=config.getint('INDICATORS', 'LOAD_WORKERS', fallback=4))
+    for instrument, outcome in zip(instruments, outcomes):
+        if 'error' in outcome:
+            results[instrument] = {'error': outcome['error']}
+        else:
+            candles[instrument] = outcome['result']
+
+    try:
+        if builtin is not None:
+            for instrument, arrays in candles.items():
+                results[instrument] = {'result': builtin.compute(arrays['high'], arrays['low'], arrays['close'])}
+        else:
+            results.update(get_indicator_executor().evaluate_many(indicator, candles, params))
+    except (IndicatorCodeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    for instrument, outcome in results.items():
+        if 'result' in outcome:
+            outcome['time'] = candles[instrument]['time']
+    return jsonify({'indicator': indicator.name, 'results': results})
@@ -1,13 +1,10 @@
 from flask import Flask
 from flask_migrate import Migrate
 from models import db, BrokerConfig
-import os
+from database import init_database, INSTANCE_PATH
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/tradingpal.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
+app = Flask(__name__, instance_path=INSTANCE_PATH)
+init_database(app, db)
 migrate = Migrate(app, db)
 
 def update_database():
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, session
 from flask_login import login_required, current_user
 from broker_factory import BrokerFactory
 from models import db, BrokerConfig
+from user_snapshot import load_user_snapshot, invalidate_user_snapshot
 from datetime import datetime
 
 user_config_bp = Blueprint('user_config', __name__)
@@ -10,13 +11,10 @@ user_config_bp = Blueprint('user_config', __name__)
 @login_required
 def get_broker_settings():
     try:
-        configs = BrokerConfig.query.filter_by(
-            user_id=current_user.id,
-            is_active=True
-        ).all()
+        snapshot = load_user_snapshot(current_user.id)
         
         settings = {}
-        for config in configs:
+        for config in snapshot.broker_configs.values():
             # Only return partial credentials for security
             api_key_masked = config.api_key[:4] + '****' if config.api_key else None
             api_secret_masked = config.api_secret[:4] + '****' if config.api_secret else None
@@ -92,15 +90,11 @@ def save_broker_settings():
         
         db.session.add(config)
         db.session.commit()
+        invalidate_user_snapshot(current_user.id)
         
         # Update session
         session['selected_broker'] = broker_type
-        session['available_brokers'] = [
-            c.broker_type for c in BrokerConfig.query.filter_by(
-                user_id=current_user.id,
-                is_active=True
-            ).all()
-        ]
+        session['available_brokers'] = load_user_snapshot(current_user.id).get_active_brokers()
         
         return jsonify({
             "message": "Settings saved and connection verified",
@@ -0,0 +1,103 @@
+"""
+User configuration snapshot
+---
+Loads a user's active broker configurations and trading preferences in
+one eagerly-joined query and caches the result as plain, session-free
+objects that every request-path consumer can share.
+
+Writes that change broker configuration or preferences must call
+invalidate_user_snapshot(user_id), which bumps the user's version so the
+next read reloads. Entries also expire after SNAPSHOT_TTL seconds, which
+bounds staleness across worker processes.
+"""
+
+from typing import Dict, Any, List, Optional
+from types import SimpleNamespace
+from sqlalchemy.orm import joinedload, selectinload
+import logging
+import threading
+import time
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = 60
+
+_cache: Dict[int, "UserSnapshot"] = {}
+_versions: Dict[int, int] = {}
+_lock = threading.Lock()
+
+def _columns(row) -> Dict[str, Any]:
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+class UserSnapshot:
+    """Read-only view of a user and their trading configuration"""
+
+    def __init__(self, user: User, version: int):
+        self.user_id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # BrokerConfig views keep the model's attribute names (api_key, account_id, ...)
+        self.broker_configs: Dict[str, SimpleNamespace] = {}
+        for config in user.broker_configs:
+            if not config.is_active:
+                continue
+            self.broker_configs[config.broker_type] = SimpleNamespace(
+                **_columns(config),
+                api_key=config.api_key,
+                api_secret=config.api_secret,
+                account_id=config.account_id,
+                credentials=config.get_credentials()
+            )
+
+        prefs = user.trading_preferences
+        self.trading_preferences: Optional[SimpleNamespace] = (
+            SimpleNamespace(**_columns(prefs)) if prefs else None
+        )
+
+    def is_fresh(self, version: int) -> bool:
+        return self.version == version and time.monotonic() - self.loaded_at < SNAPSHOT_TTL
+
+    def has_broker_config(self, broker_type: str) -> bool:
+        return broker_type in self.broker_configs
+
+    def get_broker_config(self, broker_type: str) -> Optional[SimpleNamespace]:
+        return self.broker_configs.get(broker_type)
+
+    def get_active_brokers(self) -> List[str]:
+        return list(self.broker_configs.keys())
+
+def load_user_snapshot(user_id: int) -> Optional[UserSnapshot]:
+    """Get the cached snapshot for a user, reloading it if stale"""
+    with _lock:
+        version = _versions.get(user_id, 0)
+        snapshot = _cache.get(user_id)
+        if snapshot is not None and snapshot.is_fresh(version):
+            return snapshot
+
+    user = (
+        db.session.query(User)
+        .options(selectinload(User.broker_configs), joinedload(User.trading_preferences))
+        .filter(User.id == user_id)
+        .first()
+    )
+    if user is None:
+        return None
+
+    snapshot = UserSnapshot(user, version)
+    with _lock:
+        # Only publish if no write happened while we were loading
+        if _versions.get(user_id, 0) == version:
+            _cache[user_id] = snapshot
+    return snapshot
+
+def invalidate_user_snapshot(user_id: int) -> None:
+    """Bump a user's configuration version after a write"""
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        _cache.pop(user_id, None)
+    logger.info(f"Invalidated configuration snapshot for user {user_id}")
@@ -1,14 +1,12 @@
-import google.generativeai as genai
 import configparser
 import json
+import threading
 from datetime import datetime
+from instrumentation import timed
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
-# Configure Gemini
-genai.configure(api_key=config.get('API_KEYS', 'GEMINI_API_KEY'))
-
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
@@ -16,24 +14,52 @@ generation_config = {
     "max_output_tokens": 8192
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash", 
-    generation_config=generation_config
-)
+# Gemini SDK is imported and configured on first use, not at import time
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Get the shared Gemini model, configuring the SDK on first use"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=config.get('API_KEYS', 'GEMINI_API_KEY'))
+            _model = genai.GenerativeModel(
+                model_name="gemini-1.5-flash",
+                generation_config=generation_config
+            )
+    return _model
 
+def _to_gemini_turns(messages):
+    """Map chat messages to alternating Gemini turns.
+
+    System and user messages become "user" turns, assistant messages become
+    "model" turns, and the final message is always sent as the user's turn.
+    Consecutive messages with the same role are merged into one turn.
+    """
+    turns = []
+    for index, msg in enumerate(messages):
+        is_last = index == len(messages) - 1
+        role = "model" if msg.get("role") == "assistant" and not is_last else "user"
+        if turns and turns[-1]["role"] == role:
+            turns[-1]["parts"].append(msg["content"])
+        else:
+            turns.append({"role": role, "parts": [msg["content"]]})
+    return turns
+
+@timed('llm', model='gemini-1.5-flash')
 def get_gemini_response(messages):
     """Centralized function to get responses from Gemini AI"""
     try:
-        chat = model.start_chat()
-        
-        for msg in messages:
-            if msg.get("role") == "system":
-                chat.send_message(msg["content"])
-            else:
-                chat.send_message(msg["content"])
+        # Send prior turns as history so the whole prompt costs one round trip
+        turns = _to_gemini_turns(messages)
+        chat = get_model().start_chat(history=turns[:-1])
+        chat.send_message(turns[-1]["parts"])
         
         return chat.last.text
         
     except Exception as e:
         print(f"[Gemini Error]: {str(e)}")
-        return "I encountered an error processing your request."
\ No newline at end of file
+        return "I encountered an error processing your request."